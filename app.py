@@ -1,29 +1,36 @@
 #!/usr/bin/env python3
 """
 JD价格爬虫 - Web前端
+
+启动只加载 Flask 本身:pandas / openpyxl / patchright / 天猫的 undetected_chromedriver+selenium
+都在第一次真正用到时才在函数内 import(下载模板、看历史不会把爬虫引擎拉起来),
+事故中按 runbook 重启 Flask 能在一秒内回到可用状态。
 """
+import time
+_BOOT_T0 = time.perf_counter()  # 启动耗时统计起点(须在其余 import 之前)
+
 import os
 import re
-import time
 import random
 import glob as glob_mod
 from io import BytesIO
 from datetime import datetime
-from threading import Thread
-from flask import Flask, render_template, request, jsonify, send_file
+import queue as queue_mod
+from threading import Thread, Lock
+from flask import Flask, render_template, request, jsonify, send_file, Response, stream_with_context
 from flask_socketio import SocketIO
 from flask_cors import CORS
-import pandas as pd
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-from openpyxl.utils import get_column_letter
-from openpyxl.comments import Comment
 from werkzeug.utils import secure_filename
-# Patchright 版 JD crawler — 替代之前的 selenium+CDP attach 方案
-# 2026-05 京东升级反爬,selenium 即便 CDP attach 也被秒拒,patchright 修补了底层指纹
-from jd_crawler_patchright import JDCrawlerViaSearch, _is_chrome_running_on_cdp_port, CDP_PORT
-from tmall_crawler import TmallCrawler, parse_tmall_item_id
-import profile_provision
+# 爬虫引擎(patchright 版 JD crawler / 天猫 selenium crawler)、pandas、openpyxl
+# 一律按需延迟加载,见下方 _jd_crawler_cls 等
+import profile_provision  # 纯文件操作;patchright 在扫码/验证线程里才 import
+from browser_actor import BrowserActor, ActorBound
+import crawl_store
+import browser_watchdog
+import jd_batch  # 行解析 + 分批调度(与命令行 main_batch.py 共用)
+import result_export
+import price_diff
+import failure_snapshots
 
 # 初始化Flask应用
 app = Flask(__name__)
@@ -45,15 +52,7 @@ socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading')
 JD_BATCH_SIZE = 25
 JD_BATCH_COOLDOWN = 600    # 10 分钟
 
-# 爬取强度预设 — UI 上让用户在「稳」和「快」之间权衡。冷却都是 10 分钟,
-# 只调每批条数:批越大→批数越少→省下的全是 10 分钟的批间等待,但单会话连续请求越多、越易触发风控。
-# ⚠️ 实测:enhanced(100/批)在第 3 批(~第 209 条)即触发京东 PC 频控页
-#    (pc-frequent-pro.pf.jd.com/?reason=403),之后连续失败 100+ 条、完全进不去商品页 —— 不可用,已移除。
-#    未知 speed 一律回退 regular。
-JD_SPEED_PRESETS = {
-    'regular':  {'batch_size': 25,  'cooldown': 600, 'label': '常规'},
-    'fast':     {'batch_size': 50,  'cooldown': 600, 'label': '快速'},
-}
+# 爬取强度预设(regular / fast)见 jd_batch.JD_SPEED_PRESETS,命令行与 Web 共用
 TMALL_BATCH_SIZE = 25      # 天猫反爬同样严格
 TMALL_BATCH_COOLDOWN = 1500  # 25 分钟
 
@@ -67,133 +66,126 @@ live_results = []  # 每条 row 含 'platform' 字段
 current_results = []
 
 # 京东专属
-crawler_instance = None  # JD crawler
+crawler_instance = None  # JD crawler(ActorBound 代理,实际对象活在 _jd_actor 线程上)
+_jd_actor = None  # 持有所有 patchright 对象的浏览器 owner 线程,跨批次/跨请求线程长期存活
+# crawler_instance 跨任务复用不关 —— 行边界按内存 / 页面数回收 context(阈值见 browser_watchdog)
+_jd_watchdog = browser_watchdog.ContextWatchdog()
+# 失败行的页面 / 截图 / 响应链,后台线程压缩写盘到 snapshots/(容量上限见 failure_snapshots)
+_jd_snapshots = failure_snapshots.SnapshotStore()
 current_batch_file = None  # JD 当前输出文件
-uploaded_df = None  # JD 上传的 dataframe(预览用)
 uploaded_urls = []
 uploaded_rows = []  # JD 解析后的行
 
+# 任务队列:上传即入队(crawl_store 持久化),调度线程在爬虫空闲时取下一个任务开跑
+_job_lock = Lock()  # 「检查 is_crawling + 占用爬虫」必须原子,调度线程与 retry 接口共用
+_job_runner_started = False
+_job_queue_paused = False  # 用户点停止后暂停队列,避免下一个任务立刻接着跑;新入队/恢复接口解除
+_stop_requested = False
+current_job_id = None
+# 不走队列的占用(retry / 快速查询)的标记:与 current_job_id 一样到线程彻底退出才清空,
+# 爬取函数提前把 is_crawling 置 False 后,调度器也不会在它存盘、收尾时派下一个任务
+_adhoc_task = None
+
+# 快速查询:价格缓存 + 批量进行中的插队队列(批次在行间隙借用当前账号处理)
+QUICK_CHECK_CACHE_TTL = 6 * 3600  # 缓存 6 小时内视为新鲜,直接作答不再实时查
+QUICK_CHECK_CACHEABLE = ('success', 'partial', 'unavailable', 'not_found')
+_price_cache = {}  # product_id -> {status, original_price, promo_price, crawl_time, ts}
+_price_cache_warmed = False
+_quick_check_queue = queue_mod.Queue()
+_quick_check_active = False  # 空闲时的快速查询正占着爬虫(期间新的查询排队,由它顺带查完)
+_jd_cooling = False  # 京东批次冷却中:没有行间隙可插队,新查询直接答缓存 / 回报忙,不排队干等
+
 # 天猫专属
 tmall_crawler_instance = None
 current_tmall_batch_file = None
 uploaded_tmall_rows = []  # 天猫解析后的行
 
-# ==================== 辅助函数 ====================
+# ==================== 延迟加载 ====================
 
-def _norm_col(name):
-    """归一化列名用于匹配"""
-    return str(name).strip().lower().replace(' ', '').replace('_', '')
-
-def _parse_excel(filepath):
-    """读取 Excel 并提取 5 个核心列,返回 row dict 列表"""
-    df = pd.read_excel(filepath)
-    col_map = {_norm_col(c): c for c in df.columns}
-
-    def pick(*candidates):
-        # 精确匹配
-        for c in candidates:
-            if _norm_col(c) in col_map:
-                return col_map[_norm_col(c)]
-        # 前缀匹配 fallback(兼容 "Price Reference_0" 之类的后缀列名)
-        for c in candidates:
-            nc = _norm_col(c)
-            for norm, orig in col_map.items():
-                if norm.startswith(nc):
-                    return orig
-        return None
+def _jd_crawler_cls():
+    """Patchright 版 JD crawler — 替代之前的 selenium+CDP attach 方案.
+    2026-05 京东升级反爬,selenium 即便 CDP attach 也被秒拒,patchright 修补了底层指纹.
+    首次调用才 import patchright(约占冷启动时间的大头)."""
+    from jd_crawler_patchright import JDCrawlerViaSearch
+    return JDCrawlerViaSearch
 
-    brand_col = pick('Brand', '品牌')
-    item_col = pick('Item', '型号', 'Model')
-    url_col = pick('URL', 'ProductUrl std', 'ProductUrl', '链接')
-    key_col = pick('Product Key', 'ProductKey', 'SKU')
-    ref_col = pick('Price Reference', 'PriceReference', '参考价')
 
-    rows = []
-    for _, r in df.iterrows():
-        def val(col):
-            if not col:
-                return ''
-            v = r[col]
-            if pd.isna(v):
-                return ''
-            if isinstance(v, float):
-                if v.is_integer():
-                    return str(int(v))
-                return f'{v:.2f}'
-            return str(v).strip()
+def _tmall_crawler_cls():
+    """天猫 crawler — import 时会拉起 undetected_chromedriver + selenium,只在天猫开爬时加载."""
+    from tmall_crawler import TmallCrawler
+    return TmallCrawler
 
-        brand = val(brand_col)
-        item = val(item_col)
-        url = val(url_col)
-        key = val(key_col)
-        ref = val(ref_col)
 
-        # URL 缺失时,从 Product Key 构造
-        if not url and key:
-            url = f"https://item.jd.com/{key}.html"
+def _get_jd_actor():
+    """浏览器 owner 线程(按需创建).批量线程、快速查询线程、重置接口都只往它的队列投命令,
+    patchright 的线程亲和性问题(cannot switch to a different thread)从根上消失."""
+    global _jd_actor
+    if _jd_actor is None or not _jd_actor.is_alive():
+        _jd_actor = BrowserActor()
+    return _jd_actor
 
-        # 从 URL 提取 product_id(爬取用)
-        product_id = ''
-        if url:
-            m = re.search(r'/(\d+)\.html', url)
-            if m:
-                product_id = m.group(1)
-        if not product_id and key:
-            product_id = key
 
-        if not url and not product_id:
-            continue  # 跳过无效行
+def _new_jd_crawler():
+    """在 actor 线程上创建 JD crawler(sync_playwright 在那条线程 start),返回代理."""
+    actor = _get_jd_actor()
+    return ActorBound(actor, actor.call(_jd_crawler_cls(), headless=False))
 
-        rows.append({
-            'brand': brand,
-            'item': item,
-            'url': url,
-            'product_key': key,
-            'price_reference': ref,
-            'product_id': product_id,
-        })
-    return rows
 
+def _close_crawler(inst, timeout=20):
+    """best effort 关闭 crawler 的 context.
+    actor 卡在某个命令上(chromium 假死)超过 timeout 就放弃这条 actor:
+    让它跑完手上的命令后自行退出,下次按需新建一条干净的."""
+    global _jd_actor
+    if inst is None:
+        return
+    actor = inst._actor if isinstance(inst, ActorBound) else None
+    try:
+        if actor is not None:
+            target = inst._target
+            close_fn = getattr(target, '_close_context', None) or getattr(target, 'close', None)
+            if close_fn:
+                actor.call(close_fn, timeout=timeout)
+        else:
+            close_fn = getattr(inst, '_close_context', None) or getattr(inst, 'close', None)
+            if close_fn:
+                close_fn()
+    except Exception:
+        if actor is not None:
+            actor.stop()
+            if actor is _jd_actor:
+                _jd_actor = None
+
+
+# ==================== 辅助函数 ====================
+
+def _parse_tmall_excel(filepath, on_progress=None):
+    """读取天猫 Excel,返回 row dict 列表(按文件内容哈希缓存,同一份文件只解析一次)"""
+    return jd_batch.cached_rows(filepath, _read_tmall_excel, 'tmall', on_progress)
 
-def _parse_tmall_excel(filepath):
-    """读取天猫 Excel,返回 row dict 列表.
+
+def _read_tmall_excel(filepath, on_progress=None):
+    """逐行解析天猫 Excel.
 
     爬取依据 = URL(必填),由 parse_tmall_item_id 从 URL 提取真实 tmall id.
     Excel 的 ProductKey 列 = 业务侧编号(选填,只用于显示/对照,不参与爬取).
     """
-    df = pd.read_excel(filepath)
-    col_map = {_norm_col(c): c for c in df.columns}
-
-    def pick(*candidates):
-        for c in candidates:
-            if _norm_col(c) in col_map:
-                return col_map[_norm_col(c)]
-        for c in candidates:
-            nc = _norm_col(c)
-            for norm, orig in col_map.items():
-                if norm.startswith(nc):
-                    return orig
-        return None
-
-    brand_col = pick('BRAND', 'Brand', '品牌')
-    item_col = pick('Item', '型号', 'Model')
-    url_col = pick('ProductUrl tmall', 'ProductUrl', 'URL', '链接')
-    key_col = pick('Product Key', 'ProductKey', 'item_id', 'SKU')  # 业务侧编号(选填)
-    ref_col = pick('Price Reference', 'PriceReference', '参考价')
+    from tmall_crawler import parse_tmall_item_id
+    header, body, total = jd_batch.read_sheet(filepath)
+    brand_col = jd_batch.pick_column(header, 'BRAND', 'Brand', '品牌')
+    item_col = jd_batch.pick_column(header, 'Item', '型号', 'Model')
+    url_col = jd_batch.pick_column(header, 'ProductUrl tmall', 'ProductUrl', 'URL', '链接')
+    key_col = jd_batch.pick_column(header, 'Product Key', 'ProductKey', 'item_id', 'SKU')  # 业务侧编号(选填)
+    ref_col = jd_batch.pick_column(header, 'Price Reference', 'PriceReference', '参考价')
 
     rows = []
-    for _, r in df.iterrows():
-        def val(col):
-            if not col:
-                return ''
-            v = r[col]
-            if pd.isna(v):
-                return ''
-            if isinstance(v, float):
-                if v.is_integer():
-                    return str(int(v))
-                return f'{v:.2f}'
-            return str(v).strip()
+    done = 0
+    for values in body:
+        def val(i):
+            return jd_batch.cell_text(values[i]) if i is not None and i < len(values) else ''
+
+        done += 1
+        if on_progress and done % jd_batch.PARSE_PROGRESS_EVERY == 0:
+            on_progress(done, max(done, total))
 
         brand = val(brand_col)
         item = val(item_col)
@@ -217,6 +209,8 @@ def _parse_tmall_excel(filepath):
             'product_key': product_key,  # 业务侧编号,只用于显示
             'price_reference': ref,
         })
+    if on_progress:
+        on_progress(done, done)
     return rows
 
 
@@ -224,7 +218,20 @@ def _batch_cooldown(seconds: int, platform: str) -> bool:
     """批次间冷却,可被用户停止打断.每分钟打一条日志(分钟数变化时).
     返回 True 表示正常完成,False 表示被用户中止.
     """
-    global is_crawling
+    global is_crawling, _jd_cooling
+    if platform == 'jd':
+        # 冷却要几分钟(单账号 600s):排着的快速查询不干等,先答缓存 / 回报忙;冷却期间新来的同样处理
+        with _job_lock:
+            _jd_cooling = True
+        _drain_quick_checks('批量冷却中(账号休息),请稍后再查')
+        try:
+            return _cooldown_countdown(seconds, platform)
+        finally:
+            _jd_cooling = False
+    return _cooldown_countdown(seconds, platform)
+
+
+def _cooldown_countdown(seconds: int, platform: str) -> bool:
     import math
     end_time = time.time() + seconds
     last_logged_min = None
@@ -249,6 +256,12 @@ def _batch_cooldown(seconds: int, platform: str) -> bool:
     return is_crawling
 
 
+def _cooldown_maintenance():
+    """批间冷却空窗:给闲置账号的 profile 目录瘦身(清缓存保留登录态),耗时从冷却里扣."""
+    emit_progress({'current_url': '🧹 冷却期维护:清理闲置账号的浏览器缓存…', 'platform': 'jd'})
+    profile_provision.compact_pool(log=emit_log, should_stop=lambda: not is_crawling)
+
+
 def emit_log(level, message, platform=None):
     """发送日志到前端,可选平台前缀"""
     timestamp = datetime.now().strftime("%H:%M:%S")
@@ -270,6 +283,12 @@ def emit_progress(data):
     """发送进度更新到前端"""
     socketio.emit('progress', data)
 
+def _upload_progress(platform):
+    """解析上传清单的进度回调:推 upload_progress(已读行数 / 估计总行数)给前端"""
+    def report(done, total):
+        socketio.emit('upload_progress', {'platform': platform, 'done': done, 'total': total})
+    return report
+
 def emit_result_row(row):
     """发送单条爬取结果到前端"""
     socketio.emit('result_row', row)
@@ -284,7 +303,7 @@ def index():
 @app.route('/api/upload', methods=['POST'])
 def api_upload():
     """上传Excel文件"""
-    global uploaded_df, uploaded_urls, uploaded_rows
+    global uploaded_urls, uploaded_rows
 
     if 'file' not in request.files:
         return jsonify({'error': 'No file uploaded'}), 400
@@ -301,12 +320,9 @@ def api_upload():
     filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
     file.save(filepath)
 
-    # 读取并解析
+    # 读取并解析(只读模式逐行流式读,大清单不整本进内存;进度经 upload_progress 推给前端)
     try:
-        df = pd.read_excel(filepath)
-        uploaded_df = df
-
-        rows = _parse_excel(filepath)
+        rows = jd_batch.parse_jd_excel(filepath, on_progress=_upload_progress('jd'))
         uploaded_rows = rows
         uploaded_urls = [r['url'] for r in rows]
 
@@ -315,11 +331,20 @@ def api_upload():
             'filename': filename,
             'filepath': filepath,
             'url_count': len(rows),
-            'columns': list(df.columns)
+            'columns': jd_batch.sheet_columns(filepath),
+            'duplicate_of': _check_duplicate_upload('jd', filepath, filename, len(rows)),
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def _check_duplicate_upload(platform, filepath, filename, row_count):
+    """按内容哈希登记上传;以前传过同样内容(哪怕文件名不同)则返回那次的记录,前端提示可能重复上传"""
+    try:
+        return crawl_store.record_upload(jd_batch.file_digest(filepath), platform, filename, row_count)
+    except Exception as e:
+        print(f'  上传登记失败(忽略): {e}')
+        return None
+
 @app.route('/api/preview')
 def api_preview():
     """预览上传的数据 — 返回 Brand / Item / URL / Product Key / Price Reference"""
@@ -341,6 +366,17 @@ def api_preview():
 
     return jsonify({'success': True, 'rows': rows, 'total': len(rows)})
 
+def _xlsx_data_rows(path):
+    """首个 sheet 的数据行数(不含表头)。只读模式只解析 sheet 的 dimension,毫秒级。"""
+    from openpyxl import load_workbook
+    wb = load_workbook(path, read_only=True)
+    try:
+        ws = wb.worksheets[0]
+        return max(0, (ws.max_row or 0) - 1)
+    finally:
+        wb.close()
+
+
 @app.route('/api/history')
 def api_history():
     """获取历史爬取结果文件列表"""
@@ -350,11 +386,10 @@ def api_history():
     for f in sorted(glob_mod.glob(os.path.join(output_dir, '*.xlsx')), key=os.path.getmtime, reverse=True):
         fname = os.path.basename(f)
         stat = os.stat(f)
-        # Try to read row count
+        # 行数只读 sheet 维度(openpyxl 只读模式),不为看历史把整表 + pandas 拉进内存
         try:
-            df = pd.read_excel(f)
-            row_count = len(df)
-        except:
+            row_count = _xlsx_data_rows(f)
+        except Exception:
             row_count = None
 
         files.append({
@@ -373,13 +408,8 @@ def api_results():
 
 @app.route('/api/crawl/start', methods=['POST'])
 def api_crawl_start():
-    """开始批量爬取(京东)"""
-    global is_crawling, current_platform, current_batch_file, live_results
-
-    if is_crawling:
-        return jsonify({'error': f'Crawler is already running ({current_platform})'}), 400
-
-    if profile_provision.is_busy():
+    """提交批量爬取(京东) — 入任务队列;爬虫空闲则立即开跑,否则排队等前面的任务跑完"""
+    if profile_provision.is_busy() and not is_crawling:
         return jsonify({'error': '正在配置账号(扫码/验证),请完成后再开始爬取'}), 400
 
     # 预检:profile 池必须非空(patchright 用 launch_persistent_context 直接接管 profile)
@@ -399,25 +429,7 @@ def api_crawl_start():
     if not filepath or not os.path.exists(filepath):
         return jsonify({'error': 'Invalid file path'}), 400
 
-    # 生成输出文件名(JD_ 前缀,便于历史记录按平台识别)
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    output_filename = f"JD_Price_Marks_{timestamp}.xlsx"
-    current_batch_file = os.path.join(app.config['OUTPUT_FOLDER'], output_filename)
-
-    # Reset live results — 只保留另一平台的(京东开跑时清掉旧京东结果)
-    live_results = [r for r in live_results if r.get('platform') != 'jd']
-
-    # 启动爬取任务
-    is_crawling = True
-    current_platform = 'jd'
-    crawling_task = Thread(target=run_crawl_task, args=(filepath, current_batch_file, config))
-    crawling_task.start()
-
-    return jsonify({
-        'success': True,
-        'message': 'Crawling started',
-        'output_file': output_filename
-    })
+    return _submit_job('jd', filepath, config, data.get('priority', 0))
 
 @app.route('/api/crawl/retry', methods=['POST'])
 def api_crawl_retry():
@@ -434,7 +446,7 @@ def api_crawl_retry():
     # _upsert_live_result 在拿到新结果时按 URL 替换旧记录(幂等),不重复也不丢。
     failed_items = [r for r in live_results
                     if r.get('platform') == 'jd'
-                    and r.get('status') in RETRYABLE_STATUSES]
+                    and r.get('status') in jd_batch.RETRYABLE_STATUSES]
 
     if failed_items:
         # in-session:复用当前主文件名,retry 完成后回填得到完整最终版
@@ -447,7 +459,7 @@ def api_crawl_retry():
         err_file = _latest_errors_file()
         if not err_file:
             return jsonify({'error': 'No failed JD items to retry'}), 400
-        failed_items = _parse_excel(err_file)
+        failed_items = jd_batch.parse_jd_excel(err_file)
         if not failed_items:
             return jsonify({'error': 'No failed JD items to retry'}), 400
         master = err_file[:-len('_errors.xlsx')] + '.xlsx'
@@ -459,10 +471,11 @@ def api_crawl_retry():
 
     output_filename = os.path.basename(current_batch_file)
 
-    is_crawling = True
-    current_platform = 'jd'
-    crawling_task = Thread(target=run_crawl_task_from_rows,
-                           args=(failed_items, current_batch_file, {'is_retry': True}))
+    if not _try_acquire_crawler('jd'):
+        return jsonify({'error': f'Crawler is already running ({current_platform})'}), 400
+    crawling_task = Thread(target=_run_adhoc,
+                           args=(run_crawl_task_from_rows,
+                                 (failed_items, current_batch_file, {'is_retry': True})))
     crawling_task.start()
 
     return jsonify({
@@ -474,11 +487,234 @@ def api_crawl_retry():
 
 @app.route('/api/crawl/stop', methods=['POST'])
 def api_crawl_stop():
-    """停止当前正在运行的爬取(共享接口,不区分平台)"""
-    global is_crawling
+    """停止当前正在运行的爬取(共享接口,不区分平台).
+    同时暂停任务队列 —— 排队的任务不会立刻接着跑,新提交任务或 /api/jobs/resume 后恢复"""
+    global is_crawling, _stop_requested, _job_queue_paused
+    _stop_requested = True
+    _job_queue_paused = True
     is_crawling = False
     return jsonify({'success': True, 'message': 'Crawling stopped'})
 
+
+# ==================== 任务队列 ====================
+
+def _submit_job(platform, filepath, config, priority=0):
+    """入队并尝试立即调度.返回给前端:开跑了就和以前一样带 output_file,否则带队列位置"""
+    global _job_queue_paused
+    try:
+        priority = int(priority or 0)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'priority 必须是整数'}), 400
+    job = crawl_store.enqueue_job(platform, filepath, config, priority)
+    _job_queue_paused = False  # 用户主动提交 = 希望队列继续跑
+    _ensure_job_runner()
+    started = _dispatch_next_job()
+    if started and started['id'] == job['id']:
+        return jsonify({
+            'success': True,
+            'message': 'Crawling started',
+            'job_id': job['id'],
+            'output_file': os.path.basename(started['output_file']),
+        })
+    position = crawl_store.queue_position(job['id'])
+    emit_log('INFO', f'任务 #{job["id"]} 已加入队列(第 {position} 位),前面的任务完成后自动开始',
+             platform=platform)
+    socketio.emit('jobs_changed', {})
+    return jsonify({
+        'success': True,
+        'queued': True,
+        'message': f'已加入队列,第 {position} 位',
+        'job_id': job['id'],
+        'position': position,
+    })
+
+
+def _crawler_busy():
+    """调用方需持有 _job_lock"""
+    return is_crawling or current_job_id is not None or _adhoc_task is not None
+
+
+def _try_acquire_crawler(platform, task='retry'):
+    """原子地占用爬虫(retry 等不走队列的入口用),已被占用返回 False.
+    占用到线程调用 _run_adhoc / 自行清空 _adhoc_task 为止"""
+    global is_crawling, current_platform, _stop_requested, _adhoc_task
+    with _job_lock:
+        if _crawler_busy():
+            return False
+        is_crawling = True
+        current_platform = platform
+        _stop_requested = False
+        _adhoc_task = task
+        return True
+
+
+def _run_adhoc(target, args):
+    """在爬取线程里跑一次 retry:跑完(含存盘、回填主文件)才释放爬虫,再调度排队的任务.
+    期间排进来、没被处理的快速查询逐条回报失败,确认队列空了再释放"""
+    global is_crawling, current_platform, _adhoc_task
+    try:
+        target(*args)
+    finally:
+        while True:
+            _finish_quick_checks(None)
+            with _job_lock:
+                if _quick_check_queue.empty():
+                    _adhoc_task = None
+                    is_crawling = False
+                    current_platform = None
+                    break
+    _dispatch_next_job()
+
+
+def _ensure_job_runner():
+    """启动调度线程(进程内一次).顺带把上次进程没跑完的任务放回队首"""
+    global _job_runner_started
+    with _job_lock:
+        if _job_runner_started:
+            return
+        _job_runner_started = True
+    n = crawl_store.requeue_interrupted_jobs()
+    if n:
+        print(f'  [jobs] {n} 个上次中断的任务已放回队首')
+    Thread(target=_job_runner_loop, name='job-runner', daemon=True).start()
+
+
+def _job_runner_loop():
+    while True:
+        time.sleep(2)
+        try:
+            _dispatch_next_job()
+        except Exception as e:
+            print(f'  [jobs] 调度出错(忽略): {e}')
+
+
+def _dispatch_next_job():
+    """爬虫空闲、未暂停、没在配置账号时取下一个任务开跑;返回开跑的任务(没有则 None)"""
+    global is_crawling, current_platform, current_batch_file, current_tmall_batch_file
+    global live_results, current_job_id, _stop_requested
+    with _job_lock:
+        # current_job_id / _adhoc_task 在任务线程彻底退出(存盘、收尾 emit)后才清空 —— 爬取函数内部
+        # 会提前把 is_crawling 置 False,只看它会让下一个任务和上一个的收尾重叠
+        if _crawler_busy() or _job_queue_paused or profile_provision.is_busy():
+            return None
+        job = crawl_store.claim_next_job()
+        if not job:
+            return None
+        platform = job['platform']
+        if not os.path.exists(job['filepath']):
+            crawl_store.finish_job(job['id'], 'failed', f'上传文件已不存在: {job["filepath"]}')
+            return None
+
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        if platform == 'jd':
+            # JD_ 前缀,便于历史记录按平台识别
+            output = os.path.join(app.config['OUTPUT_FOLDER'], f"JD_Price_Marks_{timestamp}.xlsx")
+            current_batch_file = output
+            target, args = run_crawl_task, (job['filepath'], output, job['config'])
+        else:
+            output = os.path.join(app.config['OUTPUT_FOLDER'], f"Tmall_Price_{timestamp}.xlsx")
+            current_tmall_batch_file = output
+            target, args = run_tmall_crawl_task, (job['filepath'], output)
+        crawl_store.set_output_file(job['id'], output)
+        job['output_file'] = output
+
+        # Reset live results — 只保留另一平台的(本平台开跑时清掉旧结果)
+        live_results = [r for r in live_results if r.get('platform') != platform]
+        is_crawling = True
+        current_platform = platform
+        current_job_id = job['id']
+        _stop_requested = False
+        Thread(target=_run_job, args=(job, target, args)).start()
+
+    socketio.emit('job_started', {
+        'job_id': job['id'],
+        'platform': platform,
+        'output_file': os.path.basename(output),
+    })
+    socketio.emit('jobs_changed', {})
+    return job
+
+
+def _run_job(job, target, args):
+    """在爬取线程里跑一个任务,结束后落任务状态并立刻调度下一个(不等轮询)"""
+    global is_crawling, current_platform, current_job_id
+    status, error = 'done', None
+    try:
+        target(*args)
+    except Exception as e:
+        status, error = 'failed', str(e)
+        emit_log('ERROR', f'任务 #{job["id"]} 异常: {e}', platform=job['platform'])
+    finally:
+        if _stop_requested and status == 'done':
+            status = 'stopped'
+        crawl_store.finish_job(job['id'], status, error)
+        with _job_lock:
+            current_job_id = None
+            is_crawling = False  # 爬取函数异常退出时可能没来得及复位
+            current_platform = None
+        socketio.emit('jobs_changed', {})
+    _dispatch_next_job()
+
+
+@app.route('/api/jobs')
+def api_jobs_list():
+    """任务队列:运行中 / 排队中(按执行顺序)+ 最近结束的任务"""
+    jobs = crawl_store.list_jobs()
+    for j in jobs:
+        j['filename'] = os.path.basename(j['filepath'])
+        j['output_filename'] = os.path.basename(j['output_file']) if j['output_file'] else None
+    return jsonify({'success': True, 'jobs': jobs, 'paused': _job_queue_paused,
+                    'current_job_id': current_job_id})
+
+
+@app.route('/api/jobs/<int:job_id>/cancel', methods=['POST'])
+def api_jobs_cancel(job_id):
+    """取消排队中的任务;运行中的任务等同于点「停止」"""
+    if job_id == current_job_id:
+        return api_crawl_stop()
+    ok, err = crawl_store.cancel_job(job_id)
+    if not ok:
+        return jsonify({'error': err}), 400
+    socketio.emit('jobs_changed', {})
+    return jsonify({'success': True})
+
+
+@app.route('/api/jobs/<int:job_id>/priority', methods=['POST'])
+def api_jobs_priority(job_id):
+    """改排队任务的优先级(越大越先跑)"""
+    data = request.json or {}
+    try:
+        priority = int(data.get('priority'))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'priority 必须是整数'}), 400
+    ok, err = crawl_store.set_priority(job_id, priority)
+    if not ok:
+        return jsonify({'error': err}), 400
+    socketio.emit('jobs_changed', {})
+    return jsonify({'success': True})
+
+
+@app.route('/api/jobs/reorder', methods=['POST'])
+def api_jobs_reorder():
+    """按给定 id 顺序重排排队任务(同优先级内生效):{"order": [3, 1, 2]}"""
+    order = (request.json or {}).get('order') or []
+    try:
+        crawl_store.reorder_jobs([int(i) for i in order])
+    except (TypeError, ValueError):
+        return jsonify({'error': 'order 必须是任务 id 列表'}), 400
+    socketio.emit('jobs_changed', {})
+    return jsonify({'success': True})
+
+
+@app.route('/api/jobs/resume', methods=['POST'])
+def api_jobs_resume():
+    """停止后恢复队列调度"""
+    global _job_queue_paused
+    _job_queue_paused = False
+    _ensure_job_runner()
+    _dispatch_next_job()
+    return jsonify({'success': True})
+
 def _kill_stale_browser_processes():
     """杀掉残留的 patchright Chromium for Testing / chromedriver 进程,返回被杀的 pattern 列表.
     ⚠️ 进程命令行是 'Google Chrome for Testing'(路径里只有小写 chromium-1217),
@@ -497,45 +733,19 @@ def _kill_stale_browser_processes():
     return killed
 
 
-def _row_identity(brand, item, url, product_key):
-    """一行的业务身份 = (Brand, Item, URL, Product Key) 归一化元组。
-    ⚠️ 不能只用 URL:源数据里允许同一个京东商品挂多条不同 Item 的行(同 URL 不同 Item),
-    它们是合法的不同行,必须各自保留;只有四元组才能唯一区分。"""
-    return (str(brand or '').strip(), str(item or '').strip(),
-            str(url or '').strip(), str(product_key or '').strip())
-
-
-def _live_row_identity(r):
-    """从 live_results 行(小写键)取身份。Product Key 与写 Excel 时一致:product_key 缺失则用 product_id。"""
-    return _row_identity(r.get('brand'), r.get('item'), r.get('url'),
-                         r.get('product_key') or r.get('product_id'))
-
-
 def _upsert_live_result(row):
     """按「完整行身份」把结果写进 live_results — 已存在同身份旧记录(retry 重爬同一行)就先删旧再加,
     避免 failed 旧行和 success 新行同时存在(否则下次 retry 会把已成功的旧 failed 行又捞出来重爬)。
     仅 retry 用;普通爬取用 append 原样保留所有行(含合法的同 URL 不同 Item 行)。"""
     global live_results
     plat = row.get('platform')
-    key = _live_row_identity(row)
+    key = jd_batch.result_row_identity(row)
     live_results = [r for r in live_results
-                    if not (r.get('platform') == plat and _live_row_identity(r) == key)]
+                    if not (r.get('platform') == plat and jd_batch.result_row_identity(r) == key)]
     live_results.append(row)
 
 
-# 错误小文件与主文件「同名配对」:主文件 JD_Price_Marks_X.xlsx ↔ 错误文件 JD_Price_Marks_X_errors.xlsx。
-# 这样 Flask 重启后(live_results 已清空),retry 只需找到最新的 *_errors.xlsx,
-# 就能既拿到「要重爬哪些」(读错误文件),又知道「回填到哪个主文件」(去掉 _errors 后缀)。
-RETRYABLE_STATUSES = ('failed', 'blocked', 'forbidden', 'skipped')
-
-
-def _errors_path_for(master_path):
-    """主文件路径 → 配对的错误文件路径(……_errors.xlsx)."""
-    if master_path.endswith('.xlsx'):
-        return master_path[:-len('.xlsx')] + '_errors.xlsx'
-    return master_path + '_errors.xlsx'
-
-
+# 错误小文件与主文件同名配对(jd_batch.errors_path_for),Flask 重启后 retry 从最新的 *_errors.xlsx 恢复
 def _latest_errors_file():
     """outputs/ 下最新的京东错误文件,没有则返回 None(用于 Flask 重启后恢复 retry)."""
     import glob
@@ -558,17 +768,9 @@ def api_reset_browser():
             'error': '当前正在爬取,请先点"停止"再重置',
         }), 400
 
-    # 关老 context (best effort — playwright 线程可能已死,会抛 thread error,吞掉)
-    for inst_name in ('crawler_instance', 'tmall_crawler_instance'):
-        inst = globals().get(inst_name)
-        if inst is None:
-            continue
-        try:
-            close_fn = getattr(inst, '_close_context', None) or getattr(inst, 'close', None)
-            if close_fn:
-                close_fn()
-        except Exception:
-            pass
+    # 关老 context(在 actor 线程上执行;actor 卡死则超时放弃并换一条新的)
+    for inst in (crawler_instance, tmall_crawler_instance):
+        _close_crawler(inst)
 
     crawler_instance = None
     tmall_crawler_instance = None
@@ -589,16 +791,8 @@ def api_reset_browser():
 def _free_browser_for_provisioning():
     """扫码/验证前清场:关 crawler 单例 + 杀残留 chromium,避免 profile 目录被占锁。"""
     global crawler_instance, tmall_crawler_instance
-    for inst_name in ('crawler_instance', 'tmall_crawler_instance'):
-        inst = globals().get(inst_name)
-        if inst is None:
-            continue
-        try:
-            close_fn = getattr(inst, '_close_context', None) or getattr(inst, 'close', None)
-            if close_fn:
-                close_fn()
-        except Exception:
-            pass
+    for inst in (crawler_instance, tmall_crawler_instance):
+        _close_crawler(inst)
     crawler_instance = None
     tmall_crawler_instance = None
     _kill_stale_browser_processes()
@@ -657,6 +851,29 @@ def api_profiles_verify():
     return jsonify({'success': True, 'id': int(pid)})
 
 
+@app.route('/api/profiles/verify_all', methods=['POST'])
+def api_profiles_verify_all():
+    """并发无头验证全部账号,结果经 profile_pool_report 事件推送(就绪报告)。"""
+    if is_crawling:
+        return jsonify({'error': '正在爬取,请先停止再验证'}), 400
+    ok, err = profile_provision.start_verify_all(
+        _profile_emit, before_launch=_free_browser_for_provisioning)
+    if not ok:
+        return jsonify({'error': err}), 400
+    return jsonify({'success': True})
+
+
+@app.route('/api/profiles/compact', methods=['POST'])
+def api_profiles_compact():
+    """清理全部账号 profile 的浏览器缓存(保留登录态),逐个报告体积和启动耗时变化。"""
+    if is_crawling:
+        return jsonify({'error': '正在爬取,冷却期间会自动清理;停止后也可手动清理'}), 400
+    ok, err = profile_provision.start_compact(_profile_emit)
+    if not ok:
+        return jsonify({'error': err}), 400
+    return jsonify({'success': True})
+
+
 @app.route('/api/profiles/cooldown', methods=['POST'])
 def api_profiles_cooldown():
     """一键冷却/恢复某 profile(改 .cooldown 后缀,移出/移回轮换)。"""
@@ -696,9 +913,72 @@ def api_download(filename):
     else:
         return jsonify({'error': 'File not found'}), 404
 
+@app.route('/api/export')
+def api_export():
+    """流式导出结果:format=csv|jsonl|parquet;file=outputs 下的主文件名,不传则导出本次结果
+    (platform=jd|tmall,默认 jd).按块边生成边发送,不在内存里拼整本 workbook."""
+    fmt = (request.args.get('format') or 'csv').lower()
+    filename = request.args.get('file')
+    if filename:
+        filepath = os.path.join(app.config['OUTPUT_FOLDER'], os.path.basename(filename))
+        if not os.path.exists(filepath):
+            return jsonify({'error': 'File not found'}), 404
+        rows = result_export.iter_xlsx_rows(filepath)
+        download_name = result_export.export_filename(os.path.basename(filepath), fmt)
+    else:
+        platform = request.args.get('platform') or 'jd'
+        if platform not in ('jd', 'tmall'):
+            return jsonify({'error': f'未知平台: {platform}'}), 400
+        # 只拷引用列表(爬取线程还在 append),映射成 Excel 列在生成器里逐行做
+        snapshot = [r for r in live_results if r.get('platform') == platform]
+        rows = result_export.excel_rows(platform, snapshot)
+        download_name = result_export.export_filename(
+            f'{platform.upper()}_Results_{datetime.now().strftime("%Y%m%d_%H%M%S")}', fmt)
+
+    stream, err = result_export.export_stream(rows, fmt)
+    if stream is None:
+        return jsonify({'error': err}), 400
+    return Response(stream_with_context(stream), mimetype=result_export.EXPORT_FORMATS[fmt],
+                    headers={'Content-Disposition': f'attachment; filename="{download_name}"'})
+
+
+@app.route('/api/diff')
+def api_diff():
+    """价格对比:file=主文件名(默认最新一份),baseline=基线文件名(默认 file 之前的一份);
+    all=1 连 same 一起返回,limit 限制返回行数(汇总始终是全量)"""
+    output_dir = app.config['OUTPUT_FOLDER']
+    filename = request.args.get('file')
+    if filename:
+        path = os.path.join(output_dir, os.path.basename(filename))
+    else:
+        masters = price_diff.list_masters(output_dir)
+        if not masters:
+            return jsonify({'error': '还没有京东结果文件'}), 404
+        path = masters[0]
+    baseline = request.args.get('baseline')
+    if baseline:
+        baseline = os.path.join(output_dir, os.path.basename(baseline))
+
+    diff, baseline, err = price_diff.build_diff(path, baseline)
+    if err:
+        return jsonify({'error': err}), 404 if err.startswith('找不到') else 500
+    return jsonify({
+        'success': True,
+        'file': os.path.basename(path),
+        'baseline': os.path.basename(baseline) if baseline else None,
+        'summary': price_diff.summarize(diff),
+        'rows': price_diff.diff_records(diff, changes_only=request.args.get('all') != '1',
+                                        limit=request.args.get('limit', 0, type=int)),
+    })
+
+
 @app.route('/api/template')
 def api_template():
     """下载上传模板 Excel"""
+    from openpyxl import Workbook
+    from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+    from openpyxl.utils import get_column_letter
+    from openpyxl.comments import Comment
     wb = Workbook()
 
     # ----- Sheet 1: Products -----
@@ -785,16 +1065,172 @@ def api_template():
         mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
     )
 
+def _cache_price(row):
+    """把一条京东结果写进快速查询价格缓存(成功/部分/下架/不存在;可重试的失败不缓存)"""
+    if row.get('status') not in QUICK_CHECK_CACHEABLE or not row.get('product_id'):
+        return
+    _price_cache[row['product_id']] = {
+        'status': row['status'],
+        'original_price': row.get('original_price'),
+        'promo_price': row.get('promo_price'),
+        'crawl_time': row.get('crawl_time'),
+        'ts': time.time(),
+    }
+
+
+def _cached_price(product_id):
+    """快速查询先查缓存:内存没有时从最新一份京东主文件预热一次(只读,openpyxl 只读模式)"""
+    global _price_cache_warmed
+    if not _price_cache_warmed:
+        _price_cache_warmed = True
+        files = [f for f in glob_mod.glob(os.path.join(app.config['OUTPUT_FOLDER'], 'JD_*.xlsx'))
+                 if not f.endswith('_errors.xlsx')]
+        if files:
+            try:
+                _warm_price_cache(max(files, key=os.path.getmtime))
+            except Exception as e:
+                print(f'  价格缓存预热失败(忽略): {e}')
+    return _price_cache.get(product_id)
+
+
+def _warm_price_cache(path):
+    from openpyxl import load_workbook
+    wb = load_workbook(path, read_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = [str(h or '') for h in next(rows, ())]
+        col = {name: i for i, name in enumerate(header)}
+        if 'URL' not in col or 'Status' not in col:
+            return
+        mtime = os.path.getmtime(path)
+        for values in rows:
+            m = re.search(r'/(\d+)\.html', str(values[col['URL']] or ''))
+            if not m or m.group(1) in _price_cache:
+                continue
+            status = str(values[col['Status']] or '')
+            if status not in QUICK_CHECK_CACHEABLE:
+                continue
+            _price_cache[m.group(1)] = {
+                'status': status,
+                'original_price': values[col['Price']] if 'Price' in col else None,
+                'promo_price': values[col['Promotion Price']] if 'Promotion Price' in col else None,
+                'crawl_time': values[col['Crawl Time']] if 'Crawl Time' in col else None,
+                'ts': mtime,
+            }
+    finally:
+        wb.close()
+
+
+def _emit_quick_check(product_id, prices, cached_at=None):
+    """按 get_price_via_search 的返回(或缓存条目)推送 quick_check_result"""
+    if prices and prices.get('original') in ('not_found', 'blocked', 'forbidden', 'unavailable'):
+        socketio.emit('quick_check_result', {
+            'success': False,
+            'product_id': product_id,
+            'status': prices['original'],
+            'error': f'Product status: {prices["original"]}',
+            'cached': cached_at is not None,
+        })
+    elif prices:
+        socketio.emit('quick_check_result', {
+            'success': True,
+            'product_id': product_id,
+            'original_price': prices.get('original'),
+            'promo_price': prices.get('promo'),
+            'url': f'https://item.jd.com/{product_id}.html',
+            'cached': cached_at is not None,
+            'crawl_time': cached_at,
+        })
+    else:
+        socketio.emit('quick_check_result', {
+            'success': False,
+            'product_id': product_id,
+            'error': 'Could not extract price'
+        })
+
+
+def _emit_cached_quick_check(product_id, cached):
+    verdict = cached['status'] if cached['status'] in ('unavailable', 'not_found') else None
+    _emit_quick_check(product_id,
+                      {'original': verdict or cached['original_price'], 'promo': cached['promo_price']},
+                      cached_at=cached['crawl_time'])
+
+
+def _quick_check_fetch(crawler, product_id):
+    """用给定 crawler 实时查一条,推结果并写缓存;返回 get_price_via_search 的结果(出错为 None)"""
+    socketio.emit('quick_check_status', {'status': 'fetching', 'product_id': product_id})
+    try:
+        prices = crawler.get_price_via_search(product_id)
+    except Exception as e:
+        socketio.emit('quick_check_result', {'success': False, 'product_id': product_id, 'error': str(e)})
+        return None
+    if prices:
+        row = {'product_id': product_id, 'crawl_time': datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+        original = prices.get('original')
+        if original in ('not_found', 'unavailable'):
+            row.update(status=original, original_price='-', promo_price='-')
+        elif original not in ('blocked', 'forbidden'):
+            row.update(status='success', original_price=original, promo_price=prices.get('promo'))
+        _cache_price(row)
+    _emit_quick_check(product_id, prices)
+    return prices
+
+
+def _service_quick_check(crawler):
+    """批量爬取的行间隙调用:有排队的快速查询就借当前账号查一条.
+    返回这一条的行状态('success' / 'blocked' / 'failed' …),没有排队的返回 None;
+    run_jd_batch 把它当本批的一行:占批名额、计入失败计数和软风控 / 换号判断."""
+    try:
+        product_id = _quick_check_queue.get_nowait()
+    except queue_mod.Empty:
+        return None
+    emit_log('INFO', f'  ⚡ 快速查询插队: {product_id}(借用当前账号,计入本批)')
+    prices = _quick_check_fetch(crawler, product_id)
+    return jd_batch.apply_jd_prices({}, prices, log=lambda *a: None)['status']
+
+
+def _drain_quick_checks(error):
+    """排着的快速查询不再等行间隙:有缓存的再推一次缓存,没有的回报 error"""
+    while True:
+        try:
+            product_id = _quick_check_queue.get_nowait()
+        except queue_mod.Empty:
+            return
+        cached = _cached_price(product_id)
+        if cached:
+            _emit_cached_quick_check(product_id, cached)
+        else:
+            socketio.emit('quick_check_result', {'success': False, 'product_id': product_id, 'error': error})
+
+
+def _finish_quick_checks(crawler):
+    """批次收尾:会话还健康就把排队的快速查询查完,否则逐条回报失败(不留到下一次批量)"""
+    healthy = crawler is not None and is_crawling and crawler.is_session_valid()
+    while True:
+        if healthy:
+            if not _service_quick_check(crawler):
+                return
+            time.sleep(random.uniform(2.0, 4.0))
+            continue
+        try:
+            product_id = _quick_check_queue.get_nowait()
+        except queue_mod.Empty:
+            return
+        socketio.emit('quick_check_result', {'success': False, 'product_id': product_id,
+                                             'error': '批量已结束/中止,请重新查询'})
+
+
 @app.route('/api/quick-check', methods=['POST'])
 def api_quick_check():
-    """快速查询单个商品价格"""
-    global crawler_instance, is_crawling
-
-    if is_crawling:
-        return jsonify({'error': 'Crawler is busy with batch job'}), 400
+    """快速查询单个商品价格 — 先答缓存,再按需实时查:
+    空闲时复用常驻的 warm crawler(没有才冷启动);批量进行中不拒绝,
+    而是排队到当前批次的下一个行间隙,借用正在跑的账号查一条(占该批一个名额);
+    批次冷却中没有行间隙,直接答缓存 / 回报忙."""
+    global crawler_instance
 
     data = request.json
     product_input = data.get('product_id', '').strip()
+    force = bool(data.get('force'))
 
     if not product_input:
         return jsonify({'error': 'Product ID is required'}), 400
@@ -806,16 +1242,44 @@ def api_quick_check():
 
     product_id = match.group(1)
 
+    cached = _cached_price(product_id)
+    if cached:
+        _emit_cached_quick_check(product_id, cached)
+        if not force and time.time() - cached['ts'] < QUICK_CHECK_CACHE_TTL:
+            return jsonify({'success': True, 'message': 'Answered from cache', 'product_id': product_id,
+                            'cached': True})
+
+    # 与 retry 同一把锁原子地占用爬虫:占不到(批量 / 另一条快速查询进行中)就排队.
+    # 判忙 + 入队在锁内做,占用方释放前也在锁内确认队列已空,排进去的查询不会没人处理
+    while not _try_acquire_crawler('jd', 'quick_check'):
+        with _job_lock:
+            if not _crawler_busy():
+                continue  # 刚好被释放了,重新占用
+            servicing = (current_platform == 'jd' and not _jd_cooling
+                         and (crawler_instance is not None or _quick_check_active))
+            if servicing:
+                _quick_check_queue.put(product_id)
+        if not servicing:
+            if cached:
+                return jsonify({'success': True, 'message': 'Answered from cache (crawler busy)',
+                                'product_id': product_id, 'cached': True})
+            return jsonify({'error': f'Crawler is busy ({current_platform}),缓存中也没有该商品'}), 400
+        socketio.emit('quick_check_status', {'status': 'queued', 'product_id': product_id})
+        return jsonify({'success': True, 'message': 'Queued into running batch', 'product_id': product_id,
+                        'queued': True})
+
     # Run in a thread and return result via socket
     def do_check():
-        global crawler_instance
+        global crawler_instance, is_crawling, current_platform, _quick_check_active, _adhoc_task
+        _quick_check_active = True
+        crawler = None
         try:
             socketio.emit('quick_check_status', {'status': 'starting', 'product_id': product_id})
 
-            # Initialize crawler if needed
+            # 复用常驻 warm crawler(actor 线程持有,跨请求线程安全);失效才冷启动
             if not crawler_instance or not crawler_instance.is_session_valid():
                 socketio.emit('quick_check_status', {'status': 'logging_in', 'product_id': product_id})
-                crawler = JDCrawlerViaSearch(headless=False)
+                crawler = _new_jd_crawler()
                 crawler.login()
                 if not crawler.is_logged_in:
                     socketio.emit('quick_check_result', {
@@ -828,35 +1292,7 @@ def api_quick_check():
             else:
                 crawler = crawler_instance
 
-            socketio.emit('quick_check_status', {'status': 'fetching', 'product_id': product_id})
-            prices = crawler.get_price_via_search(product_id)
-
-            if prices:
-                original = prices.get('original')
-                promo = prices.get('promo')
-
-                # Determine status
-                if original in ('not_found', 'blocked', 'forbidden', 'unavailable'):
-                    socketio.emit('quick_check_result', {
-                        'success': False,
-                        'product_id': product_id,
-                        'status': original,
-                        'error': f'Product status: {original}'
-                    })
-                else:
-                    socketio.emit('quick_check_result', {
-                        'success': True,
-                        'product_id': product_id,
-                        'original_price': original,
-                        'promo_price': promo,
-                        'url': f'https://item.jd.com/{product_id}.html'
-                    })
-            else:
-                socketio.emit('quick_check_result', {
-                    'success': False,
-                    'product_id': product_id,
-                    'error': 'Could not extract price'
-                })
+            _quick_check_fetch(crawler, product_id)
 
         except Exception as e:
             socketio.emit('quick_check_result', {
@@ -864,6 +1300,17 @@ def api_quick_check():
                 'product_id': product_id,
                 'error': str(e)
             })
+        finally:
+            # 占用期间排进来的查询一并处理(会话不健康则逐条回报失败),队列确认空了再释放爬虫
+            while True:
+                _finish_quick_checks(crawler)
+                with _job_lock:
+                    if _quick_check_queue.empty():
+                        _quick_check_active = False
+                        _adhoc_task = None
+                        is_crawling = False
+                        current_platform = None
+                        break
 
     thread = Thread(target=do_check)
     thread.start()
@@ -872,103 +1319,12 @@ def api_quick_check():
 
 # ==================== 爬取任务 ====================
 
-def process_single_row(crawler, input_row, idx, total, batch_time):
-    """处理单行并返回结果 row"""
-    global is_crawling
-
-    url = str(input_row.get('url', ''))
-    # 始终从 URL 解析 product_id — 不信任 Excel 里的 ProductKey 列
-    # (那列经常被污染成 "ID|商品名" 的脏数据,且本来就是另一个系统的 ID)
-    m = re.search(r'/(\d+)\.html', url)
-    product_id = m.group(1) if m else ''
-
-    if not product_id:
-        emit_log('WARNING', f'[{idx}/{total}] Cannot extract product ID: {url}')
-        return None
-
-    item_label = input_row.get('item') or product_id
-    emit_log('INFO', f'[{idx}/{total}] Processing: {item_label}')
-
-    # 发送进度
-    emit_progress({
-        'current': idx,
-        'total': total,
-        'percent': round(idx / total * 100, 1),
-        'current_url': url,
-        'product_id': product_id,
-        'status': 'processing'
-    })
-
-    crawl_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    row = {
-        'index': idx,
-        'platform': 'jd',
-        'brand': input_row.get('brand', ''),
-        'item': input_row.get('item', ''),
-        'product_key': input_row.get('product_key', ''),
-        'price_reference': input_row.get('price_reference', ''),
-        'product_id': product_id,
-        'url': url,
-        'batch_time': batch_time,
-        'crawl_time': crawl_time,
-        'original_price': None,
-        'promo_price': None,
-        'status': 'pending'
-    }
-
-    try:
-        prices = crawler.get_price_via_search(product_id)
-
-        if prices:
-            original = prices.get('original')
-            promo = prices.get('promo')
-            diag = prices.get('_diag', '')
-
-            if original == 'not_found':
-                emit_log('WARNING', f'  Product not found')
-                row.update({'status': 'not_found', 'original_price': '-', 'promo_price': '-'})
-            elif original == 'blocked':
-                emit_log('WARNING', f'  Anti-crawl triggered (retry) | {diag}')
-                row.update({'status': 'blocked', 'original_price': '-', 'promo_price': '-'})
-            elif original == 'forbidden':
-                emit_log('WARNING', f'  403 Forbidden (retry) | {diag}')
-                row.update({'status': 'forbidden', 'original_price': '-', 'promo_price': '-'})
-            elif original == 'unavailable':
-                emit_log('WARNING', f'  Product delisted')
-                row.update({'status': 'unavailable', 'original_price': '-', 'promo_price': '-'})
-            else:
-                emit_log('INFO', f'  OK: ¥{original} / ¥{promo}')
-                row.update({
-                    'status': 'success',
-                    'original_price': original,
-                    'promo_price': promo
-                })
-                if not original or not promo:
-                    row['status'] = 'partial'
-        else:
-            # 收集诊断信息(get_price 返回 None 通常是会话/网络问题,或价格元素提取失败)
-            none_diag = ''
-            try:
-                none_diag = (f'url="{(crawler.driver.current_url or "")[:90]}" '
-                             f'title="{(crawler.driver.title or "")[:50]}"')
-            except Exception:
-                none_diag = 'driver state unavailable'
-            emit_log('WARNING', f'  Failed (can retry) | prices=None | {none_diag}')
-            row.update({'status': 'failed', 'original_price': '-', 'promo_price': '-'})
-
-    except Exception as e:
-        emit_log('ERROR', f'  Error: {str(e)}')
-        row.update({'status': 'failed', 'original_price': '-', 'promo_price': '-'})
-
-    return row
-
-
 def run_crawl_task(input_filepath, output_filepath, config):
     """运行爬取任务（从文件）"""
     global uploaded_urls, uploaded_rows
 
     emit_log('INFO', f'Reading file: {os.path.basename(input_filepath)}')
-    rows = _parse_excel(input_filepath)
+    rows = jd_batch.parse_jd_excel(input_filepath, on_progress=_upload_progress('jd'))
     uploaded_rows = rows
     uploaded_urls = [r['url'] for r in rows]
     run_crawl_task_from_rows(rows, output_filepath, config)
@@ -978,13 +1334,16 @@ def run_crawl_task_from_rows(input_rows, output_filepath, config):
     """运行爬取任务(京东,从 row dict 列表)"""
     global is_crawling, current_platform, crawler_instance, current_results, live_results
 
+    # engine=async:整个账号池在一个事件循环里并发跑(见 jd_crawler_async)
+    # engine=process:每个账号一个受监管的子进程,崩溃/卡死只重启它自己(见 profile_workers)
+    if (config or {}).get('engine') in ('async', 'process'):
+        return _run_jd_pool_task(input_rows, output_filepath, config)
+
     # retry 时按「行身份」替换 live_results 里的旧 failed 行(幂等);普通爬取原样 append 保留所有行
     is_retry = bool((config or {}).get('is_retry'))
 
     # 爬取强度:UI 传 speed=regular/fast/enhanced,决定每批条数与批间冷却(默认常规)
-    preset = JD_SPEED_PRESETS.get((config or {}).get('speed'), JD_SPEED_PRESETS['regular'])
-    batch_size = preset['batch_size']
-    batch_cooldown = preset['cooldown']
+    preset = jd_batch.speed_preset((config or {}).get('speed'))
 
     try:
         total = len(input_rows)
@@ -1006,19 +1365,13 @@ def run_crawl_task_from_rows(input_rows, output_filepath, config):
             # 直接 launch_persistent_context 会撞 "Opening in existing browser session"
             # → TargetClosedError(retry 失效的根因)。先关旧 context + 杀残留进程,确保干净启动。
             if crawler_instance is not None:
-                try:
-                    close_fn = (getattr(crawler_instance, '_close_context', None)
-                                or getattr(crawler_instance, 'close', None))
-                    if close_fn:
-                        close_fn()
-                except Exception:
-                    pass
+                _close_crawler(crawler_instance)
                 crawler_instance = None
             killed = _kill_stale_browser_processes()
             if killed:
                 emit_log('INFO', f'已清理残留浏览器进程: {", ".join(killed)}')
                 time.sleep(1.5)
-            crawler = JDCrawlerViaSearch(headless=False)
+            crawler = _new_jd_crawler()
             crawler_instance = crawler
             emit_log('INFO', 'Logging in...')
             crawler.login()
@@ -1042,8 +1395,8 @@ def run_crawl_task_from_rows(input_rows, output_filepath, config):
             if warmup_err:
                 emit_log('ERROR', f'   底层错误: {warmup_err}')
             emit_log('ERROR',
-                     '   常见原因: Flask 长时间空闲后 patchright 工作线程退出,'
-                     '或者上一次跑完后 chromium 进程已被关闭')
+                     '   常见原因: 上一次跑完后 chromium 进程已被关闭或崩溃'
+                     '(patchright 对象由常驻 owner 线程持有,不再因线程退出而失效)')
             emit_log('ERROR',
                      '   解决方法: 在终端运行 `lsof -ti :5001 | xargs kill -9` 杀掉 Flask,'
                      '然后 `python3 app.py` 重启,再点开始爬取')
@@ -1056,302 +1409,47 @@ def run_crawl_task_from_rows(input_rows, output_filepath, config):
             })
             return
 
-        batch_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         start_time = time.time()
 
-        success_count = 0
-        failed_count = 0
-        unavailable_count = 0
-        consecutive_failures = 0
-        anti_crawl_cooldowns = 0  # 单批内已触发反爬冷却的次数
-
-        # 自动分批:单批 batch_size 条,批次间冷却 batch_cooldown 秒(由爬取强度预设决定)
-        chunks = [input_rows[i:i + batch_size]
-                  for i in range(0, total, batch_size)]
-        total_batches = len(chunks)
-        if total_batches > 1:
-            emit_log('INFO',
-                     f'自动分批({preset["label"]}强度): {total} 条 -> {total_batches} 批 '
-                     f'(每批 {batch_size} 条, 批间冷却 {batch_cooldown//60} 分钟)')
-
-        global_idx = 0
-        user_stopped = False
-        session_dead = False  # 浏览器会话异常死亡(被关/崩溃)—— 与"真·反爬"区分,触发后如实报告并中止
-        # 一旦发现无法账号交替(只有 1 个可用账号),本次任务后续直接走冷却,
-        # 不再每批反复尝试 rotate(避免对登录过期的 profile 反复 close/launch 的无谓 churn)
-        single_account_mode = False
-
-        for batch_idx, chunk in enumerate(chunks, 1):
-            if not is_crawling:
-                user_stopped = True
-                break
-
-            if total_batches > 1:
-                emit_log('INFO', f'━━━ 第 {batch_idx}/{total_batches} 批: {len(chunk)} 条 ━━━')
-
-            # 单批内的反爬冷却计数器重置(批与批独立)
-            consecutive_failures = 0
-            anti_crawl_cooldowns = 0
-            # 随机游走计数器:每 10-15 条插入一次"伪浏览"(访问首页/购物车),制造行为多样性
-            items_since_walk = 0
-            next_walk_at = random.randint(10, 15)
-
-            for chunk_idx, input_row in enumerate(chunk):
-                if not is_crawling:
-                    user_stopped = True
-                    break
-                global_idx += 1
-                idx = global_idx
-
-                # 触发随机游走(在请求当前商品 *之前*,让 referer 看起来像从首页/购物车点进来)
-                if items_since_walk >= next_walk_at:
-                    try:
-                        label = crawler.random_walk()
-                        emit_log('INFO', f'  ↪ 插入伪浏览: {label}(降低线性行为可疑度)')
-                    except Exception as e:
-                        emit_log('WARNING', f'  ↪ 伪浏览失败(忽略): {e}')
-                    items_since_walk = 0
-                    next_walk_at = random.randint(10, 15)
-
-                # 单批内突发失败:先分清「浏览器会话已死(被关/崩溃)」还是「真·反爬」
-                if consecutive_failures >= 2:
-                    # 走 CDP 真探活。会话死了就如实中止,绝不误报成反爬去冷却重试。
-                    if not crawler.is_session_valid():
-                        emit_log('ERROR', '❌ 浏览器会话异常停止(可能被外部关闭或崩溃),已中止本次采集')
-                        emit_log('ERROR', '   这不是反爬。请点「重置浏览器会话」后重新开始。')
-                        session_dead = True
-                        is_crawling = False
-                        break
-
-                    # 会话健康 → 判定为真·反爬,冷却
-                    anti_crawl_cooldowns += 1
-                    cooldown = min(30 + anti_crawl_cooldowns * 30, 120)
-                    emit_log('WARNING', f'检测到反爬,冷却{cooldown}秒... (第{anti_crawl_cooldowns}次)')
-                    time.sleep(cooldown)
-                    consecutive_failures = 0
-
-                    # 冷却后先访问京东首页"重置"会话;若此时会话已死,同样如实中止
-                    try:
-                        emit_log('INFO', '重置会话:访问京东首页...')
-                        crawler.driver.get("https://www.jd.com")
-                        time.sleep(random.uniform(3.0, 5.0))
-                        crawler.driver.execute_script("window.scrollTo(0, 500);")
-                        time.sleep(1)
-                        crawler.driver.execute_script("window.scrollTo(0, 0);")
-                        time.sleep(1)
-                    except Exception:
-                        if not crawler.is_session_valid():
-                            emit_log('ERROR', '❌ 浏览器会话异常停止,已中止本次采集。请重置浏览器后重试')
-                            session_dead = True
-                            is_crawling = False
-                            break
-
-                row = process_single_row(crawler, input_row, idx, total, batch_time)
-                if not row:
-                    continue
-
-                if is_retry:
-                    _upsert_live_result(row)
-                else:
-                    live_results.append(row)
-                emit_result_row(row)
-                items_since_walk += 1
-
-                if row['status'] == 'success':
-                    success_count += 1
-                    consecutive_failures = 0
-                    anti_crawl_cooldowns = 0
-                elif row['status'] in ('failed', 'blocked', 'forbidden', 'partial'):
-                    failed_count += 1
-                    consecutive_failures += 1
-                elif row['status'] in ('unavailable', 'not_found'):
-                    unavailable_count += 1
-
-                emit_progress({
-                    'statistics': {
-                        'success': success_count,
-                        'failed': failed_count,
-                        'unavailable': unavailable_count,
-                        'total': idx,
-                    }
-                })
-
-                # 连续 3 次失败 — 当前 profile 被风控,切换到下一个 profile 继续
-                if consecutive_failures >= 3:
-                    emit_log('WARNING',
-                             f'⚠ 连续 3 次失败 — 当前 profile_{crawler.current_profile_id} 可能被风控,'
-                             f'尝试切换到下一个 profile...')
-                    new_pid = crawler.switch_to_next_profile()
-                    if new_pid is None:
-                        # 所有 profile 耗尽 — 把本批剩余标记 skipped 进入下一批冷却
-                        remaining_rows = chunk[chunk_idx + 1:]
-                        skip_n = len(remaining_rows)
-                        emit_log('ERROR',
-                                 f'✗ profile 池已耗尽 — 跳过本批剩余 {skip_n} 条,'
-                                 f'进入下一批冷却({batch_cooldown//60} 分钟后会重新从 profile_1 开始)')
-                        crawl_time_now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                        for sk_row in remaining_rows:
-                            global_idx += 1
-                            sk_url = str(sk_row.get('url', ''))
-                            m = re.search(r'/(\d+)\.html', sk_url)
-                            sk_pid = m.group(1) if m else ''
-                            skipped = {
-                                'index': global_idx,
-                                'platform': 'jd',
-                                'brand': sk_row.get('brand', ''),
-                                'item': sk_row.get('item', ''),
-                                'product_key': sk_row.get('product_key', ''),
-                                'price_reference': sk_row.get('price_reference', ''),
-                                'product_id': sk_pid,
-                                'url': sk_url,
-                                'batch_time': batch_time,
-                                'crawl_time': crawl_time_now,
-                                'original_price': '-',
-                                'promo_price': '-',
-                                'status': 'skipped',
-                            }
-                            if is_retry:
-                                _upsert_live_result(skipped)
-                            else:
-                                live_results.append(skipped)
-                            emit_result_row(skipped)
-                            failed_count += 1
-                        emit_progress({
-                            'statistics': {
-                                'success': success_count,
-                                'failed': failed_count,
-                                'unavailable': unavailable_count,
-                                'total': global_idx,
-                            }
-                        })
-                        # 重置 profile 池游标,下一批冷却完后重新从 profile_1 开始
-                        crawler.current_profile_id = None
-                        break  # 跳出 chunk,进入批次间冷却
-
-                    # 切换成功 — 重置计数器,继续当前批
-                    emit_log('INFO', f'✓ 已切到 profile_{new_pid},继续爬取')
-                    consecutive_failures = 0
-                    anti_crawl_cooldowns = 0
-
-                # 单条间延迟 — get_price_via_search 内部已有 10-15s 真实停留,
-                # 这里只额外加少量间隔(2-4s)用于模拟"看完一个商品后切到下一个"的过渡
-                time.sleep(random.uniform(2.0, 4.0))
-
-            # 批次间:优先「账号交替」——切到下一个账号继续,用对方那批的时长填掉冷却空窗(免等)。
-            # 只在两种情况下才真正冷却:① 上一批 profile 池耗尽(全员被风控,需自愈时间);
-            # ② 只剩 1 个可用账号(无从交替,退回已验证的 600s)。冷却值绝不缩水。
-            if batch_idx < total_batches and is_crawling:
-                if crawler.current_profile_id is None:
-                    # 池耗尽:给所有账号自愈时间
-                    emit_log('INFO',
-                             f'✓ 第 {batch_idx}/{total_batches} 批完成(账号池耗尽)— '
-                             f'冷却 {batch_cooldown//60} 分钟后继续')
-                    if not _batch_cooldown(batch_cooldown, platform='jd'):
-                        user_stopped = True
-                        break
-                else:
-                    new_pid = None if single_account_mode else crawler.rotate_profile()
-                    if new_pid is not None:
-                        emit_log('INFO',
-                                 f'✓ 第 {batch_idx}/{total_batches} 批完成 — '
-                                 f'切到 profile_{new_pid} 继续(账号交替,免冷却)')
-                    else:
-                        # 只有 1 个可用账号 → 用验证过的 600s,不缩水;并记住,后续不再尝试交替
-                        single_account_mode = True
-                        emit_log('INFO',
-                                 f'✓ 第 {batch_idx}/{total_batches} 批完成 — '
-                                 f'仅 1 个可用账号,冷却 {batch_cooldown//60} 分钟后继续')
-                        if not _batch_cooldown(batch_cooldown, platform='jd'):
-                            user_stopped = True
-                            break
+        def on_row(row):
+            if is_retry:
+                _upsert_live_result(row)
+            else:
+                live_results.append(row)
+            _cache_price(row)
+            emit_result_row(row)
+
+        summary = jd_batch.run_jd_batch(
+            crawler, input_rows, preset, on_row,
+            log=emit_log,
+            on_progress=emit_progress,
+            should_stop=lambda: not is_crawling,
+            cooldown=lambda seconds: _batch_cooldown(seconds, platform='jd'),
+            between_rows=lambda: _service_quick_check(crawler),
+            watchdog=_jd_watchdog,
+            maintenance=_cooldown_maintenance,
+            sizer=jd_batch.AccountBatchSizer(),
+            dead_cache=jd_batch.DeadSkuCache(),
+            price_api=bool((config or {}).get('price_api')),
+            prefetch=bool((config or {}).get('prefetch')),
+            snapshots=_jd_snapshots,
+        )
+        success_count = summary['success']
+        failed_count = summary['failed']
+        unavailable_count = summary['unavailable']
+        user_stopped = summary['stopped']
+        session_dead = summary['session_dead']
+        if session_dead:
+            is_crawling = False
 
         if user_stopped and not session_dead:
             emit_log('WARNING', 'Crawl stopped by user')
+        _finish_quick_checks(None if (user_stopped or session_dead) else crawler)
 
-        # 保存 Excel — 按「行身份」回填进磁盘上已有的主文件:
-        # retry 只爬了几条、或 Flask 重启后 live_results 只剩本次几条时,主文件里「没参与本次」
-        # 的其余行原样保留,本次结果就地替换对应行。用列表+身份匹配(不是按 URL 建字典),
-        # 因为同 URL 不同 Item 是合法的多行,字典会把它们折叠丢行。
         emit_log('INFO', 'Saving results to Excel...')
         # 通知前端:开始生成可下载的 Excel(覆盖正常结束/停止/会话异常所有结束路径)
         socketio.emit('crawl_saving', {'platform': 'jd'})
-
-        def _to_excel_row(r):
-            return {
-                'Batch Time': r['batch_time'],
-                'Crawl Time': r['crawl_time'],
-                'Brand': r.get('brand', ''),
-                'Item': r.get('item', ''),
-                'URL': r['url'],
-                'Product Key': r.get('product_key', '') or r.get('product_id', ''),
-                'Price Reference': r.get('price_reference', ''),
-                'Status': r['status'],
-                'Price': r['original_price'] if r['original_price'] not in (None, '-') else 'N/A',
-                'Promotion Price': r['promo_price'] if r['promo_price'] not in (None, '-') else 'N/A',
-            }
-
-        # 本次会话的京东结果,按行身份建索引(同身份取最后一条)
-        session_by_id = {}
-        for r in live_results:
-            if r.get('platform') == 'jd' and r.get('url'):
-                session_by_id[_live_row_identity(r)] = _to_excel_row(r)
-
-        out_rows = []
-        if os.path.exists(output_filepath):
-            # 主文件已存在(retry/重启):逐行读旧主文件,身份命中本次结果就就地替换,否则原样保留 —— 保序、保数量
-            used = set()
-            try:
-                old_df = pd.read_excel(output_filepath)
-                for _, orow in old_df.iterrows():
-                    oid = _row_identity(orow.get('Brand'), orow.get('Item'),
-                                        orow.get('URL'), orow.get('Product Key'))
-                    if oid in session_by_id:
-                        out_rows.append(session_by_id[oid])
-                        used.add(oid)
-                    else:
-                        out_rows.append({c: ('' if pd.isna(orow[c]) else orow[c])
-                                         for c in old_df.columns})
-            except Exception as e:
-                emit_log('WARNING', f'读取旧主文件失败(忽略,按本次结果全新写入): {e}')
-                out_rows = []
-                used = set()
-            # 本次有、但旧主文件里没有的(全新行)追加到末尾
-            for sid, srow in session_by_id.items():
-                if sid not in used:
-                    out_rows.append(srow)
-        else:
-            # 全新一批:原样写出本次所有行(普通爬取用 append,合法的同 URL 不同 Item 行都在)
-            out_rows = [_to_excel_row(r) for r in live_results
-                        if r.get('platform') == 'jd' and r.get('url')]
-
-        df_results = pd.DataFrame(out_rows)
-        df_results.to_excel(output_filepath, index=False, engine='openpyxl')
-
-        # 产出/更新独立错误小文件(上传格式 5 列)——可持久化、可手动当新批次重跑、retry 的数据源。
-        #    从合并后的主文件真相派生「当前还失败的」,全成功则删掉旧错误文件避免误导。
-        errors_path = _errors_path_for(output_filepath)
-        err_rows = [row for row in out_rows
-                    if str(row.get('Status', '')) in RETRYABLE_STATUSES]
-        if err_rows:
-            err_df = pd.DataFrame([{
-                'Brand': row.get('Brand', ''),
-                'Item': row.get('Item', ''),
-                'URL': row.get('URL', ''),
-                'Product Key': row.get('Product Key', ''),
-                'Price Reference': row.get('Price Reference', ''),
-            } for row in err_rows])
-            err_df.to_excel(errors_path, index=False, engine='openpyxl')
-            errors_file_name = os.path.basename(errors_path)
-            emit_log('INFO',
-                     f'  ⚠ {len(err_rows)} 条失败/跳过 → 错误文件 {errors_file_name}'
-                     f'(可点「重试失败项」,或手动当新批次重新上传)')
-        else:
-            errors_file_name = None
-            try:
-                if os.path.exists(errors_path):
-                    os.remove(errors_path)
-            except Exception:
-                pass
+        errors_file_name = _save_jd_results(output_filepath)
 
         duration = time.time() - start_time
         emit_log('INFO', '=' * 50)
@@ -1359,6 +1457,10 @@ def run_crawl_task_from_rows(input_rows, output_filepath, config):
         emit_log('INFO', f'  Success: {success_count}')
         emit_log('INFO', f'  Failed: {failed_count}')
         emit_log('INFO', f'  Unavailable: {unavailable_count}')
+        if summary.get('cached'):
+            emit_log('INFO', f'  Known delisted (skipped): {summary["cached"]}')
+        if summary.get('retried'):
+            emit_log('INFO', f'  Auto-retried: {summary["retried"]} attempts')
         emit_log('INFO', f'  Duration: {duration:.1f}s')
         emit_log('INFO', f'  Output: {os.path.basename(output_filepath)}')
         emit_log('INFO', '=' * 50)
@@ -1410,6 +1512,131 @@ def run_crawl_task_from_rows(input_rows, output_filepath, config):
             'error': str(e)
         })
 
+def _run_jd_pool_task(input_rows, output_filepath, config):
+    """运行爬取任务(京东,账号池并发引擎):每个已登录 profile 一路并发 ——
+    engine=async 是同一线程里的协程,engine=process 是各自的子进程.
+    节奏按账号独立:每账号跑满 batch_size 条歇 cooldown 秒,其余账号照常推进;
+    用户点停止时各路在下一条前退出."""
+    global is_crawling, current_platform, crawler_instance, current_results
+
+    engine = config['engine']
+    is_retry = bool((config or {}).get('is_retry'))
+    preset = jd_batch.speed_preset((config or {}).get('speed'))
+    total = len(input_rows)
+    batch_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    start_time = time.time()
+    stats = {'success': 0, 'failed': 0, 'unavailable': 0, 'total': 0}
+
+    def on_result(idx, input_row, product_id, prices, profile_id):
+        url = str(input_row.get('url', ''))
+        if not product_id:
+            emit_log('WARNING', f'[{idx}/{total}] Cannot extract product ID: {url}')
+            return
+        who = f'profile_{profile_id}' if profile_id else '未分配'  # 收尾记 skipped 的行可能没账号
+        emit_log('INFO', f'[{idx}/{total}] {who}: {input_row.get("item") or product_id}')
+        row = jd_batch.apply_jd_prices(jd_batch.new_jd_row(input_row, idx, product_id, url, batch_time),
+                                       prices, who, emit_log)
+        if is_retry:
+            _upsert_live_result(row)
+        else:
+            live_results.append(row)
+        _cache_price(row)
+        emit_result_row(row)
+        stats['total'] += 1
+        if row['status'] == 'success':
+            stats['success'] += 1
+        elif row['status'] in ('unavailable', 'not_found'):
+            stats['unavailable'] += 1
+        else:
+            stats['failed'] += 1
+        emit_progress({
+            'current': stats['total'],
+            'total': total,
+            'percent': round(stats['total'] / total * 100, 1),
+            'current_url': url,
+            'product_id': product_id,
+            'status': 'processing',
+            'statistics': dict(stats),
+        })
+
+    try:
+        emit_log('INFO', '=' * 50)
+        emit_log('INFO', f'Starting batch crawl ({engine} engine): {total} products')
+        emit_log('INFO', '=' * 50)
+        # 并发引擎自己 launch 全部 profile — 先释放同步 crawler 占着的 user-data-dir 锁
+        if crawler_instance is not None:
+            _close_crawler(crawler_instance)
+            crawler_instance = None
+        _kill_stale_browser_processes()
+
+        if engine == 'process':
+            from profile_workers import run_rows
+        else:
+            from jd_crawler_async import run_rows
+        summary = run_rows(input_rows, on_result, should_stop=lambda: not is_crawling,
+                           headless=False, rows_per_profile=preset['batch_size'],
+                           cooldown=preset['cooldown'])
+        if summary.get('error'):
+            emit_log('ERROR', f'❌ {summary["error"]}')
+        if summary.get('stopped'):
+            emit_log('WARNING', 'Crawl stopped by user')
+        if summary.get('restarts'):
+            emit_log('WARNING', '崩溃/卡死后自动重启过的账号 worker: '
+                     + ', '.join(f'profile_{p} ×{n}' for p, n in summary['restarts'].items()))
+        if summary.get('retired'):
+            emit_log('WARNING', '被风控退出轮换的账号: '
+                     + ', '.join(f'profile_{p}' for p in summary['retired']))
+        if summary.get('unprocessed'):
+            emit_log('WARNING', f'{summary["unprocessed"]} 条未处理'
+                                f'({summary.get("reason") or "停止或账号全部退出轮换"}),'
+                                f'已记 skipped,可「重试失败项」')
+
+        emit_log('INFO', 'Saving results to Excel...')
+        socketio.emit('crawl_saving', {'platform': 'jd'})
+        errors_file_name = _save_jd_results(output_filepath)
+
+        duration = time.time() - start_time
+        emit_log('INFO', f'Crawl complete! Success: {stats["success"]}  Failed: {stats["failed"]}  '
+                         f'Unavailable: {stats["unavailable"]}  Duration: {duration:.1f}s')
+        socketio.emit('crawl_complete', {
+            'success': not summary.get('error'),
+            'platform': 'jd',
+            'error': summary.get('error'),
+            'output_file': os.path.basename(output_filepath),
+            'errors_file': errors_file_name,
+            'stats': {
+                'success': stats['success'],
+                'failed': stats['failed'],
+                'unavailable': stats['unavailable'],
+                'total': sum(1 for r in live_results if r.get('platform') == 'jd'),
+                'duration': round(duration, 1)
+            }
+        })
+        current_results = live_results
+
+    except Exception as e:
+        emit_log('ERROR', f'Crawl task error: {str(e)}')
+        import traceback
+        traceback.print_exc()
+        socketio.emit('crawl_complete', {
+            'success': False,
+            'platform': 'jd',
+            'error': str(e)
+        })
+    finally:
+        is_crawling = False
+        current_platform = None
+
+
+def _save_jd_results(output_filepath):
+    """把 live_results 里的京东结果写进主文件 + 配对错误文件,返回错误文件名(无失败项则 None).
+    写完再和上一份主文件做价格对比,结果放进主文件的 Price Diff sheet."""
+    errors_file_name = jd_batch.save_jd_excel([r for r in live_results if r.get('platform') == 'jd'],
+                                              output_filepath, log=emit_log)
+    price_diff.annotate_master(output_filepath, log=emit_log)
+    return errors_file_name
+
+
 # ==================== 天猫路由 ====================
 
 @app.route('/api/tmall/upload', methods=['POST'])
@@ -1434,8 +1661,7 @@ def api_tmall_upload():
     file.save(filepath)
 
     try:
-        df = pd.read_excel(filepath)
-        rows = _parse_tmall_excel(filepath)
+        rows = _parse_tmall_excel(filepath, on_progress=_upload_progress('tmall'))
         uploaded_tmall_rows = rows
 
         # 校验:URL 不是天猫/淘宝域名时给警告
@@ -1450,7 +1676,8 @@ def api_tmall_upload():
             'filename': filename,
             'filepath': filepath,
             'url_count': len(rows),
-            'columns': list(df.columns),
+            'columns': jd_batch.sheet_columns(filepath),
+            'duplicate_of': _check_duplicate_upload('tmall', filepath, filename, len(rows)),
             'warnings': {'non_tmall_urls': bad_urls} if bad_urls else {}
         })
     except Exception as e:
@@ -1481,6 +1708,10 @@ def api_tmall_preview():
 @app.route('/api/tmall/template')
 def api_tmall_template():
     """下载天猫上传模板"""
+    from openpyxl import Workbook
+    from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+    from openpyxl.utils import get_column_letter
+    from openpyxl.comments import Comment
     wb = Workbook()
     ws = wb.active
     ws.title = 'Products'
@@ -1554,7 +1785,6 @@ def api_tmall_template():
             cell.font = font
     ws2.column_dimensions['A'].width = 90
 
-    from io import BytesIO
     buf = BytesIO()
     wb.save(buf)
     buf.seek(0)
@@ -1568,35 +1798,14 @@ def api_tmall_template():
 
 @app.route('/api/tmall/crawl/start', methods=['POST'])
 def api_tmall_crawl_start():
-    """开始批量爬取(天猫)"""
-    global is_crawling, current_platform, current_tmall_batch_file, live_results
-
-    if is_crawling:
-        return jsonify({'error': f'Crawler is already running ({current_platform})'}), 400
-
+    """提交批量爬取(天猫) — 与京东共用任务队列"""
     data = request.json or {}
     filepath = data.get('filepath')
 
     if not filepath or not os.path.exists(filepath):
         return jsonify({'error': 'Invalid file path'}), 400
 
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    output_filename = f"Tmall_Price_{timestamp}.xlsx"
-    current_tmall_batch_file = os.path.join(app.config['OUTPUT_FOLDER'], output_filename)
-
-    # 清掉旧的天猫结果(保留京东的)
-    live_results = [r for r in live_results if r.get('platform') != 'tmall']
-
-    is_crawling = True
-    current_platform = 'tmall'
-    task = Thread(target=run_tmall_crawl_task, args=(filepath, current_tmall_batch_file))
-    task.start()
-
-    return jsonify({
-        'success': True,
-        'message': 'Tmall crawling started',
-        'output_file': output_filename
-    })
+    return _submit_job('tmall', filepath, {}, data.get('priority', 0))
 
 
 @app.route('/api/tmall/crawl/retry', methods=['POST'])
@@ -1636,9 +1845,10 @@ def api_tmall_crawl_retry():
 
     output_filename = os.path.basename(current_tmall_batch_file)
 
-    is_crawling = True
-    current_platform = 'tmall'
-    task = Thread(target=run_tmall_crawl_task_from_rows, args=(retry_rows, current_tmall_batch_file))
+    if not _try_acquire_crawler('tmall'):
+        return jsonify({'error': f'Crawler is already running ({current_platform})'}), 400
+    task = Thread(target=_run_adhoc,
+                  args=(run_tmall_crawl_task_from_rows, (retry_rows, current_tmall_batch_file)))
     task.start()
 
     return jsonify({
@@ -1768,7 +1978,7 @@ def run_tmall_crawl_task_from_rows(input_rows, output_filepath):
             crawler = tmall_crawler_instance
         else:
             emit_log('INFO', '初始化天猫浏览器...', platform='tmall')
-            crawler = TmallCrawler(headless=False)
+            crawler = _tmall_crawler_cls()(headless=False)
             tmall_crawler_instance = crawler
             emit_log('INFO', '请在浏览器中扫码登录(如果先看到滑动验证,请拖动滑块完成验证后再扫码)...', platform='tmall')
             # 把滑块提示通过 socket 推到前端
@@ -1866,24 +2076,9 @@ def run_tmall_crawl_task_from_rows(input_rows, output_filepath):
 
         # 保存 Excel
         emit_log('INFO', '保存结果到 Excel...', platform='tmall')
+        import pandas as pd
         tmall_rows_in_results = [r for r in live_results if r.get('platform') == 'tmall']
-        excel_rows = []
-        for r in tmall_rows_in_results:
-            excel_rows.append({
-                'Batch Time': r.get('batch_time', ''),
-                'Crawl Time': r.get('crawl_time', ''),
-                'Brand': r.get('brand', ''),
-                'Item': r.get('item', ''),
-                'Shop': r.get('shop', ''),
-                'URL': r.get('url', ''),
-                'item_id': r.get('item_id', ''),
-                'Price Reference': r.get('price_reference', ''),
-                'Status': r.get('status', ''),
-                'Original Price': r.get('original_price') if r.get('original_price') not in (None, '-') else 'N/A',
-                'Promo Price': r.get('promo_price') if r.get('promo_price') not in (None, '-') else 'N/A',
-                'Title': r.get('title', ''),
-            })
-        df_results = pd.DataFrame(excel_rows)
+        df_results = pd.DataFrame(list(result_export.excel_rows('tmall', tmall_rows_in_results)))
         df_results.to_excel(output_filepath, index=False, engine='openpyxl')
 
         duration = time.time() - start_time
@@ -1936,10 +2131,40 @@ def handle_disconnect():
 
 # ==================== 启动应用 ====================
 
+STARTUP_SECONDS = time.perf_counter() - _BOOT_T0  # import app 到路由就绪的耗时
+
+
+@app.route('/api/health')
+def api_health():
+    """存活探针 + 启动耗时 + 哪些重依赖已被加载(事故排查时确认是否真的冷启动)"""
+    import sys
+    heavy = ('pandas', 'openpyxl', 'patchright', 'selenium', 'undetected_chromedriver')
+    return jsonify({
+        'success': True,
+        'startup_seconds': round(STARTUP_SECONDS, 3),
+        'crawling': is_crawling,
+        'loaded_modules': [m for m in heavy if m in sys.modules],
+        'browser_rss_mb': _jd_watchdog.last_rss_mb,
+        'context_recycles': _jd_watchdog.recycles,
+        'failure_snapshots': _jd_snapshots.stats(),
+    })
+
+
+@app.route('/api/snapshots')
+def api_snapshots():
+    """失败快照索引:不带 run 列出各批次,带 run(如 20261019_143000)列出该批的失败行"""
+    run = request.args.get('run', '').strip()
+    if not run:
+        return jsonify({'success': True, 'runs': failure_snapshots.list_runs()})
+    return jsonify({'success': True, 'run': run, 'snapshots': failure_snapshots.list_snapshots(run)})
+
+
 if __name__ == '__main__':
     print("=" * 70)
     print("JD Price Crawler")
     print("=" * 70)
+    print(f"\nStartup: {STARTUP_SECONDS:.2f}s (爬虫引擎 / pandas 首次使用时加载)")
+    _ensure_job_runner()  # 恢复上次没跑完 / 仍在排队的任务
     print("\nOpen: http://localhost:5001")
     print("\nPress Ctrl+C to stop\n")
 
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""patchright 浏览器 owner 线程 —— 所有 sync_playwright 对象只在这一条线程上创建和调用.
+
+为什么需要:
+- playwright sync API 与首次 `sync_playwright().start()` 的线程绑死(Phase 8/9 的
+  "cannot switch to a different thread" 崩溃)。旧代码在批量爬取 Thread 里创建
+  JDCrawlerViaSearch,之后又被快速查询的 do_check 线程、/api/reset_browser 的请求线程复用,
+  批量线程一退出,整个会话就废了,只能关掉重新 launch + 热身.
+- 改为一条长寿命 actor 线程持有 crawler,其它线程只往队列里投「命令」(导航/取价/切 profile),
+  拿 Future 等结果。线程怎么来怎么走都不影响浏览器会话.
+
+用法:
+    actor = BrowserActor()
+    crawler = ActorBound(actor, actor.call(JDCrawlerViaSearch, headless=False))
+    crawler.get_price_via_search('100012345678')   # 实际在 actor 线程执行
+"""
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Optional
+
+
+# 这些类型的返回值直接交给调用方;其余对象(如 _DriverShim)可能持有 page,继续包成代理
+_PLAIN_TYPES = (str, bytes, int, float, bool, type(None), dict, list, tuple, set)
+
+
+class BrowserActor:
+    """单线程命令执行器:串行执行投递进来的可调用对象,结果/异常通过 Future 返回."""
+
+    def __init__(self, name: str = 'jd-browser-actor'):
+        self._queue: 'queue.Queue' = queue.Queue()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._loop, name=name, daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            fut, fn, args, kwargs = item
+            if not fut.set_running_or_notify_cancel():
+                continue  # 调用方已取消(如超时放弃)
+            try:
+                fut.set_result(fn(*args, **kwargs))
+            except BaseException as e:  # 异常原样带回调用方线程
+                fut.set_exception(e)
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """投递一个命令,立即返回 Future."""
+        if self._stopped or not self._thread.is_alive():
+            raise RuntimeError('browser actor 已停止')
+        fut: Future = Future()
+        if threading.current_thread() is self._thread:
+            # 命令内部再调代理(重入):直接就地执行,否则会自己等自己死锁
+            try:
+                fut.set_result(fn(*args, **kwargs))
+            except BaseException as e:
+                fut.set_exception(e)
+            return fut
+        self._queue.put((fut, fn, args, kwargs))
+        return fut
+
+    def call(self, fn: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """投递并等待结果.timeout 到期抛 concurrent.futures.TimeoutError(命令本身仍会执行完)."""
+        return self.submit(fn, *args, **kwargs).result(timeout=timeout)
+
+    def is_alive(self) -> bool:
+        return not self._stopped and self._thread.is_alive()
+
+    def stop(self):
+        """不再接收新命令;队列里已有的命令执行完后线程退出(不阻塞调用方)."""
+        self._stopped = True
+        self._queue.put(None)
+
+
+class ActorBound:
+    """把目标对象的方法调用 / 属性读写全部转发到 actor 线程执行的代理.
+
+    对调用方而言与原对象接口一致(crawler.login()、crawler.current_profile_id = None、
+    crawler.driver.current_url 都照常工作),区别只是实际执行线程永远是 actor.
+    """
+
+    def __init__(self, actor: BrowserActor, target: Any):
+        object.__setattr__(self, '_actor', actor)
+        object.__setattr__(self, '_target', target)
+
+    def _wrap(self, value):
+        if isinstance(value, _PLAIN_TYPES):
+            return value
+        return ActorBound(self._actor, value)
+
+    def __getattr__(self, name):
+        value = self._actor.call(getattr, self._target, name)
+        if callable(value):
+            def _method(*args, **kwargs):
+                return self._wrap(self._actor.call(value, *args, **kwargs))
+            _method.__name__ = name
+            return _method
+        return self._wrap(value)
+
+    def __setattr__(self, name, value):
+        self._actor.call(setattr, self._target, name, value)
+
+    def __repr__(self):
+        return f'<ActorBound {self._target!r}>'
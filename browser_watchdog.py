@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""chromium 内存看门狗 —— 长会话里按内存 / 页面数在行边界回收 context.
+
+背景:旧 selenium 版 main_batch.py 每 50 条重启一次浏览器防泄漏;patchright 版的
+crawler_instance 跨批次、跨任务一直复用不关,chromium 的渲染进程内存只涨不落.
+
+做法:
+- 用 `ps` 取整机进程表,找命令行带 `--user-data-dir=<profile 目录>` 的 chromium 主进程,
+  连同它的整棵子进程树(renderer / gpu / utility)累加 RSS —— 就是这个 context 的真实占用.
+  不依赖 psutil,macOS / Linux 的 ps 都支持下面的 -o 格式.
+- ContextWatchdog.check(crawler) 在「行边界」(一条商品处理完、下一条开始前)调用:
+  页面数超限或 RSS 超限就返回原因,由调度器调 crawler.restart_browser() 原 profile 重开.
+  取样有间隔(每 sample_every 行一次 ps),平时只读一个计数器.
+
+阈值可用环境变量覆盖:JD_CONTEXT_MAX_RSS_MB(默认 1500)、JD_CONTEXT_MAX_PAGES(默认 150).
+"""
+import os
+import subprocess
+from typing import Optional
+
+MAX_RSS_MB = int(os.environ.get('JD_CONTEXT_MAX_RSS_MB', 1500))
+MAX_PAGES = int(os.environ.get('JD_CONTEXT_MAX_PAGES', 150))
+SAMPLE_EVERY_ROWS = 5
+
+
+def _process_table() -> list:
+    """[(pid, ppid, rss_kb, args)];ps 不可用时返回空列表."""
+    try:
+        out = subprocess.run(['ps', '-axo', 'pid=,ppid=,rss=,args='],
+                             capture_output=True, text=True, timeout=10).stdout
+    except Exception:
+        return []
+    table = []
+    for line in out.splitlines():
+        parts = line.split(None, 3)
+        if len(parts) < 3:
+            continue
+        try:
+            table.append((int(parts[0]), int(parts[1]), int(parts[2]),
+                          parts[3] if len(parts) > 3 else ''))
+        except ValueError:
+            continue
+    return table
+
+
+def _user_data_dir_tree(table: list, user_data_dir: str) -> set:
+    """命令行带 --user-data-dir=<目录> 的 chromium 进程及其整棵子进程树的 pid.
+    只认可执行文件像 chromium / chrome 的进程(命令行里恰好提到这个目录的 shell、编辑器不算)."""
+    marker = f'--user-data-dir={os.path.abspath(user_data_dir)}'
+    roots = {pid for pid, _, _, args in table
+             if marker in args and 'chrom' in os.path.basename(args.split(' --', 1)[0]).lower()}
+    children = {}
+    for pid, ppid, _, _ in table:
+        children.setdefault(ppid, []).append(pid)
+    seen, stack = set(), list(roots)
+    while stack:
+        pid = stack.pop()
+        if pid in seen:
+            continue
+        seen.add(pid)
+        stack.extend(children.get(pid, ()))
+    return seen
+
+
+def user_data_dir_pids(user_data_dir: str) -> set:
+    """某个 user-data-dir 对应的 chromium 进程树 pid(找不到为空集)."""
+    return _user_data_dir_tree(_process_table(), user_data_dir)
+
+
+def user_data_dir_rss_mb(user_data_dir: str) -> Optional[float]:
+    """某个 user-data-dir 对应的 chromium 进程树总 RSS(MB);找不到进程返回 None."""
+    table = _process_table()
+    tree = _user_data_dir_tree(table, user_data_dir)
+    if not tree:
+        return None
+    rss = {pid: kb for pid, _, kb, _ in table}
+    return sum(rss.get(pid, 0) for pid in tree) / 1024
+
+
+class ContextWatchdog:
+    """行边界检查:页面数或内存超限 → 返回回收原因(字符串),否则 None."""
+
+    def __init__(self, max_rss_mb: float = MAX_RSS_MB, max_pages: int = MAX_PAGES,
+                 sample_every: int = SAMPLE_EVERY_ROWS):
+        self.max_rss_mb = max_rss_mb
+        self.max_pages = max_pages
+        self.sample_every = max(1, sample_every)
+        self.last_rss_mb: Optional[float] = None
+        self.recycles = 0
+        self._rows = 0
+
+    def check(self, crawler) -> Optional[str]:
+        pages = crawler.pages_since_launch
+        if self.max_pages and pages >= self.max_pages:
+            return f'本 context 已打开 {pages} 个页面(上限 {self.max_pages})'
+        self._rows += 1
+        if self._rows % self.sample_every:
+            return None
+        rss = crawler.context_rss_mb()
+        self.last_rss_mb = rss
+        if rss is not None and self.max_rss_mb and rss >= self.max_rss_mb:
+            return f'chromium 内存 {rss:.0f} MB(上限 {self.max_rss_mb:.0f} MB)'
+        return None
+
+    def recycle(self, crawler, reason: str, log) -> bool:
+        """原 profile 关掉重开(restart_browser),成功返回 True."""
+        log('INFO', f'♻ 回收浏览器 context:{reason}')
+        ok = crawler.restart_browser()
+        if ok:
+            self.recycles += 1
+            self.last_rss_mb = crawler.context_rss_mb()
+            if self.last_rss_mb is not None:
+                log('INFO', f'  ✓ 已重开 profile_{crawler.current_profile_id},'
+                            f'内存回落到 {self.last_rss_mb:.0f} MB')
+        return ok
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""分布式爬取协调器 —— 把一个任务的 SKU 分片租给多台机器上的 worker(各自 IP + 各自账号池).
+
+风控按账号、按 IP 计,单机账号交替的上限就是单机的账号数;多台机器各跑一个 crawl_worker,
+由这里统一发活、收结果、合并成标准 Excel(JD_Price_Marks_*.xlsx + _errors.xlsx).
+
+    python3 crawl_coordinator.py "Product URL List.xlsx" --port 5002
+    python3 crawl_worker.py http://<协调器IP>:5002                       # 每台机器一个
+
+协议(HTTP + JSON,标准库实现,worker 端不需要 Flask):
+    POST /lease   {"worker": "w1"}                     → {"job_id", "speed", "lease_seconds", "rows": [{id, idx, row}]}
+                                                         全部完成时 {"done": true};暂无可租行时 rows=[] + retry_after
+    POST /renew   {"worker": "w1"}                     → 顺延该 worker 名下全部租约(心跳)
+    POST /result  {"worker": "w1", "row_id": 1, "result": {...}}
+    POST /release {"worker": "w1", "row_ids": [...]}   → 停止 / 会话死亡时主动退还
+    GET  /status                                       → 进度 + 各 worker 完成数
+
+行租约存在 crawl_store.job_rows:worker 死了不续租,lease_seconds 后这些行自动回到可租状态,
+由其它 worker 接手;协调器自己重启用 --job <id> 接着跑.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from datetime import datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import crawl_store
+import jd_batch
+import price_diff
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+OUTPUT_FOLDER = os.path.join(SCRIPT_DIR, 'outputs')
+
+DEFAULT_LEASE_SECONDS = 300  # 心跳每 lease/3 一次;单条取价 ~15s,5 分钟足够 worker 卡一两条不丢租约
+
+
+class Coordinator:
+    def __init__(self, job: dict, lease_seconds: float = DEFAULT_LEASE_SECONDS,
+                 rows_per_lease: int = 0):
+        self.job = job
+        self.job_id = job['id']
+        self.speed = (job.get('config') or {}).get('speed', 'regular')
+        # 默认每次租一批(= 预设的每批条数):worker 跑完一批正好做一次账号交替
+        self.batch_size = rows_per_lease or jd_batch.speed_preset(self.speed)['batch_size']
+        self.lease_seconds = lease_seconds
+        self.last_seen = {}  # worker → 最近一次请求时间
+        self.told_done = set()  # 已拿到 {'done': true} 的 worker(收尾宽限期据此提前关服务)
+        self.finished = threading.Event()
+
+    def _touch(self, worker):
+        self.last_seen[worker] = time.time()
+
+    def lease(self, worker: str) -> dict:
+        self._touch(worker)
+        counts = crawl_store.job_row_counts(self.job_id)
+        if counts['done'] >= counts['total']:
+            self.told_done.add(worker)
+            return {'done': True}
+        rows = crawl_store.lease_rows(self.job_id, worker, self.batch_size, self.lease_seconds)
+        resp = {'job_id': self.job_id, 'speed': self.speed,
+                'lease_seconds': self.lease_seconds, 'rows': rows}
+        if not rows:
+            # 剩下的都被别人租着 —— 等它们完成或过期
+            resp['retry_after'] = min(30, self.lease_seconds / 4)
+        return resp
+
+    def renew(self, worker: str) -> dict:
+        self._touch(worker)
+        return {'renewed': crawl_store.renew_leases(worker, self.lease_seconds)}
+
+    def result(self, worker: str, row_id: int, result: dict) -> dict:
+        self._touch(worker)
+        ok, err = crawl_store.complete_row(row_id, worker, result)
+        counts = crawl_store.job_row_counts(self.job_id)
+        if counts['done'] >= counts['total']:
+            self.finished.set()
+        return {'accepted': ok, 'error': err or None}
+
+    def release(self, worker: str, row_ids) -> dict:
+        self._touch(worker)
+        return {'released': crawl_store.release_rows(worker, row_ids)}
+
+    def wait_workers_done(self, timeout: float) -> bool:
+        """任务完成后的宽限期:等所有来过的 worker 都取到完成信号(冷却 / 轮询中的要等它下次 /lease);
+        超时返回 False"""
+        end = time.time() + timeout
+        while set(self.last_seen) - self.told_done:
+            if time.time() >= end:
+                return False
+            time.sleep(1)
+        return True
+
+    def status(self) -> dict:
+        now = time.time()
+        workers = crawl_store.job_workers(self.job_id)
+        for name, info in workers.items():
+            seen = self.last_seen.get(name)
+            info['idle_seconds'] = round(now - seen) if seen else None
+        return {'job_id': self.job_id, 'counts': crawl_store.job_row_counts(self.job_id),
+                'workers': workers}
+
+
+def make_handler(coord: Coordinator):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, code, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == '/status':
+                return self._send(200, coord.status())
+            self._send(404, {'error': 'not found'})
+
+        def do_POST(self):
+            try:
+                length = int(self.headers.get('Content-Length') or 0)
+                data = json.loads(self.rfile.read(length) or b'{}')
+            except ValueError:
+                return self._send(400, {'error': 'invalid json'})
+            worker = str(data.get('worker') or '').strip()
+            if not worker:
+                return self._send(400, {'error': 'worker 必填'})
+            try:
+                if self.path == '/lease':
+                    return self._send(200, coord.lease(worker))
+                if self.path == '/renew':
+                    return self._send(200, coord.renew(worker))
+                if self.path == '/result':
+                    return self._send(200, coord.result(worker, int(data['row_id']), data['result']))
+                if self.path == '/release':
+                    return self._send(200, coord.release(worker, data.get('row_ids')))
+            except (KeyError, TypeError, ValueError) as e:
+                return self._send(400, {'error': f'参数错误: {e}'})
+            self._send(404, {'error': 'not found'})
+
+        def log_message(self, fmt, *args):
+            pass
+
+    return Handler
+
+
+def _log(level, message):
+    print(f'{datetime.now().strftime("%H:%M:%S")} [{level}] {message}', flush=True)
+
+
+def _prepare_job(args) -> dict:
+    if args.job:
+        job = crawl_store.get_job(args.job)
+        if not job or job['status'] != 'distributed':
+            raise SystemExit(f'任务 #{args.job} 不存在或不是进行中的分布式任务')
+        _log('INFO', f'接着跑任务 #{job["id"]}: {os.path.basename(job["filepath"])}')
+        return job
+
+    if not args.input or not os.path.exists(args.input):
+        raise SystemExit(f'找不到文件: {args.input}')
+    output = args.output or os.path.join(
+        OUTPUT_FOLDER, f"JD_Price_Marks_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx")
+    job = crawl_store.create_distributed_job(os.path.abspath(args.input), {'speed': args.speed},
+                                             os.path.abspath(output))
+    # 边读边写进 job_rows:大清单不在协调器里整表驻留
+    progress = lambda done, total: _log('INFO', f'  读取清单 {done}/{total} 行')
+    count = crawl_store.add_job_rows(job['id'], jd_batch.iter_jd_rows(args.input, on_progress=progress))
+    if not count:
+        crawl_store.finish_job(job['id'], 'failed', '清单中没有可爬取的行')
+        raise SystemExit(f'{args.input} 中没有可爬取的行')
+    _log('INFO', f'任务 #{job["id"]}: {count} 行 → {os.path.basename(output)}')
+    return job
+
+
+def merge_results(job: dict) -> str:
+    """把已完成行按原顺序写成标准主文件 + 错误文件;返回错误文件名(无则 None)."""
+    results = crawl_store.job_results(job['id'])
+    os.makedirs(os.path.dirname(job['output_file']) or '.', exist_ok=True)
+    errors_file = jd_batch.save_jd_excel(results, job['output_file'], log=_log)
+    price_diff.annotate_master(job['output_file'], log=_log)
+    return errors_file
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='分布式爬取协调器')
+    parser.add_argument('input', nargs='?', help='商品清单 Excel(与 Web 上传格式相同)')
+    parser.add_argument('--job', type=int, help='接着跑已有的分布式任务(协调器重启后用)')
+    parser.add_argument('-o', '--output', help='合并输出 Excel,默认 outputs/JD_Price_Marks_<时间>.xlsx')
+    parser.add_argument('--speed', choices=sorted(jd_batch.JD_SPEED_PRESETS), default='regular')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5002)
+    parser.add_argument('--lease', type=float, default=DEFAULT_LEASE_SECONDS, help='租约秒数')
+    parser.add_argument('--rows-per-lease', type=int, default=0,
+                        help='每次租出的行数,默认 = 爬取强度的每批条数(本机小样本验证时调小)')
+    args = parser.parse_args(argv)
+
+    job = _prepare_job(args)
+    coord = Coordinator(job, lease_seconds=args.lease, rows_per_lease=args.rows_per_lease)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(coord))
+    threading.Thread(target=server.serve_forever, name='coordinator-http', daemon=True).start()
+    _log('INFO', f'协调器就绪: http://{args.host}:{args.port}  (worker: python3 crawl_worker.py http://<本机IP>:{args.port})')
+
+    interrupted = False
+    last_line = None
+    try:
+        while not coord.finished.is_set():
+            st = coord.status()
+            c = st['counts']
+            if c['total'] and c['done'] >= c['total']:
+                break
+            line = (f'进度 {c["done"]}/{c["total"]}(在租 {c["leased"]},待租 {c["pending"]})| '
+                    + ', '.join(f'{w}: {i["done"]}' for w, i in sorted(st['workers'].items())))
+            if line != last_line:
+                _log('INFO', line)
+                last_line = line
+            coord.finished.wait(10)
+    except KeyboardInterrupt:
+        interrupted = True
+        _log('WARNING', f'协调器中止 —— 已完成的行已入库,用 --job {job["id"]} 接着跑')
+        server.shutdown()
+
+    try:
+        errors_file = merge_results(job)
+        _log('INFO', f'已合并 → {job["output_file"]}' + (f'(错误文件 {errors_file})' if errors_file else ''))
+        if interrupted:
+            return 130
+        crawl_store.finish_job(job['id'], 'done')
+        # 再留一个租约时长继续应答 /lease {'done': true}:冷却 / 轮询中的 worker 下次来取时正常退出,
+        # 而不是撞上已关的端口;全部 worker 都取到完成信号就提前关
+        if not coord.wait_workers_done(coord.lease_seconds):
+            pending = sorted(set(coord.last_seen) - coord.told_done)
+            _log('WARNING', f'宽限期结束,{", ".join(pending)} 还没取到完成信号(可能已退出),关闭协调器')
+        return 1 if errors_file else 0
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        if not interrupted:
+            server.shutdown()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
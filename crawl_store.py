@@ -0,0 +1,406 @@
+#!/usr/bin/env python3
+"""爬取任务的持久化存储(sqlite,标准库实现,无额外依赖).
+
+目前承载:
+- jobs:上传后排队的爬取任务(优先级 + 队内顺序),Flask 重启后未完成的任务继续排队.
+- job_rows:分布式任务(crawl_coordinator)的逐行租约与结果 —— worker 租一批行,
+  定期续租;worker 死掉后租约过期,这些行自动回到可租状态由别的 worker 接手.
+- profile_streaks:每个账号每段连续爬取「首次被拦前成功了几条」,jd_batch 据此给账号定批大小.
+- uploads:上传过的清单按内容哈希登记,同一份内容再次上传(哪怕改了文件名)时提示重复.
+- dead_skus:判过下架 / 不存在的商品(负缓存),同一清单再上传时直接沿用上次结论,不再占页面和账号额度.
+
+设计要点:
+- 每次调用新开一个连接、用完即关 —— Flask 请求线程 / 爬取线程 / 队列调度线程都可以直接调,
+  不共享 connection,也就没有 sqlite 的跨线程限制.
+- 返回值沿用 profile_provision 的约定:查询返回 dict / list,修改类操作返回 (ok, err).
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DB_PATH = os.path.join(SCRIPT_DIR, 'crawl_store.sqlite3')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    platform    TEXT NOT NULL,             -- 'jd' / 'tmall'
+    filepath    TEXT NOT NULL,             -- 上传的 Excel
+    output_file TEXT NOT NULL DEFAULT '', -- 产出主文件完整路径(开跑时才定,时间戳命名)
+    config      TEXT NOT NULL DEFAULT '{}',
+    priority    INTEGER NOT NULL DEFAULT 0, -- 越大越先跑
+    seq         INTEGER NOT NULL DEFAULT 0, -- 同优先级内的顺序(越小越先),reorder 改它
+    status      TEXT NOT NULL DEFAULT 'queued',  -- queued/running/done/stopped/failed/cancelled
+    error       TEXT,
+    created_at  TEXT NOT NULL,
+    started_at  TEXT,
+    finished_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, priority, seq);
+
+CREATE TABLE IF NOT EXISTS job_rows (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id      INTEGER NOT NULL,
+    idx         INTEGER NOT NULL,          -- 在原 Excel 里的顺序(0 起),合并输出按它排
+    row         TEXT NOT NULL,             -- 输入行 JSON(jd_batch.parse_jd_excel 的 dict)
+    status      TEXT NOT NULL DEFAULT 'pending',  -- pending/leased/done
+    worker      TEXT,
+    lease_until REAL,                      -- time.time() 时间戳,过期即视为 pending
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    result      TEXT,                      -- 结果行 JSON
+    updated_at  TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_job_rows ON job_rows(job_id, status, idx);
+
+CREATE TABLE IF NOT EXISTS profile_streaks (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    profile_id  INTEGER NOT NULL,
+    rows        INTEGER NOT NULL,          -- 本段连续正常加载的条数
+    blocked     INTEGER NOT NULL,          -- 1 = 以被拦结束;0 = 批跑完 / 换号时仍健康(右删失)
+    recorded_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_profile_streaks ON profile_streaks(profile_id, id);
+
+CREATE TABLE IF NOT EXISTS uploads (
+    sha256      TEXT NOT NULL,
+    platform    TEXT NOT NULL,
+    filename    TEXT NOT NULL,             -- 首次上传时的文件名
+    row_count   INTEGER NOT NULL,
+    first_at    TEXT NOT NULL,
+    last_at     TEXT NOT NULL,
+    times       INTEGER NOT NULL DEFAULT 1,
+    PRIMARY KEY (sha256, platform)
+);
+
+CREATE TABLE IF NOT EXISTS dead_skus (
+    product_id  TEXT PRIMARY KEY,
+    status      TEXT NOT NULL,             -- 'unavailable' / 'not_found'
+    first_seen  TEXT NOT NULL,
+    checked_at  TEXT NOT NULL,             -- 最近一次真正爬到这个结论的时间
+    hits        INTEGER NOT NULL DEFAULT 1 -- 累计判死次数(复查仍是死的会 +1)
+);
+"""
+
+_schema_lock = threading.Lock()
+_schema_ready = False
+
+
+def _now() -> str:
+    return time.strftime('%Y-%m-%d %H:%M:%S')
+
+
+@contextmanager
+def _connect():
+    global _schema_ready
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    try:
+        if not _schema_ready:
+            with _schema_lock:
+                if not _schema_ready:
+                    conn.executescript(_SCHEMA)
+                    _schema_ready = True
+        yield conn
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _job_dict(row) -> dict:
+    d = dict(row)
+    try:
+        d['config'] = json.loads(d.get('config') or '{}')
+    except ValueError:
+        d['config'] = {}
+    return d
+
+
+# ---------- jobs ----------
+
+def enqueue_job(platform: str, filepath: str, config: Optional[dict] = None,
+                priority: int = 0, output_file: str = '') -> dict:
+    """新任务排到同优先级队尾,返回任务 dict."""
+    with _connect() as conn:
+        seq = conn.execute("SELECT COALESCE(MAX(seq), 0) + 1 FROM jobs WHERE status='queued'").fetchone()[0]
+        cur = conn.execute(
+            "INSERT INTO jobs(platform, filepath, output_file, config, priority, seq, status, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, 'queued', ?)",
+            (platform, filepath, output_file, json.dumps(config or {}, ensure_ascii=False),
+             int(priority), seq, _now()))
+        row = conn.execute("SELECT * FROM jobs WHERE id=?", (cur.lastrowid,)).fetchone()
+        return _job_dict(row)
+
+
+def get_job(job_id: int) -> Optional[dict]:
+    with _connect() as conn:
+        row = conn.execute("SELECT * FROM jobs WHERE id=?", (job_id,)).fetchone()
+        return _job_dict(row) if row else None
+
+
+def list_jobs(limit: int = 50) -> list:
+    """运行中 + 排队中(按执行顺序)在前,其后是最近结束的任务."""
+    with _connect() as conn:
+        active = conn.execute(
+            "SELECT * FROM jobs WHERE status IN ('running', 'queued') "
+            "ORDER BY status='queued', priority DESC, seq ASC, id ASC").fetchall()
+        recent = conn.execute(
+            "SELECT * FROM jobs WHERE status NOT IN ('running', 'queued') "
+            "ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+    return [_job_dict(r) for r in active] + [_job_dict(r) for r in recent]
+
+
+def queue_position(job_id: int) -> Optional[int]:
+    """排队中的任务在队列里的位置(1 = 下一个),不在排队返回 None."""
+    ids = [j['id'] for j in list_jobs(limit=0) if j['status'] == 'queued']
+    return ids.index(job_id) + 1 if job_id in ids else None
+
+
+def claim_next_job() -> Optional[dict]:
+    """原子地取出下一个排队任务并标成 running;队列空返回 None."""
+    with _connect() as conn:
+        conn.execute('BEGIN IMMEDIATE')
+        row = conn.execute(
+            "SELECT * FROM jobs WHERE status='queued' "
+            "ORDER BY priority DESC, seq ASC, id ASC LIMIT 1").fetchone()
+        if not row:
+            return None
+        conn.execute("UPDATE jobs SET status='running', started_at=? WHERE id=?", (_now(), row['id']))
+        job = _job_dict(row)
+        job['status'] = 'running'
+        return job
+
+
+def set_output_file(job_id: int, output_file: str) -> None:
+    with _connect() as conn:
+        conn.execute("UPDATE jobs SET output_file=? WHERE id=?", (output_file, job_id))
+
+
+def finish_job(job_id: int, status: str, error: Optional[str] = None) -> None:
+    with _connect() as conn:
+        conn.execute("UPDATE jobs SET status=?, error=?, finished_at=? WHERE id=?",
+                     (status, error, _now(), job_id))
+
+
+def cancel_job(job_id: int) -> tuple:
+    """取消排队中的任务(运行中的任务请用停止接口)."""
+    with _connect() as conn:
+        cur = conn.execute("UPDATE jobs SET status='cancelled', finished_at=? "
+                           "WHERE id=? AND status='queued'", (_now(), job_id))
+        if cur.rowcount:
+            return True, ''
+    job = get_job(job_id)
+    if not job:
+        return False, '任务不存在'
+    return False, f'任务状态为 {job["status"]},只能取消排队中的任务'
+
+
+def set_priority(job_id: int, priority: int) -> tuple:
+    with _connect() as conn:
+        cur = conn.execute("UPDATE jobs SET priority=? WHERE id=? AND status='queued'",
+                           (int(priority), job_id))
+        return (True, '') if cur.rowcount else (False, '任务不存在或不在排队中')
+
+
+def reorder_jobs(ordered_ids: list) -> tuple:
+    """按给定顺序重排同优先级内的排队任务;未列出的排队任务保持原相对顺序排在其后."""
+    with _connect() as conn:
+        queued = [r['id'] for r in conn.execute(
+            "SELECT id FROM jobs WHERE status='queued' ORDER BY seq ASC, id ASC").fetchall()]
+        wanted = [int(i) for i in ordered_ids if int(i) in queued]
+        new_order = wanted + [i for i in queued if i not in wanted]
+        for seq, jid in enumerate(new_order, 1):
+            conn.execute("UPDATE jobs SET seq=? WHERE id=?", (seq, jid))
+    return True, ''
+
+
+def requeue_interrupted_jobs() -> int:
+    """进程重启时调用:上次没跑完(仍是 running)的任务放回队首,返回数量."""
+    with _connect() as conn:
+        cur = conn.execute("UPDATE jobs SET status='queued', seq=0, started_at=NULL "
+                           "WHERE status='running'")
+        return cur.rowcount
+
+
+# ---------- job_rows(分布式租约)----------
+
+def create_distributed_job(filepath: str, config: Optional[dict] = None,
+                           output_file: str = '') -> dict:
+    """分布式任务不进本机排队(status='distributed'),app 的调度线程不会去认领它."""
+    with _connect() as conn:
+        cur = conn.execute(
+            "INSERT INTO jobs(platform, filepath, output_file, config, status, created_at, started_at) "
+            "VALUES ('jd', ?, ?, ?, 'distributed', ?, ?)",
+            (filepath, output_file, json.dumps(config or {}, ensure_ascii=False), _now(), _now()))
+        row = conn.execute("SELECT * FROM jobs WHERE id=?", (cur.lastrowid,)).fetchone()
+        return _job_dict(row)
+
+
+def add_job_rows(job_id: int, rows, chunk: int = 1000) -> int:
+    """rows 可以是列表或迭代器(jd_batch.iter_jd_rows):按 chunk 行一批写入,不必先整表读进内存."""
+    count = 0
+    with _connect() as conn:
+        batch = []
+        for r in rows:
+            batch.append((job_id, count, json.dumps(r, ensure_ascii=False), _now()))
+            count += 1
+            if len(batch) >= chunk:
+                conn.executemany(
+                    "INSERT INTO job_rows(job_id, idx, row, updated_at) VALUES (?, ?, ?, ?)", batch)
+                batch = []
+        if batch:
+            conn.executemany(
+                "INSERT INTO job_rows(job_id, idx, row, updated_at) VALUES (?, ?, ?, ?)", batch)
+    return count
+
+
+def lease_rows(job_id: int, worker: str, limit: int, lease_seconds: float) -> list:
+    """给 worker 租最多 limit 行(pending 或租约已过期的),按原顺序;返回 [{id, idx, row}]."""
+    now = time.time()
+    with _connect() as conn:
+        conn.execute('BEGIN IMMEDIATE')
+        rows = conn.execute(
+            "SELECT id, idx, row FROM job_rows WHERE job_id=? AND "
+            "(status='pending' OR (status='leased' AND lease_until < ?)) "
+            "ORDER BY idx LIMIT ?", (job_id, now, int(limit))).fetchall()
+        conn.executemany(
+            "UPDATE job_rows SET status='leased', worker=?, lease_until=?, attempts=attempts+1, "
+            "updated_at=? WHERE id=?",
+            [(worker, now + lease_seconds, _now(), r['id']) for r in rows])
+    return [{'id': r['id'], 'idx': r['idx'], 'row': json.loads(r['row'])} for r in rows]
+
+
+def renew_leases(worker: str, lease_seconds: float) -> int:
+    """worker 心跳:把它名下所有未完成的租约顺延."""
+    with _connect() as conn:
+        cur = conn.execute("UPDATE job_rows SET lease_until=? WHERE worker=? AND status='leased'",
+                           (time.time() + lease_seconds, worker))
+        return cur.rowcount
+
+
+def complete_row(row_id: int, worker: str, result: dict) -> tuple:
+    """写入一行结果.先到先得:租约过期被别人接手后,原 worker 迟到的结果只要行还没完成照样收."""
+    with _connect() as conn:
+        cur = conn.execute(
+            "UPDATE job_rows SET status='done', worker=?, result=?, lease_until=NULL, updated_at=? "
+            "WHERE id=? AND status!='done'",
+            (worker, json.dumps(result, ensure_ascii=False), _now(), row_id))
+        return (True, '') if cur.rowcount else (False, '行不存在或已完成')
+
+
+def release_rows(worker: str, row_ids: Optional[list] = None) -> int:
+    """worker 主动退还租约(停止/会话死亡),不等过期."""
+    with _connect() as conn:
+        sql = "UPDATE job_rows SET status='pending', worker=NULL, lease_until=NULL WHERE worker=? AND status='leased'"
+        args = [worker]
+        if row_ids is not None:
+            if not row_ids:
+                return 0
+            sql += f" AND id IN ({','.join('?' * len(row_ids))})"
+            args += [int(i) for i in row_ids]
+        return conn.execute(sql, args).rowcount
+
+
+def job_row_counts(job_id: int) -> dict:
+    """{'pending','leased','done','total'};租约过期的算 pending."""
+    now = time.time()
+    with _connect() as conn:
+        r = conn.execute(
+            "SELECT COUNT(*) AS total, "
+            "SUM(status='done') AS done, "
+            "SUM(status='leased' AND lease_until >= ?) AS leased "
+            "FROM job_rows WHERE job_id=?", (now, job_id)).fetchone()
+    total, done, leased = r['total'], r['done'] or 0, r['leased'] or 0
+    return {'pending': total - done - leased, 'leased': leased, 'done': done, 'total': total}
+
+
+def job_workers(job_id: int) -> dict:
+    """各 worker 已完成 / 在租的行数(给协调器状态页看)."""
+    with _connect() as conn:
+        rows = conn.execute(
+            "SELECT worker, SUM(status='done') AS done, SUM(status='leased') AS leased "
+            "FROM job_rows WHERE job_id=? AND worker IS NOT NULL GROUP BY worker", (job_id,)).fetchall()
+    return {r['worker']: {'done': r['done'], 'leased': r['leased']} for r in rows}
+
+
+def job_results(job_id: int) -> list:
+    """已完成行的结果,按原 Excel 顺序."""
+    with _connect() as conn:
+        rows = conn.execute("SELECT result FROM job_rows WHERE job_id=? AND status='done' "
+                            "ORDER BY idx", (job_id,)).fetchall()
+    return [json.loads(r['result']) for r in rows]
+
+
+# ---------- profile_streaks(账号批大小学习)----------
+
+def record_streak(profile_id: int, rows: int, blocked: bool) -> None:
+    with _connect() as conn:
+        conn.execute('INSERT INTO profile_streaks (profile_id, rows, blocked, recorded_at) '
+                     'VALUES (?, ?, ?, ?)', (profile_id, rows, 1 if blocked else 0, _now()))
+
+
+def profile_streaks(profile_id: int, limit: int = 20) -> list:
+    """最近 limit 段记录(新的在前):[{'rows', 'blocked', 'recorded_at'}]."""
+    with _connect() as conn:
+        rows = conn.execute('SELECT rows, blocked, recorded_at FROM profile_streaks '
+                            'WHERE profile_id = ? ORDER BY id DESC LIMIT ?',
+                            (profile_id, limit)).fetchall()
+    return [{'rows': r['rows'], 'blocked': bool(r['blocked']), 'recorded_at': r['recorded_at']}
+            for r in rows]
+
+
+# ---------- uploads(重复上传检测)----------
+
+def record_upload(sha256: str, platform: str, filename: str, row_count: int) -> Optional[dict]:
+    """登记一次上传;同内容以前传过则返回那次的记录 {'filename','row_count','first_at','last_at','times'}
+    (登记前的状态),否则 None."""
+    now = _now()
+    with _connect() as conn:
+        prev = conn.execute('SELECT filename, row_count, first_at, last_at, times FROM uploads '
+                            'WHERE sha256 = ? AND platform = ?', (sha256, platform)).fetchone()
+        if prev:
+            conn.execute('UPDATE uploads SET last_at = ?, times = times + 1 '
+                         'WHERE sha256 = ? AND platform = ?', (now, sha256, platform))
+            return dict(prev)
+        conn.execute('INSERT INTO uploads (sha256, platform, filename, row_count, first_at, last_at) '
+                     'VALUES (?, ?, ?, ?, ?, ?)', (sha256, platform, filename, row_count, now, now))
+    return None
+
+
+# ---------- dead_skus(下架 / 不存在负缓存)----------
+
+def mark_dead_sku(product_id: str, status: str) -> None:
+    now = _now()
+    with _connect() as conn:
+        conn.execute('INSERT INTO dead_skus (product_id, status, first_seen, checked_at) '
+                     'VALUES (?, ?, ?, ?) ON CONFLICT(product_id) DO UPDATE SET '
+                     'status = excluded.status, checked_at = excluded.checked_at, hits = hits + 1',
+                     (product_id, status, now, now))
+
+
+def clear_dead_sku(product_id: str) -> bool:
+    """商品又爬到了价格(重新上架):移出负缓存.返回是否原本在缓存里."""
+    with _connect() as conn:
+        cur = conn.execute('DELETE FROM dead_skus WHERE product_id = ?', (product_id,))
+    return cur.rowcount > 0
+
+
+def dead_skus(product_ids: list, max_age_seconds: float) -> dict:
+    """product_ids 里仍在有效期内(checked_at 距今不超过 max_age_seconds)的负缓存:
+    {product_id: {'status', 'first_seen', 'checked_at', 'hits'}}."""
+    cutoff = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time() - max_age_seconds))
+    ids = sorted({str(p) for p in product_ids if p})
+    found = {}
+    with _connect() as conn:
+        for i in range(0, len(ids), 500):  # sqlite 单条语句的参数个数有上限
+            part = ids[i:i + 500]
+            rows = conn.execute(
+                f'SELECT * FROM dead_skus WHERE checked_at >= ? AND product_id IN '
+                f'({",".join("?" * len(part))})', [cutoff] + part).fetchall()
+            for r in rows:
+                d = dict(r)
+                found[d.pop('product_id')] = d
+    return found
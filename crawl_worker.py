@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""分布式爬取 worker —— 向 crawl_coordinator 租一批行,用本机账号池跑完,逐行回传结果.
+
+    python3 crawl_worker.py http://<协调器IP>:5002                       # 真实京东(本机 profile 池)
+    python3 crawl_worker.py http://127.0.0.1:5002 --offline http://127.0.0.1:5090 --name w1
+
+每批行走的是与 Web / 命令行相同的调度(jd_batch.run_jd_batch);批与批之间同样「账号交替,
+池耗尽或单账号才冷却」.后台心跳线程定期续租,进程死了就不再续租,协调器把这些行转给别的 worker.
+本机验证:先起 offline_site.py 和协调器,再开几个 --offline worker 进程,中途 kill 一个看行被接手.
+"""
+import os
+import sys
+import json
+import time
+import signal
+import socket
+import argparse
+import threading
+import urllib.error
+import urllib.request
+from datetime import datetime
+
+import jd_batch
+
+
+class CoordinatorClient:
+    def __init__(self, base_url: str, worker: str, timeout: float = 30):
+        self.base_url = base_url.rstrip('/')
+        self.worker = worker
+        self.timeout = timeout
+
+    def _post(self, path, payload):
+        data = json.dumps(dict(payload, worker=self.worker), ensure_ascii=False).encode('utf-8')
+        req = urllib.request.Request(self.base_url + path, data=data,
+                                     headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+            return json.loads(resp.read().decode('utf-8'))
+
+    def lease(self):
+        return self._post('/lease', {})
+
+    def renew(self):
+        return self._post('/renew', {})
+
+    def result(self, row_id, result):
+        return self._post('/result', {'row_id': row_id, 'result': result})
+
+    def release(self, row_ids):
+        return self._post('/release', {'row_ids': row_ids})
+
+
+def _log(level, message, worker=''):
+    print(f'{datetime.now().strftime("%H:%M:%S")} [{level}] {worker} {message}', flush=True)
+
+
+def _heartbeat(client, interval, stop_event, log):
+    while not stop_event.wait(interval):
+        try:
+            client.renew()
+        except Exception as e:
+            log('WARNING', f'续租失败(协调器不可达?): {e}')
+
+
+def _lease_cooldown(client, seconds, should_stop, log, renew_every: float = 60):
+    """批间冷却 / 重试退避的等待(run_jd_batch 的 cooldown):随时可被停止打断,期间定期续租,
+    租着的行不会在等待中过期、被协调器转给别的 worker 重复爬.返回 False 表示被停止."""
+    end = time.time() + seconds
+    next_renew = 0.0
+    while time.time() < end:
+        if should_stop():
+            return False
+        if time.time() >= next_renew:
+            try:
+                client.renew()
+            except Exception as e:
+                log('WARNING', f'续租失败(协调器不可达?): {e}')
+            next_renew = time.time() + renew_every
+        time.sleep(min(1.0, max(0.0, end - time.time())))
+    return True
+
+
+def _make_crawler(args):
+    if args.offline:
+        from offline_site import OfflineCrawler
+        return OfflineCrawler(args.offline)
+    from jd_crawler_patchright import JDCrawlerViaSearch
+    return JDCrawlerViaSearch(headless=args.headless)
+
+
+def run_lease(client, crawler, lease, preset, log, should_stop, watchdog=None, sizer=None,
+              dead_cache=None, snapshots=None):
+    """跑一批租到的行,逐行回传;返回 run_jd_batch 的统计.
+    没拿到结果的行:停止/会话死亡 → 退还给协调器;解析不出商品 ID → 记 failed(重租也没用)."""
+    leased = lease['rows']
+    input_rows = [r['row'] for r in leased]
+    reported = set()
+
+    def on_row(row):
+        item = leased[row['index'] - 1]  # run_jd_batch 的 index 是本批内 1 起的位置
+        row['index'] = item['idx'] + 1    # 换回原 Excel 里的行号
+        try:
+            client.result(item['id'], row)
+        except Exception as e:
+            log('WARNING', f'回传结果失败(租约过期后该行会被重租): {e}')
+            return
+        reported.add(item['id'])
+
+    summary = jd_batch.run_jd_batch(crawler, input_rows, preset, on_row,
+                                    log=log, should_stop=should_stop,
+                                    cooldown=lambda seconds: _lease_cooldown(client, seconds,
+                                                                             should_stop, log),
+                                    watchdog=watchdog, sizer=sizer, dead_cache=dead_cache,
+                                    snapshots=snapshots)
+    unreported = [r for r in leased if r['id'] not in reported]
+    if not unreported:
+        return summary
+    if summary['stopped']:
+        try:
+            client.release([r['id'] for r in unreported])
+        except (urllib.error.URLError, ConnectionError) as e:
+            log('WARNING', f'协调器已不可达,{len(unreported)} 行没能退还(租约过期后会被重租): {e}')
+        return summary
+    batch_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    for item in unreported:
+        url = str(item['row'].get('url', ''))
+        row = jd_batch.new_jd_row(item['row'], item['idx'] + 1,
+                                  jd_batch.product_id_from_url(url), url, batch_time, status='failed')
+        row.update({'original_price': '-', 'promo_price': '-'})
+        try:
+            client.result(item['id'], row)
+        except Exception:
+            pass
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='分布式爬取 worker')
+    parser.add_argument('coordinator', help='协调器地址,如 http://192.168.1.10:5002')
+    parser.add_argument('--name', default=f'{socket.gethostname()}-{os.getpid()}',
+                        help='worker 名(协调器按它记租约),默认 主机名-pid')
+    parser.add_argument('--offline', metavar='URL', help='改用离线替身站点(offline_site.py),不开浏览器')
+    parser.add_argument('--headless', action='store_true')
+    args = parser.parse_args(argv)
+
+    log = lambda level, message: _log(level, message, args.name)
+    client = CoordinatorClient(args.coordinator, args.name)
+    stop_event = threading.Event()
+    should_stop = stop_event.is_set
+    # SIGTERM:在下一条 / 冷却的下一秒停下,未完成的行退还协调器(Ctrl-C 仍走 KeyboardInterrupt)
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+
+    crawler = _make_crawler(args)
+    watchdog, maintenance, sizer, dead_cache, snapshots = None, None, None, None, None
+    if not args.offline:
+        from browser_watchdog import ContextWatchdog
+        import profile_provision
+        watchdog = ContextWatchdog()
+        maintenance = lambda: profile_provision.compact_pool(log=log, should_stop=should_stop)
+        sizer = jd_batch.AccountBatchSizer()  # 租约内再按本机账号历史切批;每次租多少行仍由协调器定
+        dead_cache = jd_batch.DeadSkuCache()  # 本机 crawl_store 里的负缓存
+        import failure_snapshots
+        snapshots = failure_snapshots.SnapshotStore()  # 失败现场存本机 snapshots/
+    heartbeat = None
+    exit_code = 0
+    try:
+        crawler.login(auto_login=False)
+        if not crawler.is_logged_in:
+            log('ERROR', f'profile_{crawler.current_profile_id} 未登录,请先扫码')
+            return 2
+        ok, err = crawler.warmup()
+        if not ok:
+            log('ERROR', f'热身失败: {err}')
+            return 2
+
+        single_account_mode = False
+        preset = None  # 上一批的预设;批间衔接(账号交替/冷却)在租下一批「之前」做,冷却时不占着租约
+        while not should_stop():
+            if preset is not None:
+                ok, single_account_mode = jd_batch.between_batches(
+                    crawler, preset, '本批', single_account_mode, log,
+                    lambda seconds: _lease_cooldown(client, seconds, should_stop, log),
+                    maintenance)
+                if not ok:
+                    break
+            try:
+                lease = client.lease()
+            except (urllib.error.URLError, ConnectionError) as e:
+                # 协调器收尾后会关掉 HTTP 服务:连不上就当任务已结束,正常退出
+                log('INFO', f'协调器已不可达({e}),视为任务结束,退出')
+                break
+            if lease.get('done'):
+                log('INFO', '任务已全部完成,退出')
+                break
+            if not lease.get('rows'):
+                preset = None  # 空等不算一批,不必再交替
+                time.sleep(lease.get('retry_after', 10))
+                continue
+            if heartbeat is None:
+                interval = max(5, lease['lease_seconds'] / 3)
+                heartbeat = threading.Thread(target=_heartbeat, name='lease-heartbeat', daemon=True,
+                                             args=(client, interval, stop_event, log))
+                heartbeat.start()
+            preset = jd_batch.speed_preset(lease.get('speed'))
+            log('INFO', f'租到 {len(lease["rows"])} 行(任务 #{lease["job_id"]})')
+            summary = run_lease(client, crawler, lease, preset, log, should_stop, watchdog, sizer,
+                                dead_cache, snapshots)
+            if summary['session_dead']:
+                log('ERROR', '浏览器会话已死,未完成的行已退还,worker 退出')
+                exit_code = 2
+                break
+    except KeyboardInterrupt:
+        log('WARNING', '中止 —— 在租的行已退还')
+        try:
+            client.release(None)
+        except Exception:
+            pass
+        exit_code = 130
+    finally:
+        stop_event.set()
+        try:
+            crawler.close()
+        except Exception:
+            pass
+        if snapshots:
+            snapshots.close()
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""取价离线回归 + 测速 —— 不连京东、不用账号,拿存下来的商品页验证页面判定和 EXTRACT_PRICE_JS.
+
+每次京东改 DOM(Phase 3 价格噪声、Phase 6 改版)取价都是「静默失效」:页面正常打开,只是价格为空
+或抓错,要跑一轮线上才发现.这里把各类商品页存成样本(page_corpus/),在本机 headless 页面里
+set_content 载入(网络请求全部拦掉),按与 JDCrawlerViaSearch._get_price 相同的顺序判定:
+落地 URL(classify_landing_url)→ 下架关键字 → EXTRACT_PRICE_JS + prices_from_extract,
+和 manifest.json 里的预期逐条比对,报准确率和每页毫秒数.改选择器后几秒钟离线验证.
+
+    python3 extract_bench.py                          # 跑全部样本
+    python3 extract_bench.py --repeat 50 --only new_promo noisy_phase3
+    python3 extract_bench.py --corpus my_pages/       # 另一套样本(同样的 manifest.json 格式)
+
+manifest.json 每条:{"name", "file"(相对 corpus 目录的 html), "url"(当时的落地 URL),
+"expect": {"original","promo"} / 终态字符串('unavailable','not_found','blocked','forbidden') / null(取不到价),
+"note"}.线上抓到的新页面另存为 html、补一条 manifest 即成为新的回归样本.
+
+退出码:0 = 全部符合预期,1 = 有样本不符,2 = 样本或浏览器有问题.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+
+import jd_crawler_patchright as jdc
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'page_corpus')
+MANIFEST = 'manifest.json'
+
+
+def load_corpus(corpus_dir: str = CORPUS_DIR, only=None) -> tuple:
+    """(样本列表, err).样本:{'name','url','html','expect','note'}"""
+    path = os.path.join(corpus_dir, MANIFEST)
+    try:
+        with open(path, encoding='utf-8') as f:
+            entries = json.load(f)
+    except (OSError, ValueError) as e:
+        return None, f'读不了 {path}: {e}'
+    cases = []
+    for entry in entries:
+        if only and entry['name'] not in only:
+            continue
+        try:
+            with open(os.path.join(corpus_dir, entry['file']), encoding='utf-8', errors='replace') as f:
+                html = f.read()
+        except OSError as e:
+            return None, f'样本 {entry["name"]} 读取失败: {e}'
+        cases.append({'name': entry['name'], 'url': entry.get('url', ''), 'html': html,
+                      'expect': entry.get('expect'), 'note': entry.get('note', '')})
+    if only and len(cases) < len(set(only)):
+        missing = set(only) - {c['name'] for c in cases}
+        return None, f'manifest 里没有: {", ".join(sorted(missing))}'
+    return cases, ''
+
+
+def page_outcome(page, url: str):
+    """已载入的页面 → 终态字符串 / {'original','promo'} / None,判定顺序同 _get_price"""
+    verdict = jdc.classify_landing_url(url)
+    if verdict is None and jdc.find_unavailable_keyword(page.content() or ''):
+        verdict = 'unavailable'
+    if verdict:
+        return verdict
+    return jdc.prices_from_extract(page.evaluate(jdc.EXTRACT_PRICE_JS))
+
+
+def outcome_matches(expect, got) -> bool:
+    if isinstance(expect, dict):
+        if not isinstance(got, dict):
+            return False
+        return all(abs(float(got[k]) - float(expect[k])) < 0.005 for k in ('original', 'promo'))
+    return expect == got
+
+
+def describe(outcome) -> str:
+    if isinstance(outcome, dict):
+        return f'{outcome["original"]:g}/{outcome["promo"]:g}'
+    return '无价' if outcome is None else str(outcome)
+
+
+def run_cases(page, cases: list, repeat: int = 10) -> list:
+    """逐条载入 + 判定;取价(判定部分)重复 repeat 次取中位数.返回每条的结果 dict"""
+    results = []
+    for case in cases:
+        t0 = time.perf_counter()
+        page.set_content(case['html'], wait_until='domcontentloaded')
+        load_ms = (time.perf_counter() - t0) * 1000
+        got, timings = None, []
+        for _ in range(max(1, repeat)):
+            t0 = time.perf_counter()
+            got = page_outcome(page, case['url'])
+            timings.append((time.perf_counter() - t0) * 1000)
+        results.append({'name': case['name'], 'expect': case['expect'], 'got': got,
+                        'ok': outcome_matches(case['expect'], got), 'note': case['note'],
+                        'load_ms': load_ms, 'extract_ms': statistics.median(timings)})
+    return results
+
+
+def print_report(results: list, repeat: int):
+    width = max(len(r['name']) for r in results)
+    for r in results:
+        mark = '✓' if r['ok'] else '✗'
+        print(f'{mark} {r["name"]:<{width}}  预期 {describe(r["expect"]):<14} 实得 {describe(r["got"]):<14} '
+              f'载入 {r["load_ms"]:6.1f}ms  判定 {r["extract_ms"]:6.2f}ms')
+        if not r['ok'] and r['note']:
+            print(f'  {"":<{width}}  ({r["note"]})')
+    passed = sum(r['ok'] for r in results)
+    print(f'\n准确率 {passed}/{len(results)}'
+          f' | 载入 {statistics.mean(r["load_ms"] for r in results):.1f} ms/页'
+          f' | 判定 {statistics.mean(r["extract_ms"] for r in results):.2f} ms/页(每页 {repeat} 次取中位数)')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='取价离线回归 + 测速(page_corpus 样本)')
+    parser.add_argument('--corpus', default=CORPUS_DIR, help='样本目录(含 manifest.json),默认 page_corpus/')
+    parser.add_argument('--only', nargs='+', metavar='NAME', help='只跑这几条样本')
+    parser.add_argument('--repeat', type=int, default=10, help='每页判定重复次数(测速取中位数),默认 10')
+    parser.add_argument('--headed', action='store_true', help='有界面运行(调试选择器用)')
+    args = parser.parse_args(argv)
+
+    cases, err = load_corpus(args.corpus, args.only)
+    if err:
+        print(f'✗ {err}', file=sys.stderr)
+        return 2
+    if not cases:
+        print('✗ 没有样本', file=sys.stderr)
+        return 2
+
+    pw = jdc.sync_playwright().start()
+    try:
+        browser = pw.chromium.launch(headless=not args.headed, channel='chromium', args=jdc.LAUNCH_ARGS)
+        page = browser.new_page()
+        page.route('**/*', lambda route: route.abort())  # 样本里的 CDN 脚本 / 图片一律不发出去
+        results = run_cases(page, cases, args.repeat)
+        browser.close()
+    except Exception as e:
+        print(f'✗ 浏览器启动 / 载入失败: {e}', file=sys.stderr)
+        return 2
+    finally:
+        pw.stop()
+
+    print_report(results, args.repeat)
+    return 0 if all(r['ok'] for r in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
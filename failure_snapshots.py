@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""失败现场快照 —— 行失败时把当时的页面存下来,离线排查新的拦截形态,不必再上线复现、拿账号冒险.
+
+以前失败只留下一行 _diag(url / title / src_len).这里在失败的那一刻从 crawler 取原始数据
+(JDCrawlerViaSearch.failure_snapshot:MHTML,取不到退回 HTML;视口截图;本次导航的响应链和软风控信号),
+交给 SnapshotStore:爬取线程只做一次入队(队列满就丢弃并计数,绝不阻塞),gzip 压缩、落盘、
+超出容量删最旧的都在后台写线程里做.
+
+目录按「任务批次 / 行」索引:
+    snapshots/<batch_time 20261019_143000>/<行号 00012>_<商品ID>_<状态>_<时分秒>/
+        page.mhtml.gz | page.html.gz    screenshot.jpg    meta.json(url、title、响应链、信号、profile)
+总大小上限 JD_SNAPSHOT_MAX_MB(默认 300 MB),超出后按时间从最旧的快照删到上限的 90%.
+
+    python3 failure_snapshots.py              # 列出各批次的快照数 / 大小
+    python3 failure_snapshots.py 20261019_143000   # 列出这一批的失败行
+"""
+import os
+import sys
+import gzip
+import json
+import time
+import queue
+import shutil
+import threading
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SNAPSHOT_DIR = os.path.join(SCRIPT_DIR, 'snapshots')
+SNAPSHOT_MAX_MB = int(os.environ.get('JD_SNAPSHOT_MAX_MB', 300))
+SNAPSHOT_QUEUE_MAX = 20  # 待写快照上限;写线程跟不上时新快照直接丢弃
+META_FILE = 'meta.json'
+
+
+def run_id_of(batch_time: str) -> str:
+    """'2026-10-19 14:30:00' → '20261019_143000'(批次目录名)"""
+    digits = ''.join(ch for ch in str(batch_time or '') if ch.isdigit())
+    return f'{digits[:8]}_{digits[8:14]}' if len(digits) >= 14 else (digits or 'unknown')
+
+
+def _dir_bytes(path: str) -> int:
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, name))
+            except OSError:
+                pass
+    return total
+
+
+class SnapshotStore:
+    """容量受限、后台写盘的失败快照库.capture() 在爬取线程调用,其余都在写线程."""
+
+    def __init__(self, root: str = SNAPSHOT_DIR, max_mb: float = SNAPSHOT_MAX_MB,
+                 queue_max: int = SNAPSHOT_QUEUE_MAX):
+        self.root = root
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.written = 0
+        self.dropped = 0
+        self.evicted = 0
+        self._queue = queue.Queue(maxsize=max(1, queue_max))
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._total = None  # 库当前总字节数;写线程首次写入时统计一次,之后增量维护
+
+    def capture(self, crawler, row: dict) -> str:
+        """从 crawler 取当前页的失败现场并入队,返回将写入的目录;crawler 不支持 / 取不到 / 队列满返回 ''"""
+        if not hasattr(crawler, 'failure_snapshot'):
+            return ''
+        try:
+            snap = crawler.failure_snapshot()
+        except Exception as e:
+            print(f'  [snapshot] 取失败现场出错(忽略): {e}')
+            return ''
+        if not snap:
+            return ''
+        name = (f'{int(row.get("index") or 0):05d}_{row.get("product_id") or "na"}_'
+                f'{row.get("status", "")}_{time.strftime("%H%M%S")}')
+        path = os.path.join(self.root, run_id_of(row.get('batch_time')), name)
+        meta = {k: row.get(k) for k in ('index', 'product_id', 'url', 'status', 'batch_time',
+                                        'crawl_time', 'item', 'brand')}
+        meta['run'] = run_id_of(row.get('batch_time'))
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait((path, meta, snap))
+        except queue.Full:
+            self.dropped += 1
+            return ''
+        return path
+
+    def _ensure_writer(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='snapshot-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                self._write(*item)
+                self._enforce_cap()
+            except Exception as e:
+                print(f'  [snapshot] 写入失败(忽略): {e}')
+            finally:
+                self._queue.task_done()
+
+    def _write(self, path: str, meta: dict, snap: dict):
+        if self._total is None:
+            self._total = _dir_bytes(self.root)
+        os.makedirs(path, exist_ok=True)
+        if snap.get('mhtml'):
+            page_file, body = 'page.mhtml.gz', snap['mhtml']
+        else:
+            page_file, body = 'page.html.gz', snap.get('html') or ''
+        with gzip.open(os.path.join(path, page_file), 'wb', compresslevel=6) as f:
+            f.write(body.encode('utf-8') if isinstance(body, str) else body)
+        if snap.get('screenshot'):
+            with open(os.path.join(path, 'screenshot.jpg'), 'wb') as f:
+                f.write(snap['screenshot'])
+        meta = dict(meta, page_file=page_file,
+                    landing_url=snap.get('url', ''), title=snap.get('title', ''),
+                    chain=[list(hop) for hop in snap.get('chain') or ()],
+                    signals=list(snap.get('signals') or ()),
+                    nav_seconds=snap.get('nav_seconds'), price_api=snap.get('price_api'),
+                    profile_id=snap.get('profile_id'),
+                    captured_at=time.strftime('%Y-%m-%d %H:%M:%S'))
+        with open(os.path.join(path, META_FILE), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=1)
+        self._total += _dir_bytes(path)
+        self.written += 1
+
+    def _enforce_cap(self):
+        """超出上限 → 按修改时间从最旧的快照删,删到上限的 90%(留余量,免得每写一条删一条)"""
+        if not self.max_bytes or self._total <= self.max_bytes:
+            return
+        snaps = []
+        for run in os.listdir(self.root):
+            run_dir = os.path.join(self.root, run)
+            if os.path.isdir(run_dir):
+                snaps.extend(os.path.join(run_dir, n) for n in os.listdir(run_dir))
+        snaps.sort(key=lambda p: os.path.getmtime(p))
+        target = int(self.max_bytes * 0.9)
+        for snap_dir in snaps:
+            if self._total <= target:
+                break
+            size = _dir_bytes(snap_dir)
+            shutil.rmtree(snap_dir, ignore_errors=True)
+            self._total -= size
+            self.evicted += 1
+            run_dir = os.path.dirname(snap_dir)
+            if not os.listdir(run_dir):
+                os.rmdir(run_dir)
+
+    def flush(self, timeout: float = 30) -> bool:
+        """等队列里的快照写完(收尾时调用);超时返回 False"""
+        end = time.time() + timeout
+        while self._queue.unfinished_tasks:
+            if time.time() >= end:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def close(self, timeout: float = 30):
+        """写完剩余快照后停掉写线程"""
+        self.flush(timeout)
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout)
+        self._thread = None
+
+    def stats(self) -> dict:
+        return {'written': self.written, 'dropped': self.dropped, 'evicted': self.evicted,
+                'pending': self._queue.qsize()}
+
+
+# ---------- 索引(离线排查用) ----------
+
+def list_runs(root: str = SNAPSHOT_DIR) -> list:
+    """[{'run','count','bytes'}],新的在前"""
+    if not os.path.isdir(root):
+        return []
+    runs = []
+    for run in sorted(os.listdir(root), reverse=True):
+        run_dir = os.path.join(root, run)
+        if os.path.isdir(run_dir):
+            runs.append({'run': run, 'count': len(os.listdir(run_dir)), 'bytes': _dir_bytes(run_dir)})
+    return runs
+
+
+def list_snapshots(run: str, root: str = SNAPSHOT_DIR) -> list:
+    """某批次的快照 meta(按行号),每条带 'path'"""
+    run_dir = os.path.join(root, os.path.basename(run))
+    if not os.path.isdir(run_dir):
+        return []
+    snaps = []
+    for name in sorted(os.listdir(run_dir)):
+        try:
+            with open(os.path.join(run_dir, name, META_FILE), encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            continue  # 写线程还没写完 meta,或已被容量淘汰
+        snaps.append(dict(meta, path=os.path.join(run_dir, name)))
+    return snaps
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        runs = list_runs()
+        if not runs:
+            print(f'还没有失败快照({SNAPSHOT_DIR})')
+        for r in runs:
+            print(f'{r["run"]}  {r["count"]:4d} 条  {r["bytes"] / 1024 / 1024:7.1f} MB')
+        return 0
+    snaps = list_snapshots(argv[0])
+    if not snaps:
+        print(f'批次 {argv[0]} 没有快照')
+        return 1
+    for s in snaps:
+        chain = ' → '.join(f'{status} {url[:60]}' for status, url in s.get('chain') or ())
+        print(f'[{s.get("index")}] {s.get("product_id")} {s.get("status")} '
+              f'profile_{s.get("profile_id")} {", ".join(s.get("signals") or ()) or "-"}')
+        print(f'    落地 {s.get("landing_url", "")[:100]}  「{(s.get("title") or "")[:40]}」')
+        if chain:
+            print(f'    响应链 {chain}')
+        print(f'    {s["path"]}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,1007 @@
+#!/usr/bin/env python3
+"""京东批量爬取的公共部分 —— Web(app.py)与命令行(main_batch.py)共用.
+
+- 行解析:iter_jd_rows / parse_jd_excel 流式读上传的 Excel → row dict
+- 行结果:new_jd_row / apply_jd_prices 把 crawler 返回的 prices 翻译成结果行
+- 调度:run_jd_batch 自动分批 + 账号交替/批间冷却 + 连续失败切 profile + 随机游走,
+  即 Web 端一直在用的节奏,只是把「日志/结果/停止/冷却」换成调用方传入的回调.
+
+回调约定(与 profile_provision 的 emit 一样是普通 callable):
+    log(level, message)       level = 'INFO' / 'WARNING' / 'ERROR'
+    on_row(row)               每产出一行结果(含 skipped)调用一次
+    on_progress(data)         与前端 progress 事件同结构,可省略
+    should_stop() -> bool     True 时在下一行/下一批前退出
+    cooldown(seconds) -> bool 批间冷却;返回 False 表示冷却中被停止
+    between_rows() -> bool    行间隙的插队任务(Web 端的快速查询),返回 True 表示占用了一次请求
+    maintenance()             批间冷却开始时先做的本地维护(profile 目录瘦身),耗时从冷却里扣
+"""
+import os
+import re
+import time
+import random
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Optional
+
+import crawl_store
+
+# 爬取强度预设 — UI 上让用户在「稳」和「快」之间权衡。冷却都是 10 分钟,
+# 只调每批条数:批越大→批数越少→省下的全是 10 分钟的批间等待,但单会话连续请求越多、越易触发风控。
+# ⚠️ 实测:enhanced(100/批)在第 3 批(~第 209 条)即触发京东 PC 频控页
+#    (pc-frequent-pro.pf.jd.com/?reason=403),之后连续失败 100+ 条、完全进不去商品页 —— 不可用,已移除。
+#    未知 speed 一律回退 regular。
+JD_SPEED_PRESETS = {
+    'regular':  {'batch_size': 25,  'cooldown': 600, 'label': '常规'},
+    'fast':     {'batch_size': 50,  'cooldown': 600, 'label': '快速'},
+}
+
+# 可重试的状态 —— 写进 _errors.xlsx、Web 端「重试失败项」、命令行退出码 1 都按它判断
+RETRYABLE_STATUSES = ('failed', 'blocked', 'forbidden', 'skipped')
+
+# 软风控前兆(crawler.last_signals,见 jd_crawler_patchright.SOFT_BLOCK_URL_MARKERS):
+# 「换号」类出现一次就切下一个 profile,不再等连续 3 次失败白白烧掉 3 条的停留时间;
+# 「退避」类先歇一会,连续两条都出现再换号
+ROTATE_SIGNALS = ('frequent', 'risk_handler', 'http_403', 'http_429')
+BACKOFF_SIGNALS = ('slow', 'no_price_api')
+
+# 同一次任务内自动重试:这些状态的行进延迟队列,换号 + 指数退避(60s 起、封顶 15 分钟)再试
+DEFER_STATUSES = RETRYABLE_STATUSES + ('partial',)
+MAX_ROW_ATTEMPTS = 3
+RETRY_BASE_DELAY = 60
+RETRY_MAX_DELAY = 900
+
+# 按账号学批大小(AccountBatchSizer):被拦段长度取 25% 分位再打 8 折;
+# 「被拦」= blocked / forbidden 或换号类软风控信号,failed(价格没取到)不算
+LEARN_QUANTILE = 0.25
+LEARN_SAFETY = 0.8
+LEARN_MIN_CLEAN = 3
+LEARN_MIN_BATCH = 10  # 只作没被拦过的账号的下限;有被拦记录的照历史给,最少 1 条
+BLOCK_STATUSES = ('blocked', 'forbidden')
+
+# 负缓存(DeadSkuCache):判过下架 / 不存在的商品 DEAD_SKU_TTL_DAYS 天内不再爬,直接沿用上次结论;
+# 其中超过 DEAD_SKU_REPROBE_DAYS 天没复查的,每次任务挑最旧的几条排在最后重新爬,发现重新上架
+DEAD_STATUSES = ('unavailable', 'not_found')
+DEAD_SKU_TTL_DAYS = float(os.environ.get('JD_DEAD_SKU_TTL_DAYS', 30))
+DEAD_SKU_REPROBE_DAYS = float(os.environ.get('JD_DEAD_SKU_REPROBE_DAYS', 7))
+DEAD_SKU_REPROBE_PER_RUN = 5
+
+# 解析上传清单时每读这么多行报一次进度
+PARSE_PROGRESS_EVERY = 2000
+# 解析结果按文件内容哈希缓存(上传 / 开跑 / 重试同一份文件只解析一次),缓存总行数上限
+PARSE_CACHE_MAX_ROWS = 200_000
+
+# 计入「连续失败」的状态(partial 也算:价格只取到一半通常是页面被风控截断)
+FAILURE_STATUSES = ('failed', 'blocked', 'forbidden', 'partial')
+
+
+def speed_preset(speed: Optional[str]) -> dict:
+    return JD_SPEED_PRESETS.get(speed, JD_SPEED_PRESETS['regular'])
+
+
+def _print_log(level, message):
+    print(f'[{level}] {message}')
+
+
+# ==================== 行解析 ====================
+
+def norm_col(name):
+    """归一化列名用于匹配"""
+    return str(name).strip().lower().replace(' ', '').replace('_', '')
+
+
+def product_id_from_url(url) -> str:
+    """始终从 URL 解析 product_id — 不信任 Excel 里的 ProductKey 列
+    (那列经常被污染成 "ID|商品名" 的脏数据,且本来就是另一个系统的 ID)"""
+    m = re.search(r'/(\d+)\.html', str(url or ''))
+    return m.group(1) if m else ''
+
+
+def _header(values) -> list:
+    return [f'Unnamed: {i}' if h is None else str(h).strip() for i, h in enumerate(values or ())]
+
+
+def sheet_columns(filepath) -> list:
+    """首个 sheet 的表头(只读首行)"""
+    if not str(filepath).lower().endswith(('.xlsx', '.xlsm')):
+        import pandas as pd
+        return [str(c) for c in pd.read_excel(filepath, nrows=0).columns]
+    from openpyxl import load_workbook
+    wb = load_workbook(filepath, read_only=True)
+    try:
+        return _header(next(wb.worksheets[0].iter_rows(values_only=True), None))
+    finally:
+        wb.close()
+
+
+def read_sheet(filepath) -> tuple:
+    """首个 sheet → (表头, 数据行迭代器(值元组), 估计数据行数).
+
+    .xlsx 用 openpyxl 只读模式逐行流式读,整本 workbook 不进内存(5 万行以上的清单也只占几 MB);
+    迭代器读完(或被丢弃回收)时关闭文件.老式 .xls openpyxl 不支持,仍走 pandas 整表读.
+    """
+    if not str(filepath).lower().endswith(('.xlsx', '.xlsm')):
+        import pandas as pd
+        df = pd.read_excel(filepath)
+        body = (tuple(None if pd.isna(v) else v for v in values)
+                for values in df.itertuples(index=False, name=None))
+        return [str(c) for c in df.columns], body, len(df)
+
+    from openpyxl import load_workbook
+    wb = load_workbook(filepath, read_only=True, data_only=True)
+    ws = wb.worksheets[0]
+    rows = ws.iter_rows(values_only=True)
+    header = _header(next(rows, None))
+    total = max(0, (ws.max_row or 0) - 1)  # 只读 sheet 的 dimension,不扫全表
+
+    def body():
+        try:
+            for values in rows:
+                if values and any(v is not None for v in values):
+                    yield values
+        finally:
+            wb.close()
+    return header, body(), total
+
+
+def pick_column(header, *candidates) -> Optional[int]:
+    """按候选列名找列下标:先精确匹配(归一化后),再前缀匹配(兼容 "Price Reference_0" 之类)"""
+    normed = [norm_col(h) for h in header]
+    for c in candidates:
+        if norm_col(c) in normed:
+            return normed.index(norm_col(c))
+    for c in candidates:
+        nc = norm_col(c)
+        for i, norm in enumerate(normed):
+            if norm.startswith(nc):
+                return i
+    return None
+
+
+def cell_text(v) -> str:
+    """单元格值 → 字符串:空 → '',整数值的 float(Excel 里的数字 ID)去掉 .0,其它 float 保留两位"""
+    if v is None:
+        return ''
+    if isinstance(v, float):
+        if v != v:  # NaN
+            return ''
+        if v.is_integer():
+            return str(int(v))
+        return f'{v:.2f}'
+    return str(v).strip()
+
+
+def iter_jd_rows(filepath, on_progress: Optional[Callable] = None):
+    """逐行解析京东清单的 5 个核心列,产出 row dict(流式,不把整表读进内存).
+    on_progress(已读行数, 估计总行数) 每 PARSE_PROGRESS_EVERY 行及读完时各调一次."""
+    header, body, total = read_sheet(filepath)
+    brand_i = pick_column(header, 'Brand', '品牌')
+    item_i = pick_column(header, 'Item', '型号', 'Model')
+    url_i = pick_column(header, 'URL', 'ProductUrl std', 'ProductUrl', '链接')
+    key_i = pick_column(header, 'Product Key', 'ProductKey', 'SKU')
+    ref_i = pick_column(header, 'Price Reference', 'PriceReference', '参考价')
+
+    done = 0
+    for values in body:
+        def val(i):
+            return cell_text(values[i]) if i is not None and i < len(values) else ''
+
+        done += 1
+        if on_progress and done % PARSE_PROGRESS_EVERY == 0:
+            on_progress(done, max(done, total))
+
+        brand = val(brand_i)
+        item = val(item_i)
+        url = val(url_i)
+        key = val(key_i)
+        ref = val(ref_i)
+
+        # URL 缺失时,从 Product Key 构造
+        if not url and key:
+            url = f"https://item.jd.com/{key}.html"
+
+        # 从 URL 提取 product_id(爬取用)
+        product_id = product_id_from_url(url)
+        if not product_id and key:
+            product_id = key
+
+        if not url and not product_id:
+            continue  # 跳过无效行
+
+        yield {
+            'brand': brand,
+            'item': item,
+            'url': url,
+            'product_key': key,
+            'price_reference': ref,
+            'product_id': product_id,
+        }
+    if on_progress:
+        on_progress(done, done)
+
+
+_parse_cache_lock = threading.Lock()
+_parse_cache = OrderedDict()  # (kind, sha256) → 解析好的行列表,最近用的在后
+_digests = {}                 # (路径, mtime_ns, size) → sha256,同一文件不重复算哈希
+
+
+def file_digest(filepath) -> str:
+    """文件内容的 sha256(按路径 + mtime + 大小记住,文件没变就不再读)"""
+    st = os.stat(filepath)
+    key = (os.path.abspath(filepath), st.st_mtime_ns, st.st_size)
+    with _parse_cache_lock:
+        digest = _digests.get(key)
+    if digest:
+        return digest
+    h = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    digest = h.hexdigest()
+    with _parse_cache_lock:
+        _digests[key] = digest
+    return digest
+
+
+def cached_rows(filepath, parse: Callable, kind: str,
+                on_progress: Optional[Callable] = None) -> list:
+    """parse(filepath, on_progress) → 行列表,按文件内容哈希缓存:同一份内容(换了文件名也一样)
+    第二次起直接返回缓存的副本.缓存总行数超过 PARSE_CACHE_MAX_ROWS 时淘汰最久没用的."""
+    key = (kind, file_digest(filepath))
+    with _parse_cache_lock:
+        rows = _parse_cache.get(key)
+        if rows is not None:
+            _parse_cache.move_to_end(key)
+    if rows is None:
+        rows = parse(filepath, on_progress)
+        with _parse_cache_lock:
+            _parse_cache[key] = rows
+            while len(_parse_cache) > 1 and sum(map(len, _parse_cache.values())) > PARSE_CACHE_MAX_ROWS:
+                _parse_cache.popitem(last=False)
+    elif on_progress:
+        on_progress(len(rows), len(rows))
+    # 给副本:调用方(重试时改行、分布式写库)改了也不污染缓存
+    return [dict(r) for r in rows]
+
+
+def parse_jd_excel(filepath, on_progress: Optional[Callable] = None):
+    """读取 Excel 并提取 5 个核心列,返回 row dict 列表(iter_jd_rows 的列表版,按内容哈希缓存)"""
+    return cached_rows(filepath, lambda path, cb: list(iter_jd_rows(path, cb)), 'jd', on_progress)
+
+
+# ==================== 结果行 ====================
+
+def new_jd_row(input_row, idx, product_id, url, batch_time, status='pending'):
+    """京东结果行骨架,同步/异步引擎、Web/命令行共用"""
+    return {
+        'index': idx,
+        'platform': 'jd',
+        'brand': input_row.get('brand', ''),
+        'item': input_row.get('item', ''),
+        'product_key': input_row.get('product_key', ''),
+        'price_reference': input_row.get('price_reference', ''),
+        'product_id': product_id,
+        'url': url,
+        'batch_time': batch_time,
+        'crawl_time': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'original_price': None,
+        'promo_price': None,
+        'status': status
+    }
+
+
+def apply_jd_prices(row, prices, none_diag='', log: Callable = _print_log):
+    """把 crawler 返回的 prices(或 None)翻译成行状态 + 日志.
+    并发引擎收尾时把没跑到的行以 original='skipped' 交回,记 skipped(可重试)"""
+    if prices:
+        original = prices.get('original')
+        promo = prices.get('promo')
+        diag = prices.get('_diag', '')
+
+        if original == 'not_found':
+            log('WARNING', f'  Product not found')
+            row.update({'status': 'not_found', 'original_price': '-', 'promo_price': '-'})
+        elif original == 'blocked':
+            log('WARNING', f'  Anti-crawl triggered (retry) | {diag}')
+            row.update({'status': 'blocked', 'original_price': '-', 'promo_price': '-'})
+        elif original == 'forbidden':
+            log('WARNING', f'  403 Forbidden (retry) | {diag}')
+            row.update({'status': 'forbidden', 'original_price': '-', 'promo_price': '-'})
+        elif original == 'unavailable':
+            log('WARNING', f'  Product delisted')
+            row.update({'status': 'unavailable', 'original_price': '-', 'promo_price': '-'})
+        elif original == 'skipped':
+            log('WARNING', f'  Skipped (stopped / no account left, retry) | {diag}')
+            row.update({'status': 'skipped', 'original_price': '-', 'promo_price': '-'})
+        else:
+            log('INFO', f'  OK: ¥{original} / ¥{promo}')
+            row.update({
+                'status': 'success',
+                'original_price': original,
+                'promo_price': promo
+            })
+            if not original or not promo:
+                row['status'] = 'partial'
+    else:
+        log('WARNING', f'  Failed (can retry) | prices=None | {none_diag}')
+        row.update({'status': 'failed', 'original_price': '-', 'promo_price': '-'})
+    return row
+
+
+def jd_excel_row(r):
+    """结果行 → 京东主文件 Excel 行(列名即导出的表头,命令行 CSV 同样用它)"""
+    return {
+        'Batch Time': r['batch_time'],
+        'Crawl Time': r['crawl_time'],
+        'Brand': r.get('brand', ''),
+        'Item': r.get('item', ''),
+        'URL': r['url'],
+        'Product Key': r.get('product_key', '') or r.get('product_id', ''),
+        'Price Reference': r.get('price_reference', ''),
+        'Status': r['status'],
+        'Price': r['original_price'] if r['original_price'] not in (None, '-') else 'N/A',
+        'Promotion Price': r['promo_price'] if r['promo_price'] not in (None, '-') else 'N/A',
+    }
+
+
+def row_identity(brand, item, url, product_key):
+    """一行的业务身份 = (Brand, Item, URL, Product Key) 归一化元组。
+    ⚠️ 不能只用 URL:源数据里允许同一个京东商品挂多条不同 Item 的行(同 URL 不同 Item),
+    它们是合法的不同行,必须各自保留;只有四元组才能唯一区分。"""
+    return (str(brand or '').strip(), str(item or '').strip(),
+            str(url or '').strip(), str(product_key or '').strip())
+
+
+def result_row_identity(r):
+    """从结果行(小写键)取身份。Product Key 与写 Excel 时一致:product_key 缺失则用 product_id。"""
+    return row_identity(r.get('brand'), r.get('item'), r.get('url'),
+                        r.get('product_key') or r.get('product_id'))
+
+
+# 错误小文件与主文件「同名配对」:主文件 JD_Price_Marks_X.xlsx ↔ 错误文件 JD_Price_Marks_X_errors.xlsx。
+# 这样 Flask 重启后(live_results 已清空),retry 只需找到最新的 *_errors.xlsx,
+# 就能既拿到「要重爬哪些」(读错误文件),又知道「回填到哪个主文件」(去掉 _errors 后缀)。
+def errors_path_for(master_path):
+    """主文件路径 → 配对的错误文件路径(……_errors.xlsx)."""
+    if master_path.endswith('.xlsx'):
+        return master_path[:-len('.xlsx')] + '_errors.xlsx'
+    return master_path + '_errors.xlsx'
+
+
+def save_jd_excel(results, output_filepath, log: Callable = _print_log):
+    """把京东结果行写进主文件 + 配对错误文件,返回错误文件名(无失败项则 None).
+
+    按「行身份」回填进磁盘上已有的主文件:retry 只爬了几条、或 Flask 重启后只剩本次几条时,
+    主文件里「没参与本次」的其余行原样保留,本次结果就地替换对应行。用列表+身份匹配
+    (不是按 URL 建字典),因为同 URL 不同 Item 是合法的多行,字典会把它们折叠丢行。
+    """
+    import pandas as pd
+    results = [r for r in results if r.get('url')]
+
+    # 本次结果,按行身份建索引(同身份取最后一条)
+    session_by_id = {}
+    for r in results:
+        session_by_id[result_row_identity(r)] = jd_excel_row(r)
+
+    out_rows = []
+    if os.path.exists(output_filepath):
+        # 主文件已存在(retry/重启):逐行读旧主文件,身份命中本次结果就就地替换,否则原样保留 —— 保序、保数量
+        used = set()
+        try:
+            old_df = pd.read_excel(output_filepath)
+            for _, orow in old_df.iterrows():
+                oid = row_identity(orow.get('Brand'), orow.get('Item'),
+                                   orow.get('URL'), orow.get('Product Key'))
+                if oid in session_by_id:
+                    out_rows.append(session_by_id[oid])
+                    used.add(oid)
+                else:
+                    out_rows.append({c: ('' if pd.isna(orow[c]) else orow[c])
+                                     for c in old_df.columns})
+        except Exception as e:
+            log('WARNING', f'读取旧主文件失败(忽略,按本次结果全新写入): {e}')
+            out_rows = []
+            used = set()
+        # 本次有、但旧主文件里没有的(全新行)追加到末尾
+        for sid, srow in session_by_id.items():
+            if sid not in used:
+                out_rows.append(srow)
+    else:
+        # 全新一批:原样写出本次所有行(普通爬取用 append,合法的同 URL 不同 Item 行都在);
+        # 自动重试过的行产出得晚,按原行号稳定排序回原位
+        out_rows = [jd_excel_row(r) for r in sorted(results, key=lambda r: r.get('index') or 0)]
+
+    df_results = pd.DataFrame(out_rows)
+    df_results.to_excel(output_filepath, index=False, engine='openpyxl')
+
+    # 产出/更新独立错误小文件(上传格式 5 列)——可持久化、可手动当新批次重跑、retry 的数据源。
+    #    从合并后的主文件真相派生「当前还失败的」,全成功则删掉旧错误文件避免误导。
+    errors_path = errors_path_for(output_filepath)
+    err_rows = [row for row in out_rows
+                if str(row.get('Status', '')) in RETRYABLE_STATUSES]
+    if err_rows:
+        err_df = pd.DataFrame([{
+            'Brand': row.get('Brand', ''),
+            'Item': row.get('Item', ''),
+            'URL': row.get('URL', ''),
+            'Product Key': row.get('Product Key', ''),
+            'Price Reference': row.get('Price Reference', ''),
+        } for row in err_rows])
+        err_df.to_excel(errors_path, index=False, engine='openpyxl')
+        errors_file_name = os.path.basename(errors_path)
+        log('INFO',
+            f'  ⚠ {len(err_rows)} 条失败/跳过 → 错误文件 {errors_file_name}'
+            f'(可点「重试失败项」,或手动当新批次重新上传)')
+    else:
+        errors_file_name = None
+        try:
+            if os.path.exists(errors_path):
+                os.remove(errors_path)
+        except Exception:
+            pass
+    return errors_file_name
+
+
+def process_jd_row(crawler, input_row, idx, total, batch_time,
+                   log: Callable = _print_log, on_progress: Optional[Callable] = None,
+                   prices: Optional[dict] = None):
+    """处理单行并返回结果 row;URL 里解析不出商品 ID 返回 None.
+    prices 已由接口取到(get_prices_via_api)时直接用,不再开页面."""
+    url = str(input_row.get('url', ''))
+    product_id = product_id_from_url(url)
+
+    if not product_id:
+        log('WARNING', f'[{idx}/{total}] Cannot extract product ID: {url}')
+        return None
+
+    item_label = input_row.get('item') or product_id
+    log('INFO', f'[{idx}/{total}] Processing: {item_label}')
+
+    if on_progress:
+        on_progress({
+            'current': idx,
+            'total': total,
+            'percent': round(idx / total * 100, 1),
+            'current_url': url,
+            'product_id': product_id,
+            'status': 'processing'
+        })
+
+    row = new_jd_row(input_row, idx, product_id, url, batch_time)
+    if prices:
+        log('INFO', '  (价格接口)')
+        return apply_jd_prices(row, prices, log=log)
+
+    try:
+        prices = crawler.get_price_via_search(product_id)
+        none_diag = ''
+        if not prices:
+            # 收集诊断信息(get_price 返回 None 通常是会话/网络问题,或价格元素提取失败)
+            try:
+                none_diag = (f'url="{(crawler.driver.current_url or "")[:90]}" '
+                             f'title="{(crawler.driver.title or "")[:50]}"')
+            except Exception:
+                none_diag = 'driver state unavailable'
+        apply_jd_prices(row, prices, none_diag, log)
+
+    except Exception as e:
+        log('ERROR', f'  Error: {str(e)}')
+        row.update({'status': 'failed', 'original_price': '-', 'promo_price': '-'})
+
+    return row
+
+
+# ==================== 调度 ====================
+
+def _sleep_cooldown(seconds):
+    time.sleep(seconds)
+    return True
+
+
+def _cooldown_with_maintenance(seconds: int, cooldown: Callable, maintenance: Optional[Callable],
+                               log: Callable) -> bool:
+    """冷却空窗里先跑本地维护(不碰京东),再把剩余时间冷却完 —— 总等待时长不变."""
+    if maintenance:
+        started = time.time()
+        try:
+            maintenance()
+        except Exception as e:
+            log('WARNING', f'冷却期维护失败(忽略): {e}')
+        seconds = max(0, seconds - int(time.time() - started))
+    return cooldown(seconds)
+
+
+def between_batches(crawler, preset: dict, batch_label: str, single_account_mode: bool,
+                    log: Callable = _print_log, cooldown: Callable = _sleep_cooldown,
+                    maintenance: Optional[Callable] = None) -> tuple:
+    """一批跑完后的衔接,返回 (继续?, single_account_mode);冷却中被停止返回 (False, ...).
+
+    优先「账号交替」——切到下一个账号继续,用对方那批的时长填掉冷却空窗(免等)。
+    只在两种情况下才真正冷却:① 上一批 profile 池耗尽(全员被风控,需自愈时间);
+    ② 只剩 1 个可用账号(无从交替,退回已验证的 600s)。冷却值绝不缩水。
+    """
+    batch_cooldown = preset['cooldown']
+    if crawler.current_profile_id is None:
+        # 池耗尽:给所有账号自愈时间
+        log('INFO', f'✓ {batch_label}完成(账号池耗尽)— 冷却 {batch_cooldown//60} 分钟后继续')
+        return _cooldown_with_maintenance(batch_cooldown, cooldown, maintenance, log), single_account_mode
+
+    new_pid = None if single_account_mode else crawler.rotate_profile()
+    if new_pid is not None:
+        log('INFO', f'✓ {batch_label}完成 — 切到 profile_{new_pid} 继续(账号交替,免冷却)')
+        return True, single_account_mode
+
+    # 只有 1 个可用账号 → 用验证过的 600s,不缩水;并记住,后续不再尝试交替
+    log('INFO', f'✓ {batch_label}完成 — 仅 1 个可用账号,冷却 {batch_cooldown//60} 分钟后继续')
+    return _cooldown_with_maintenance(batch_cooldown, cooldown, maintenance, log), True
+
+
+class AccountBatchSizer:
+    """按账号自己的「被拦前连续成功条数」历史定下一批的大小(记录存 crawl_store.profile_streaks).
+
+    - 有被拦记录:取被拦段长度的低分位(LEARN_QUANTILE)再打 LEARN_SAFETY 折 —— 赶在它惯常出事之前换号;
+      脆弱账号照历史给小批,最少 1 条,不用 LEARN_MIN_BATCH 把它顶回去;
+    - 最近 LEARN_MIN_CLEAN 段以上都没被拦:在最长的健康段上放大 25%,让耐用的账号每轮多干点,
+      不少于 LEARN_MIN_BATCH;
+    - 记录不够:用预设值.上限都是预设 × 2.
+    """
+
+    def __init__(self, history: int = 20):
+        self.history = history
+
+    def size_for(self, profile_id: Optional[int], preset: dict) -> int:
+        default = preset['batch_size']
+        if profile_id is None:
+            return default
+        streaks = crawl_store.profile_streaks(profile_id, self.history)
+        blocked = sorted(s['rows'] for s in streaks if s['blocked'])
+        if blocked:
+            q = blocked[min(len(blocked) - 1, int(len(blocked) * LEARN_QUANTILE))]
+            return max(1, min(int(q * LEARN_SAFETY), default * 2))
+        if len(streaks) >= LEARN_MIN_CLEAN:
+            size = int(max(s['rows'] for s in streaks) * 1.25)
+            return max(LEARN_MIN_BATCH, min(size, default * 2))
+        return default
+
+    def record(self, profile_id: Optional[int], rows: int, blocked: bool) -> None:
+        if profile_id is None or (rows == 0 and not blocked):
+            return
+        crawl_store.record_streak(profile_id, rows, blocked)
+
+
+class DeadSkuCache:
+    """下架 / 不存在商品的持久负缓存(crawl_store.dead_skus),按 product_id 记.
+
+    plan() 在开跑前把命中的行分成「直接沿用上次结论」和「到期复查」两类;
+    record() 在每行出结果时更新:又判死 → 刷新时间,爬到价格 → 移出缓存.
+    """
+
+    def __init__(self, ttl_days: float = DEAD_SKU_TTL_DAYS,
+                 reprobe_days: float = DEAD_SKU_REPROBE_DAYS,
+                 reprobe_per_run: int = DEAD_SKU_REPROBE_PER_RUN):
+        self.ttl_seconds = ttl_days * 86400
+        self.reprobe_seconds = reprobe_days * 86400
+        self.reprobe_per_run = reprobe_per_run
+
+    def plan(self, work: list) -> tuple:
+        """work = [(行号, 输入行, 尝试次数)] → (cached {行号: 缓存记录}, reprobe {行号})."""
+        pids = {idx: product_id_from_url(str(row.get('url', ''))) for idx, row, _ in work}
+        dead = crawl_store.dead_skus(list(pids.values()), self.ttl_seconds)
+        hits = [(idx, dead[pid]) for idx, pid in pids.items() if pid in dead]
+        stale = time.strftime('%Y-%m-%d %H:%M:%S',
+                              time.localtime(time.time() - self.reprobe_seconds))
+        due = sorted((entry['checked_at'], idx) for idx, entry in hits if entry['checked_at'] < stale)
+        reprobe = {idx for _, idx in due[:self.reprobe_per_run]}
+        return {idx: entry for idx, entry in hits if idx not in reprobe}, reprobe
+
+    def record(self, row: dict) -> None:
+        pid = row.get('product_id')
+        if not pid:
+            return
+        if row['status'] in DEAD_STATUSES:
+            crawl_store.mark_dead_sku(pid, row['status'])
+        elif row['status'] in ('success', 'partial'):
+            crawl_store.clear_dead_sku(pid)
+
+
+def _prefetch_api_prices(crawler, chunk: list, log: Callable) -> tuple:
+    """一批行开跑前先用价格接口批量取价:({product_id: prices}, anomaly);
+    取不到 / 接口异常的行照常开页面,anomaly 非空时调用方本次任务不再调接口"""
+    pids = [product_id_from_url(str(row.get('url', ''))) for _, row, _ in chunk]
+    pids = [p for p in pids if p]
+    if not pids:
+        return {}, ''
+    try:
+        found, anomaly = crawler.get_prices_via_api(pids)
+    except Exception as e:
+        found, anomaly = {}, str(e)
+    log('INFO' if not anomaly else 'WARNING',
+        f'  价格接口: {len(found)}/{len(pids)} 条直接取到'
+        + (f'(接口异常 {anomaly},其余走页面)' if anomaly else ',其余走页面' if len(found) < len(pids) else ''))
+    return found, anomaly
+
+
+def _next_page_pid(chunk: list, start: int, api_prices: dict) -> Optional[str]:
+    """chunk[start:] 里下一条要开页面的商品 ID(跳过解析不出 ID、接口已取到价的行);没有返回 None"""
+    for _, input_row, _ in chunk[start:]:
+        pid = product_id_from_url(str(input_row.get('url', '')))
+        if pid and pid not in api_prices:
+            return pid
+    return None
+
+
+def _retry_delay(attempts: int) -> float:
+    """第 attempts 次没成功后,隔多久再试(指数退避,封顶)."""
+    return min(RETRY_BASE_DELAY * 2 ** (attempts - 1), RETRY_MAX_DELAY)
+
+
+def run_jd_batch(crawler, input_rows, preset: dict, on_row: Callable,
+                 log: Callable = _print_log,
+                 on_progress: Optional[Callable] = None,
+                 should_stop: Callable = lambda: False,
+                 cooldown: Callable = _sleep_cooldown,
+                 between_rows: Optional[Callable] = None,
+                 batch_time: Optional[str] = None,
+                 watchdog=None,
+                 maintenance: Optional[Callable] = None,
+                 max_attempts: int = MAX_ROW_ATTEMPTS,
+                 sizer: Optional[AccountBatchSizer] = None,
+                 dead_cache: Optional[DeadSkuCache] = None,
+                 price_api: bool = False,
+                 prefetch: bool = False,
+                 snapshots=None) -> dict:
+    """按预设节奏跑完 input_rows(crawler 需已登录并热身).
+    watchdog:browser_watchdog.ContextWatchdog,行边界检查内存 / 页面数,超限原 profile 重开.
+    sizer:AccountBatchSizer,每批开跑前按当前账号的历史定批大小,并记录本段被拦前成功了几条;
+    不传则每批固定 preset['batch_size'].
+    dead_cache:DeadSkuCache,开跑前把近期判过下架 / 不存在的行直接按上次结论产出(不开页面),
+    到期复查的几条排到最后;每行结果回写缓存.
+    price_api:每批先用已登录 context 调批量价格接口(crawler.get_prices_via_api),取到价的行
+    毫秒级产出、不开页面也不计入节奏;没取到 / 接口异常的行照常走页面渲染,接口出现过异常后本次不再调.
+    prefetch:流水线模式 —— 每条开页面前把本批下一条要开页面的商品告诉 crawler.queue_prefetch,
+    当前商品停留滚动时它在同一 context 的后台标签页里加载,轮到它时直接切过去(不支持的 crawler 忽略).
+    between_rows:行间隙回调(快速查询插队),借当前账号查了一条就返回其行状态,没有返回 None;
+    这一条占本批名额(批内剩下的行顺延到下一批),结论同样计入失败计数和软风控 / 换号判断.
+    snapshots:failure_snapshots.SnapshotStore,开页面的行失败(FAILURE_STATUSES)时保存当时的页面 /
+    截图 / 响应链,压缩落盘在它的后台线程,这里只入队.
+
+    可重试的行(DEFER_STATUSES)不立即产出,而是进延迟重试队列:主轮跑完后换号、按指数退避
+    再试,最多 max_attempts 次(1 = 不自动重试).每行只调一次 on_row(最终结果),
+    停止 / 会话死亡时队列里的行按最后一次结果产出 —— 调用方无需处理同一行的多次结果.
+
+    返回统计:{'success','failed','unavailable','total','stopped','session_dead','retried','cached'}.
+    session_dead = 浏览器会话异常死亡(被关/崩溃)—— 与「真·反爬」区分,触发后如实报告并中止.
+    """
+    batch_size = preset['batch_size']
+    batch_cooldown = preset['cooldown']
+    batch_time = batch_time or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    total = len(input_rows)
+
+    stats = {'success': 0, 'failed': 0, 'unavailable': 0}
+    emitted = 0
+    retried = 0
+    # 延迟重试队列:行号 → {'input_row','attempts','row'(目前最好的结果),'profile','ready_at'}
+    deferred = {}
+
+    def report_stats(processed):
+        if on_progress:
+            on_progress({'statistics': dict(stats, total=processed)})
+
+    def emit(row, cached=False):
+        nonlocal emitted
+        if dead_cache and not cached:
+            dead_cache.record(row)
+        on_row(row)
+        emitted += 1
+        if row['status'] == 'success':
+            stats['success'] += 1
+        elif row['status'] in FAILURE_STATUSES or row['status'] == 'skipped':
+            stats['failed'] += 1
+        elif row['status'] in ('unavailable', 'not_found'):
+            stats['unavailable'] += 1
+        report_stats(emitted)
+
+    # 当前账号这一段的连续正常条数(首次被拦 / 换号 / 批结束时记一笔给 sizer)
+    streak = {'pid': None, 'rows': 0, 'open': False}
+
+    def open_streak():
+        streak.update(pid=crawler.current_profile_id, rows=0, open=True)
+
+    def close_streak(blocked):
+        if streak['open'] and sizer:
+            sizer.record(streak['pid'], streak['rows'], blocked)
+        streak['open'] = False
+
+    def settle(idx, input_row, attempts, row, tried=True):
+        """一次尝试的结果:终态直接产出;可重试且还有次数 → 进队列稍后换号再试.
+        tried=False:行根本没发请求(池耗尽跳过),attempts 原样传入、不占次数,也不逐行打日志."""
+        prev = deferred.pop(idx, None)
+        if prev and prev['row']['status'] == 'partial' and row['status'] != 'success':
+            row = prev['row']  # 半价结果好过重试失败
+        if row['status'] in DEFER_STATUSES and attempts < max_attempts:
+            delay = _retry_delay(max(1, attempts))
+            deferred[idx] = {'input_row': input_row, 'attempts': attempts, 'row': row,
+                             'profile': crawler.current_profile_id,
+                             'ready_at': time.time() + delay}
+            if tried:
+                log('INFO', f'  ↻ 第 {attempts}/{max_attempts} 次未成功({row["status"]}),'
+                            f'{delay:.0f} 秒后换号重试')
+            return
+        emit(row)
+
+    # 工作项 (行号, 输入行, 已尝试次数);主轮 + 若干重试轮共用下面的分批/交替/风控逻辑
+    work = [(i, row, 0) for i, row in enumerate(input_rows, 1)]
+    cached = {}
+    if dead_cache:
+        cached, reprobe = dead_cache.plan(work)
+        for idx, input_row, _ in work:
+            entry = cached.get(idx)
+            if entry is None:
+                continue
+            url = str(input_row.get('url', ''))
+            row = new_jd_row(input_row, idx, product_id_from_url(url), url, batch_time,
+                             status=entry['status'])
+            # crawl_time 用上次真正爬到这个结论的时间,一眼能看出是沿用的
+            row.update({'original_price': '-', 'promo_price': '-', 'crawl_time': entry['checked_at']})
+            emit(row, cached=True)
+        # 复查的行优先级最低:排在本次任务最后
+        work = sorted((w for w in work if w[0] not in cached), key=lambda w: w[0] in reprobe)
+        if cached or reprobe:
+            log('INFO', f'负缓存:{len(cached)} 条近期判过下架 / 不存在,沿用上次结论跳过'
+                        + (f';{len(reprobe)} 条到期复查,排在最后' if reprobe else ''))
+    round_no = 0
+    user_stopped = False
+    session_dead = False
+    # 一旦发现无法账号交替(只有 1 个可用账号),本次任务后续直接走冷却,
+    # 不再每批反复尝试 rotate(避免对登录过期的 profile 反复 close/launch 的无谓 churn)
+    single_account_mode = False
+    api_disabled = False  # 价格接口出现过异常:后续批次不再调用
+
+    while work:
+        # 自动分批:单批 batch_size 条,批次间冷却 batch_cooldown 秒(由爬取强度预设决定);
+        # 有 sizer 时每批开跑前按当前账号的历史重新定大小,总批数只是估计
+        total_batches = -(-len(work) // batch_size)
+        if round_no:
+            log('INFO', f'━━━ 第 {round_no} 轮自动重试: {len(work)} 条 ━━━')
+        elif total_batches > 1:
+            log('INFO',
+                f'自动分批({preset["label"]}强度): {total} 条 -> {total_batches} 批 '
+                f'(每批 {batch_size} 条{",按各账号历史自动调整" if sizer else ""}, '
+                f'批间冷却 {batch_cooldown//60} 分钟)')
+
+        pos = 0
+        batch_idx = 0
+        while pos < len(work):
+            if should_stop():
+                user_stopped = True
+                break
+
+            size = sizer.size_for(crawler.current_profile_id, preset) if sizer else batch_size
+            chunk = work[pos:pos + size]
+            pos += len(chunk)
+            batch_idx += 1
+            # 快速查询占掉名额的行会顺延,批数随之增加
+            total_batches = max(total_batches, batch_idx + -(-(len(work) - pos) // batch_size))
+            batch_label = f'第 {batch_idx} 批' if sizer else f'第 {batch_idx}/{total_batches} 批'
+            if total_batches > 1 or pos < len(work):
+                note = (f'(profile_{crawler.current_profile_id} 按历史 {size} 条/批)'
+                        if sizer and size != batch_size else '')
+                log('INFO', f'━━━ {batch_label}: {len(chunk)} 条{note} ━━━')
+            open_streak()
+            api_prices = {}
+            if price_api and not api_disabled:
+                api_prices, anomaly = _prefetch_api_prices(crawler, chunk, log)
+                if anomaly:
+                    # 接口异常(非 200 / 风控 / 结构不对)多半是这个登录账号被盯上了 —— 本次任务不再调,全走页面
+                    api_disabled = True
+                    log('WARNING', f'  价格接口异常({anomaly}),本次任务后续批次不再调用')
+
+            # 单批内的反爬冷却计数器重置(批与批独立)
+            consecutive_failures = 0
+            anti_crawl_cooldowns = 0
+            backoff_streak = 0  # 连续出现「退避」类软风控信号的条数
+            # 随机游走计数器:每 10-15 条插入一次"伪浏览"(访问首页/购物车),制造行为多样性
+            items_since_walk = 0
+            next_walk_at = random.randint(10, 15)
+            borrowed = 0  # 本批行间隙插队查的快速查询条数(占批名额)
+
+            for chunk_idx, (idx, input_row, attempts) in enumerate(chunk):
+                if should_stop():
+                    user_stopped = True
+                    break
+                if chunk_idx + borrowed >= len(chunk):
+                    # 插队的快速查询占掉了本批名额:剩下的行退回,留给下一批(换号 / 冷却之后)
+                    pos -= len(chunk) - chunk_idx
+                    break
+
+                # 接口已取到价:直接产出,不开页面、不停留、不占账号的页面节奏
+                api_hit = api_prices.get(product_id_from_url(str(input_row.get('url', ''))))
+                if api_hit:
+                    row = process_jd_row(crawler, input_row, idx, total, batch_time, log,
+                                         on_progress, prices=api_hit)
+                    settle(idx, input_row, attempts + 1, row)
+                    continue
+
+                # 行边界:context 内存 / 页面数超限就原 profile 重开,长会话内存保持平稳
+                reason = watchdog.check(crawler) if watchdog else None
+                if reason and not watchdog.recycle(crawler, reason, log):
+                    log('ERROR', '❌ 回收后浏览器没能重新启动,已中止本次采集')
+                    session_dead = True
+                    break
+
+                # 触发随机游走(在请求当前商品 *之前*,让 referer 看起来像从首页/购物车点进来)
+                if items_since_walk >= next_walk_at:
+                    try:
+                        label = crawler.random_walk()
+                        log('INFO', f'  ↪ 插入伪浏览: {label}(降低线性行为可疑度)')
+                    except Exception as e:
+                        log('WARNING', f'  ↪ 伪浏览失败(忽略): {e}')
+                    items_since_walk = 0
+                    next_walk_at = random.randint(10, 15)
+
+                # 单批内突发失败:先分清「浏览器会话已死(被关/崩溃)」还是「真·反爬」
+                if consecutive_failures >= 2:
+                    # 走 CDP 真探活。会话死了就如实中止,绝不误报成反爬去冷却重试。
+                    if not crawler.is_session_valid():
+                        log('ERROR', '❌ 浏览器会话异常停止(可能被外部关闭或崩溃),已中止本次采集')
+                        log('ERROR', '   这不是反爬。请点「重置浏览器会话」后重新开始。')
+                        session_dead = True
+                        break
+
+                    # 会话健康 → 判定为真·反爬,冷却
+                    anti_crawl_cooldowns += 1
+                    wait = min(30 + anti_crawl_cooldowns * 30, 120)
+                    log('WARNING', f'检测到反爬,冷却{wait}秒... (第{anti_crawl_cooldowns}次)')
+                    time.sleep(wait)
+                    consecutive_failures = 0
+
+                    # 冷却后先访问京东首页"重置"会话;若此时会话已死,同样如实中止
+                    try:
+                        log('INFO', '重置会话:访问京东首页...')
+                        crawler.driver.get("https://www.jd.com")
+                        time.sleep(random.uniform(3.0, 5.0))
+                        crawler.driver.execute_script("window.scrollTo(0, 500);")
+                        time.sleep(1)
+                        crawler.driver.execute_script("window.scrollTo(0, 0);")
+                        time.sleep(1)
+                    except Exception:
+                        if not crawler.is_session_valid():
+                            log('ERROR', '❌ 浏览器会话异常停止,已中止本次采集。请重置浏览器后重试')
+                            session_dead = True
+                            break
+
+                if prefetch and hasattr(crawler, 'queue_prefetch'):
+                    crawler.queue_prefetch(_next_page_pid(chunk, chunk_idx + 1, api_prices))
+                row = process_jd_row(crawler, input_row, idx, total, batch_time, log, on_progress)
+                if not row:
+                    continue
+                if snapshots and row['status'] in FAILURE_STATUSES:
+                    snap_path = snapshots.capture(crawler, row)
+                    if snap_path:
+                        log('INFO', f'  失败现场 → {os.path.relpath(snap_path)}')
+
+                settle(idx, input_row, attempts + 1, row)
+                items_since_walk += 1
+                status = row['status']
+                exhausted = False
+                # 本行的结论 + 行间隙借用当前账号查的快速查询(between_rows 返回其状态):
+                # 共用下面的失败计数 / 软风控 / 换号判断,查询也占本批一个名额,不给账号额外加量
+                while status:
+                    if status == 'success':
+                        consecutive_failures = 0
+                        anti_crawl_cooldowns = 0
+                    elif status in FAILURE_STATUSES:
+                        consecutive_failures += 1
+
+                    # 软风控前兆:导航响应里已经露出频控跳转 / 403 / 限速,不等连续失败就处理
+                    signals = getattr(crawler, 'last_signals', None) or ()
+
+                    # 账号批大小学习:首次被拦就结束这一段;页面正常加载(含下架/不存在)才算数
+                    if status in BLOCK_STATUSES or any(sig in ROTATE_SIGNALS for sig in signals):
+                        close_streak(True)
+                    elif streak['open'] and status not in ('failed', 'skipped'):
+                        streak['rows'] += 1
+                    early_rotate = any(sig in ROTATE_SIGNALS for sig in signals)
+                    if not early_rotate and any(sig in BACKOFF_SIGNALS for sig in signals):
+                        backoff_streak += 1
+                        if backoff_streak >= 2:
+                            early_rotate = True
+                        else:
+                            wait = random.uniform(20, 40)
+                            log('WARNING', f'  ⚠ 软风控前兆({", ".join(signals)}),退避 {wait:.0f} 秒')
+                            time.sleep(wait)
+                    elif not signals:
+                        backoff_streak = 0
+
+                    # 连续 3 次失败 / 软风控前兆 — 当前 profile 被风控,切换到下一个 profile 继续
+                    if consecutive_failures >= 3 or early_rotate:
+                        backoff_streak = 0
+                        reason = (f'软风控前兆({", ".join(signals)})' if early_rotate and consecutive_failures < 3
+                                  else '连续 3 次失败')
+                        log('WARNING',
+                            f'⚠ {reason} — 当前 profile_{crawler.current_profile_id} 可能被风控,'
+                            f'尝试切换到下一个 profile...')
+                        close_streak(True)  # 因风控被换下,也算这一段以被拦结束
+                        new_pid = crawler.switch_to_next_profile()
+                        if new_pid is None:
+                            # 所有 profile 耗尽 — 本批剩余记 skipped(同样进重试队列),进入下一批冷却
+                            remaining_rows = chunk[chunk_idx + 1:]
+                            log('ERROR',
+                                f'✗ profile 池已耗尽 — 跳过本批剩余 {len(remaining_rows)} 条(不计尝试次数,稍后重跑),'
+                                f'进入下一批冷却({batch_cooldown//60} 分钟后会重新从 profile_1 开始)')
+                            for sk_idx, sk_row, sk_attempts in remaining_rows:
+                                sk_url = str(sk_row.get('url', ''))
+                                skipped = new_jd_row(sk_row, sk_idx, product_id_from_url(sk_url),
+                                                     sk_url, batch_time, status='skipped')
+                                skipped.update({'original_price': '-', 'promo_price': '-'})
+                                settle(sk_idx, sk_row, sk_attempts, skipped, tried=False)
+                            # 重置 profile 池游标,下一批冷却完后重新从 profile_1 开始
+                            crawler.current_profile_id = None
+                            exhausted = True
+                            break
+
+                        # 切换成功 — 重置计数器,继续当前批
+                        log('INFO', f'✓ 已切到 profile_{new_pid},继续爬取')
+                        consecutive_failures = 0
+                        anti_crawl_cooldowns = 0
+                        open_streak()
+
+                    # 单条间延迟 — get_price_via_search 内部已有 10-15s 真实停留,
+                    # 这里只额外加少量间隔(2-4s)用于模拟"看完一个商品后切到下一个"的过渡
+                    time.sleep(random.uniform(2.0, 4.0))
+
+                    # 行间隙插队(快速查询):本批还有名额才借,计入伪浏览计数,查完同样走上面的判断和停留
+                    status = None
+                    if between_rows and chunk_idx + 1 + borrowed < len(chunk):
+                        status = between_rows()
+                        if status:
+                            borrowed += 1
+                            items_since_walk += 1
+                if exhausted:
+                    break  # 跳出 chunk,进入批次间冷却
+
+            close_streak(False)  # 这一段没被拦(批跑完 / 停止):只说明「至少能跑这么多」,供 sizer 放大
+            if session_dead or user_stopped:
+                break
+
+            if pos < len(work) and not should_stop():
+                ok, single_account_mode = between_batches(
+                    crawler, preset, batch_label, single_account_mode, log,
+                    cooldown, maintenance)
+                if not ok:
+                    user_stopped = True
+                    break
+
+        if session_dead or user_stopped or not deferred or should_stop():
+            break
+
+        # 下一轮重试:先换号(交替 / 池耗尽冷却),再等到最早一条的退避到期
+        ok, single_account_mode = between_batches(
+            crawler, preset, '本轮' if round_no else '主轮', single_account_mode, log,
+            cooldown, maintenance)
+        wait = min(d['ready_at'] for d in deferred.values()) - time.time()
+        if ok and wait > 0:
+            log('INFO', f'⏳ {len(deferred)} 条待重试,{wait:.0f} 秒后开始')
+            ok = cooldown(int(wait) + 1)
+        if not ok:
+            user_stopped = True
+            break
+        # 一轮带上 RETRY_BASE_DELAY 内即将到期的行:每条要跑十几秒,轮到它时退避也差不多到了,
+        # 不必为相差几秒的行各开一轮
+        horizon = time.time() + RETRY_BASE_DELAY
+        ready = [(idx, d) for idx, d in deferred.items() if d['ready_at'] <= horizon]
+        # 上次失败在别的账号上的行先跑(换号),其次按到期先后
+        ready.sort(key=lambda item: (item[1]['profile'] == crawler.current_profile_id,
+                                     item[1]['ready_at']))
+        work = [(idx, d['input_row'], d['attempts']) for idx, d in ready]
+        retried += len(work)
+        round_no += 1
+
+    # 停止 / 会话死亡 / 次数用尽:队列里剩下的行按最后一次结果产出
+    for idx in sorted(deferred):
+        emit(deferred[idx]['row'])
+    deferred.clear()
+
+    return dict(stats, total=emitted, stopped=user_stopped or session_dead,
+                session_dead=session_dead, retried=retried, cached=len(cached))
@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""京东价格爬虫 — asyncio 引擎(patchright.async_api).
+
+为什么要异步版:
+- 同步版每个 crawler 独占一条 OS 线程,而单个 SKU 的墙钟时间大部分是 time.sleep
+  (点击后等加载、分段滚动、停留 —— 模拟真人的 10-15s),线程全程空转.
+- 这里一个事件循环里同时跑 N 个 profile context(= N 个账号),每个账号是一个协程,
+  真人停留改成 asyncio.sleep,一个 Python 进程就能驱动整个账号池,开销只是一条线程.
+- 用户点「停止」时直接 cancel 所有账号协程:CancelledError 在下一个 await 点抛出,
+  确定性地停在 sleep/导航上,不必等当前商品的整段停留走完.
+
+页面判定(落地 URL 终态 / 下架关键字 / 五级价格选择器)与同步版共用
+jd_crawler_patchright 里的同一份实现,两套引擎结果语义完全一致.
+
+节奏按账号独立计算(与同步版批量一致):每账号跑 rows_per_profile 条后歇 cooldown 秒,
+每 10-15 条插一次伪浏览,连续 max_consecutive_failures 次失败即判定该账号被风控、退出轮换.
+"""
+import asyncio
+import random
+import re
+import time
+from typing import Callable, List, Optional
+
+from patchright.async_api import async_playwright, BrowserContext, Page
+
+import jd_profile_pool
+from jd_crawler_patchright import (
+    LAUNCH_ARGS, EXTRACT_PRICE_JS, INJECT_LINK_JS, BAD_START_MARKERS,
+    classify_landing_url, find_unavailable_keyword, prices_from_extract,
+)
+
+
+# 这些返回值算「失败」,计入账号连续失败数
+_FAILURE_VERDICTS = ('blocked', 'forbidden')
+# 停止 / 账号全部退出轮换时没跑完的行,以这个结果交给 on_result(记 skipped,可重试)
+SKIPPED_PRICES = {'original': 'skipped', 'promo': 'skipped', '_diag': '未处理'}
+
+
+def _product_id(row: dict) -> str:
+    m = re.search(r'/(\d+)\.html', str(row.get('url', '')))
+    return m.group(1) if m else ''
+
+
+class _ProfileSlot:
+    """一个账号(profile)在引擎里的运行态."""
+
+    def __init__(self, profile_id: int):
+        self.profile_id = profile_id
+        self.context: Optional[BrowserContext] = None
+        self.page: Optional[Page] = None
+        self.rows_done = 0
+        self.consecutive_failures = 0
+        self.retired = False
+        self.in_flight = None  # 已从队列取出、结果还没交给 on_result 的 (idx, row)
+
+
+class AsyncJDEngine:
+    """单事件循环驱动多个 profile context 的京东取价引擎."""
+
+    def __init__(self, profile_ids: Optional[List[int]] = None, headless: bool = False,
+                 rows_per_profile: int = 25, cooldown: int = 600,
+                 max_consecutive_failures: int = 3):
+        self.profile_ids = profile_ids or jd_profile_pool.list_available_profiles()
+        self.headless = headless
+        self.rows_per_profile = rows_per_profile
+        self.cooldown = cooldown
+        self.max_consecutive_failures = max_consecutive_failures
+        self._playwright = None
+        self.slots: List[_ProfileSlot] = []
+
+    # ============ 启停 ============
+
+    async def start(self) -> List[int]:
+        """并发启动所有 profile 并检测登录态,返回可用(已登录)的 profile id."""
+        if not self.profile_ids:
+            raise RuntimeError('JD profile 池为空,请先在网页「管理京东账号」里扫码新增')
+        self._playwright = await async_playwright().start()
+        slots = [_ProfileSlot(pid) for pid in self.profile_ids]
+        results = await asyncio.gather(*(self._launch(s) for s in slots),
+                                       return_exceptions=True)
+        for slot, res in zip(slots, results):
+            if res is True:
+                self.slots.append(slot)
+            else:
+                print(f"  [async] profile_{slot.profile_id} 不可用: {res or '未登录'}")
+                await self._close_slot(slot)
+        return [s.profile_id for s in self.slots]
+
+    async def _launch(self, slot: _ProfileSlot) -> bool:
+        t0 = time.time()
+        slot.context = await self._playwright.chromium.launch_persistent_context(
+            user_data_dir=jd_profile_pool.profile_dir(slot.profile_id),
+            headless=self.headless,
+            channel="chromium",
+            no_viewport=True,
+            args=LAUNCH_ARGS,
+        )
+        pages = slot.context.pages
+        slot.page = pages[0] if pages else await slot.context.new_page()
+        print(f"  [async] ✓ profile_{slot.profile_id} 已启动 ({time.time()-t0:.1f}秒)")
+        return await self._is_logged_in(slot)
+
+    async def _is_logged_in(self, slot: _ProfileSlot) -> bool:
+        """与同步版一致:用「我的京东」(非风控页)判定登录态."""
+        try:
+            await slot.page.goto("https://home.jd.com/", wait_until="domcontentloaded", timeout=15000)
+            await asyncio.sleep(1.5)
+            cur = (slot.page.url or '').lower()
+            title = await slot.page.title() or ''
+            return '登录' not in title and 'login' not in cur and 'passport' not in cur
+        except Exception as e:
+            print(f"  [async] profile_{slot.profile_id} 登录态检测失败: {e}")
+            return False
+
+    async def _close_slot(self, slot: _ProfileSlot):
+        if slot.context:
+            try:
+                await slot.context.close()
+            except Exception:
+                pass
+        slot.context = None
+        slot.page = None
+
+    async def close(self):
+        for slot in self.slots:
+            await self._close_slot(slot)
+        if self._playwright:
+            try:
+                await self._playwright.stop()
+            except Exception:
+                pass
+            self._playwright = None
+
+    # ============ 单账号动作 ============
+
+    async def _smooth_scroll(self, slot: _ProfileSlot, ratio: float):
+        try:
+            await slot.page.evaluate(
+                f"""() => {{
+                    const h = document.body.scrollHeight;
+                    window.scrollTo({{top: h * {ratio}, behavior: 'smooth'}});
+                }}"""
+            )
+        except Exception:
+            pass
+
+    async def warmup(self, slot: _ProfileSlot):
+        await slot.page.goto("https://www.jd.com", wait_until="domcontentloaded", timeout=15000)
+        await asyncio.sleep(random.uniform(3, 5))
+        for ratio in (0.3, 0.7, 0.0):
+            await self._smooth_scroll(slot, ratio)
+            await asyncio.sleep(random.uniform(1, 2))
+
+    async def random_walk(self, slot: _ProfileSlot) -> str:
+        label, target = random.choice([
+            ('首页', 'https://www.jd.com'),
+            ('购物车', 'https://cart.jd.com/cart_index/'),
+            ('我的京东', 'https://home.jd.com/'),
+        ])
+        try:
+            await slot.page.goto(target, wait_until="domcontentloaded", timeout=15000)
+            await asyncio.sleep(random.uniform(3.0, 5.0))
+            await self._smooth_scroll(slot, 0.4)
+            await asyncio.sleep(random.uniform(2.0, 3.5))
+            await self._smooth_scroll(slot, 0.0)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"  [async] 随机游走出错(忽略): {e}")
+        return label
+
+    async def _navigate_via_click(self, slot: _ProfileSlot, target_url: str, timeout_ms: int = 20000):
+        """同步版 _navigate_via_click 的异步等价:注入隐藏链接 + 真实鼠标点击."""
+        page = slot.page
+        current = (page.url or '').lower()
+        if any(s in current for s in BAD_START_MARKERS) or 'jd.com' not in current:
+            await page.goto('https://www.jd.com', wait_until='domcontentloaded', timeout=10000)
+            await asyncio.sleep(random.uniform(1.5, 2.5))
+        link_id = f"__cl_{int(time.time() * 1000) % 1000000}__"
+        try:
+            await page.evaluate(INJECT_LINK_JS, {"lid": link_id, "url": target_url})
+            async with page.expect_navigation(wait_until='domcontentloaded', timeout=timeout_ms):
+                await page.locator(f'#{link_id}').click(delay=random.randint(40, 120))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"  [async] ⚠️ 点击导航失败,回退 goto: {e}")
+            await page.goto(target_url, referer='https://www.jd.com/',
+                            wait_until='domcontentloaded', timeout=timeout_ms)
+
+    async def _terminal_result(self, slot: _ProfileSlot) -> Optional[dict]:
+        """落地 URL 终态 / 下架关键字 → 返回结构;仍是正常商品页返回 None."""
+        page = slot.page
+        current_url = page.url
+        verdict = classify_landing_url(current_url)
+        if verdict:
+            diag = f'url="{current_url[:90]}" profile_{slot.profile_id}'
+            return {'original': verdict, 'promo': verdict, '_diag': diag}
+        if find_unavailable_keyword(await page.content() or ''):
+            return {'original': 'unavailable', 'promo': 'unavailable'}
+        return None
+
+    async def get_price(self, slot: _ProfileSlot, product_id: str) -> Optional[dict]:
+        """与同步版 get_price_via_search 返回结构一致."""
+        page = slot.page
+        try:
+            await self._navigate_via_click(slot, f"https://item.jd.com/{product_id}.html")
+            # 快速失败:落地即终态(不存在 / 风控 / 下架)就不滚动停留,只留一点反应时间
+            early = await self._terminal_result(slot)
+            if early:
+                await asyncio.sleep(random.uniform(0.8, 1.8))
+                return early
+            await asyncio.sleep(random.uniform(2.0, 3.5))
+            steps = random.randint(4, 5)
+            for i in range(1, steps + 1):
+                await self._smooth_scroll(slot, i / steps)
+                await asyncio.sleep(random.uniform(1.2, 2.0))
+            await asyncio.sleep(random.uniform(2.0, 3.5))
+            await self._smooth_scroll(slot, random.uniform(0.3, 0.5))
+            await asyncio.sleep(random.uniform(0.8, 1.5))
+
+            terminal = await self._terminal_result(slot)
+            if terminal:
+                return terminal
+
+            await asyncio.sleep(1.0)
+            return prices_from_extract(await page.evaluate(EXTRACT_PRICE_JS))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"  [async] ✗ profile_{slot.profile_id} {product_id} 错误: {e}")
+            return None
+
+    # ============ 调度 ============
+
+    async def _worker(self, slot: _ProfileSlot, queue: 'asyncio.Queue', on_result: Callable):
+        try:
+            await self.warmup(slot)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"  [async] profile_{slot.profile_id} 热身失败,退出轮换: {e}")
+            slot.retired = True
+            return
+        next_walk_at = random.randint(10, 15)
+        since_walk = 0
+        while not slot.retired:
+            try:
+                idx, row = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            product_id = _product_id(row)
+            if not product_id:
+                # 解析不出商品 ID:不发请求,直接交回记失败;不算账号的失败、也不停留(同步引擎同样不计)
+                on_result(idx, row, product_id, None, slot.profile_id)
+                continue
+            slot.in_flight = (idx, row)  # 被 cancel 时由 run() 收尾记 skipped
+            if since_walk >= next_walk_at:
+                await self.random_walk(slot)
+                since_walk, next_walk_at = 0, random.randint(10, 15)
+
+            prices = await self.get_price(slot, product_id)
+            slot.in_flight = None
+            on_result(idx, row, product_id, prices, slot.profile_id)
+            slot.rows_done += 1
+            since_walk += 1
+
+            verdict = (prices or {}).get('original')
+            if prices is None or verdict in _FAILURE_VERDICTS:
+                slot.consecutive_failures += 1
+            elif verdict not in ('unavailable', 'not_found'):
+                slot.consecutive_failures = 0
+            if slot.consecutive_failures >= self.max_consecutive_failures:
+                print(f"  [async] ⚠ profile_{slot.profile_id} 连续 {slot.consecutive_failures} 次失败,退出轮换")
+                slot.retired = True
+                return
+
+            if slot.rows_done % self.rows_per_profile == 0 and not queue.empty():
+                print(f"  [async] profile_{slot.profile_id} 已跑 {slot.rows_done} 条,歇 {self.cooldown//60} 分钟")
+                await asyncio.sleep(self.cooldown)
+            else:
+                await asyncio.sleep(random.uniform(2.0, 4.0))
+
+    async def run(self, rows: List[dict], on_result: Callable,
+                  should_stop: Optional[Callable[[], bool]] = None) -> dict:
+        """把 rows 分发给各账号协程.on_result(idx, row, product_id, prices, profile_id)
+        在事件循环线程上同步回调(应快速返回).返回汇总 dict."""
+        queue: asyncio.Queue = asyncio.Queue()
+        for idx, row in enumerate(rows, 1):
+            queue.put_nowait((idx, row))
+        workers = [asyncio.create_task(self._worker(s, queue, on_result)) for s in self.slots]
+        stopped = False
+
+        async def _watch_stop():
+            while True:
+                await asyncio.sleep(0.5)
+                if should_stop and should_stop():
+                    return True
+
+        watcher = asyncio.create_task(_watch_stop())
+        done_all = asyncio.gather(*workers, return_exceptions=True)
+        finished, _ = await asyncio.wait({watcher, done_all}, return_when=asyncio.FIRST_COMPLETED)
+        if watcher in finished:
+            stopped = True
+            for w in workers:
+                w.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        else:
+            watcher.cancel()
+
+        # 没跑完的行(被 cancel 时在途的 + 队列里剩下的)逐条交给 on_result 记 skipped,
+        # 主文件 / 错误文件里都有它们,「重试失败项」能找到
+        leftovers = [(s.in_flight, s.profile_id) for s in self.slots if s.in_flight]
+        while not queue.empty():
+            leftovers.append((queue.get_nowait(), None))
+        emit_leftovers([(idx, row, pid) for (idx, row), pid in leftovers], on_result)
+        return {
+            'stopped': stopped,
+            'unprocessed': len(leftovers),
+            'retired': [s.profile_id for s in self.slots if s.retired],
+        }
+
+
+def emit_leftovers(leftovers: list, on_result: Callable):
+    """[(idx, row, profile_id)] 按行号顺序以 SKIPPED_PRICES 回调 on_result"""
+    for idx, row, profile_id in sorted(leftovers, key=lambda x: x[0]):
+        on_result(idx, row, _product_id(row), dict(SKIPPED_PRICES), profile_id)
+
+
+def run_rows(rows: List[dict], on_result: Callable,
+             should_stop: Optional[Callable[[], bool]] = None, **engine_kwargs) -> dict:
+    """同步入口(供 Flask 爬取线程 / CLI 调用):起一个事件循环跑完 rows 后关闭所有 context."""
+    async def _main():
+        engine = AsyncJDEngine(**engine_kwargs)
+        try:
+            usable = await engine.start()
+            if not usable:
+                emit_leftovers([(idx, row, None) for idx, row in enumerate(rows, 1)], on_result)
+                return {'stopped': False, 'unprocessed': len(rows), 'retired': [],
+                        'error': '没有已登录的 profile'}
+            print(f"  [async] {len(usable)} 个账号并发: {', '.join(f'profile_{p}' for p in usable)}")
+            return await engine.run(rows, on_result, should_stop)
+        finally:
+            await engine.close()
+    return asyncio.run(_main())
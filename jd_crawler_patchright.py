@@ -19,6 +19,7 @@ warnings.filterwarnings('ignore', message='urllib3 v2 only supports OpenSSL 1.1.
 
 import os
 import re
+import sys
 import time
 import random
 from typing import Optional, List
@@ -26,6 +27,7 @@ from typing import Optional, List
 from patchright.sync_api import sync_playwright, BrowserContext, Page
 
 import jd_profile_pool
+import browser_watchdog
 
 
 CDP_PORT = jd_profile_pool.CDP_PORT  # 兼容 app.py 旧 import,实际 patchright 不用 9222
@@ -46,11 +48,188 @@ def _profile_pool_empty_msg() -> str:
     )
 
 
+# ============ 同步 / 异步引擎共用的启动参数与页面判定 ============
+
+LAUNCH_ARGS = [
+    '--no-first-run',
+    '--no-default-browser-check',
+    '--disable-blink-features=AutomationControlled',
+    '--lang=zh-CN',
+]
+
+# 京东 2025/2026 新版商品页价格提取脚本(五级选择器 fallback):
+# - .product-price--value: 当前售价(促销价)
+# - .product-price--gray: 灰色划线原价
+# - 备用容器若干
+EXTRACT_PRICE_JS = r"""
+() => {
+    var result = {main: null, gray: null, fallback: null};
+
+    // 1. 主价格: product-price--value (当前售价/促销价)
+    var mainEl = document.querySelector('.product-price--value');
+    if (mainEl) {
+        var m = mainEl.textContent.trim().match(/([\.\d]+)/);
+        if (m) result.main = parseFloat(m[1]);
+    }
+
+    // 2. 灰色价格: product-price--gray (原价/日常价)
+    var grayEl = document.querySelector('.product-price--gray');
+    if (grayEl) {
+        var g = grayEl.textContent.trim().match(/[¥￥]\s*([\.\d]+)/);
+        if (g) result.gray = parseFloat(g[1]);
+    }
+
+    // 3. 备用: calculator-product-info 内的 product-price
+    if (!result.main) {
+        var calcEl = document.querySelector('.calculator-product-info .product-price');
+        if (calcEl) {
+            var c = calcEl.textContent.trim().match(/[¥￥]\s*([\.\d]+)/);
+            if (c) result.fallback = parseFloat(c[1]);
+        }
+    }
+
+    // 4. 再备用: 页面上第一个 product-price 容器
+    if (!result.main && !result.fallback) {
+        var ppEl = document.querySelector('.product-price');
+        if (ppEl) {
+            var p = ppEl.textContent.match(/[¥￥]\s*([\.\d]+)/);
+            if (p) result.fallback = parseFloat(p[1]);
+        }
+    }
+
+    // 5. 旧版兼容: .p-price .price
+    if (!result.main && !result.fallback) {
+        var oldEl = document.querySelector('.p-price .price');
+        if (oldEl) {
+            var o = oldEl.textContent.trim().match(/([\.\d]+)/);
+            if (o) result.fallback = parseFloat(o[1]);
+        }
+    }
+
+    return result;
+}
+"""
+
+# 点击导航用:注入一个不可见但可点击的 <a>,由真实鼠标 click 触发(user activation + link_clicked)
+INJECT_LINK_JS = """({lid, url, target}) => {
+    const old = document.getElementById(lid);
+    if (old) old.remove();
+    const a = document.createElement('a');
+    a.id = lid;
+    a.href = url;
+    if (target) a.target = target;
+    a.textContent = '\\u00A0';
+    a.style.cssText = 'position:fixed;top:80px;left:80px;width:40px;height:20px;z-index:2147483647;background:transparent;';
+    document.body.appendChild(a);
+}"""
+
+# 当前页若是这些(风控/403/空白),点击导航前先回首页拿干净起点
+BAD_START_MARKERS = ('reason=403', 'risk_handler', 'verify', 'about:blank')
+
+# 软风控前兆:导航响应链(含中间跳转)里出现这些 → 该账号已被盯上,下一条大概率失败
+SOFT_BLOCK_URL_MARKERS = (
+    ('pc-frequent-pro', 'frequent'),   # PC 频控页(pc-frequent-pro.pf.jd.com/?reason=403)
+    ('reason=403', 'frequent'),
+    ('risk_handler', 'risk_handler'),
+)
+SOFT_BLOCK_STATUSES = {403: 'http_403', 429: 'http_429'}
+# 商品页价格由这些接口异步拉取;落地正常却一个都没发 = 页面被降级(软封前兆)
+PRICE_API_MARKERS = ('wareBusiness', 'pc_detailpage', 'p.3.cn/prices')
+SLOW_NAV_SECONDS = 8.0  # 点击到 domcontentloaded 正常 1-3s,明显变慢常是被限速
+
+# 接口取价(get_prices_via_api):用已登录 context 的 request 直接调批量价格接口,
+# 一次最多 PRICE_API_BATCH 个 SKU;同一账号两次调用至少间隔 PRICE_API_MIN_INTERVAL 秒
+PRICE_API_URL = 'https://p.3.cn/prices/mgets'
+PRICE_API_BATCH = 20
+PRICE_API_MIN_INTERVAL = 1.5
+
+# 流水线预取(queue_prefetch):当前商品停留滚动到第 PREFETCH_AFTER_STEP 步时,
+# 像真人一样 Ctrl/⌘+点击 把下一个商品开在后台标签页,停留结束时它已加载完
+PREFETCH_AFTER_STEP = (1, 2)
+PREFETCH_MODIFIER = 'Meta' if sys.platform == 'darwin' else 'Control'
+
+UNAVAILABLE_KEYWORDS = (
+    "该商品已下柜", "商品已下架", "该商品已下架",
+    "抱歉，该商品已下柜", "欢迎挑选其他商品", "很抱歉，该商品已售馨或下架",
+)
+
+
+def classify_landing_url(current_url: str) -> Optional[str]:
+    """按商品页最终落地 URL 判定终态,返回 'blocked' / 'forbidden' / 'not_found',正常商品页返回 None."""
+    if "risk_handler" in current_url or "verify" in current_url.lower():
+        return 'blocked'
+    if "pc-frequent-pro" in current_url:  # PC 频控页(?reason=403)
+        return 'blocked'
+    if "error" in current_url.lower() and "403" in current_url:
+        return 'forbidden'
+    if current_url.startswith("https://www.jd.com/?") or current_url == "https://www.jd.com/":
+        if current_url == "https://www.jd.com/?d":
+            return 'not_found'
+        return 'blocked'
+    return None
+
+
+def find_unavailable_keyword(page_text: str) -> Optional[str]:
+    for keyword in UNAVAILABLE_KEYWORDS:
+        if keyword in page_text:
+            return keyword
+    return None
+
+
+def _record_response(probe: dict, page, response):
+    """把 page 主 frame 的文档响应(含 3xx 中间跳转)记进 probe['chain'],价格接口发出记 probe['price_api']."""
+    try:
+        url = response.url
+        if any(m in url for m in PRICE_API_MARKERS):
+            probe['price_api'] = True
+            return
+        req = response.request
+        if req.resource_type == 'document' and req.frame == page.main_frame:
+            probe['chain'].append((response.status, url))
+    except Exception:
+        pass
+
+
+def prices_from_extract(data: Optional[dict]) -> Optional[dict]:
+    """EXTRACT_PRICE_JS 的原始结果 → {'original', 'promo'};无有效价格返回 None.
+    灰色价高于当前价时视为「原价 + 促销价」,否则两者相同."""
+    if not data:
+        return None
+    main_price = data.get('main')
+    gray_price = data.get('gray')
+    current_price = main_price or data.get('fallback')
+    if current_price:
+        if gray_price and gray_price > current_price:
+            return {'original': gray_price, 'promo': current_price}
+        return {'original': current_price, 'promo': current_price}
+    if gray_price:
+        return {'original': gray_price, 'promo': gray_price}
+    return None
+
+
+def prices_from_api(entry: dict) -> Optional[dict]:
+    """价格接口的一条 {'id': 'J_123', 'p': 当前价, 'op': 原价, ...} → {'original', 'promo'};
+    p 缺失 / ≤0(接口对下架、无货、风控都回 -1)返回 None,交给页面渲染判终态."""
+    try:
+        promo = float(entry.get('p'))
+    except (TypeError, ValueError):
+        return None
+    if promo <= 0:
+        return None
+    try:
+        original = float(entry.get('op') or 0)
+    except (TypeError, ValueError):
+        original = 0
+    return {'original': original if original > promo else promo, 'promo': promo}
+
+
 class JDCrawlerViaSearch:
     """京东爬虫(patchright 版).类名沿用以兼容 app.py."""
 
-    def __init__(self, headless: bool = False, cookies_file: str = "jd_cookies.pkl"):
+    def __init__(self, headless: bool = False, cookies_file: str = "jd_cookies.pkl",
+                 profile_ids: Optional[List[int]] = None):
         # cookies_file 参数保留是为了兼容 app.py 调用,实际不用 — patchright 用 profile 目录管理
+        # profile_ids:只用池里的这几个 profile(profile_workers 每个子进程钉死一个),默认整个池
         self.headless = headless
         self.cookies_file = cookies_file
         self.is_logged_in = False
@@ -58,8 +237,19 @@ class JDCrawlerViaSearch:
         self._playwright = None
         self._context: Optional[BrowserContext] = None
         self._page: Optional[Page] = None
+        # 当前 context 启动以来打开过的页面数(browser_watchdog 据此 + RSS 决定何时回收)
+        self.pages_since_launch = 0
+        # 最近一次取价的软风控信号(jd_batch 据此提前换号 / 退避)与本次导航的响应记录
+        self.last_signals: List[str] = []
+        self._nav_probe = {'chain': [], 'price_api': False, 'nav_seconds': None}
+        self._api_last_call = 0.0
+        # 流水线预取:调度器排好的下一个商品 ID;已开出去的后台标签页 {'pid','page','probe','listener'}
+        self._prefetch_pid: Optional[str] = None
+        self._prefetch: Optional[dict] = None
         # profile 池状态
         self.available_profiles = jd_profile_pool.list_available_profiles()
+        if profile_ids is not None:
+            self.available_profiles = [p for p in self.available_profiles if p in profile_ids]
         self.current_profile_id: Optional[int] = None
         if not self.available_profiles:
             raise RuntimeError(_profile_pool_empty_msg())
@@ -88,22 +278,20 @@ class JDCrawlerViaSearch:
             # patchright 推荐的 stealth 设置:
             channel="chromium",  # 用 patchright 自带的 Chromium for Testing
             no_viewport=True,
-            args=[
-                '--no-first-run',
-                '--no-default-browser-check',
-                '--disable-blink-features=AutomationControlled',
-                '--lang=zh-CN',
-            ],
+            args=LAUNCH_ARGS,
         )
 
         # 用 context 自带的 page(或新建一个)
         pages = self._context.pages
         self._page = pages[0] if pages else self._context.new_page()
+        self._page.on('response', self._on_response)
         self.current_profile_id = profile_id
+        self.pages_since_launch = 0
         print(f"  [patchright] ✓ profile_{profile_id} 已启动 ({time.time()-t0:.1f}秒)")
 
     def _close_context(self):
         """关闭当前 context(profile),保留 playwright 进程."""
+        self._discard_prefetch()
         if self._page:
             try:
                 self._page.close()
@@ -214,6 +402,7 @@ class JDCrawlerViaSearch:
             ('我的京东', 'https://home.jd.com/'),
         ]
         label, target = random.choice(candidates)
+        self.pages_since_launch += 1
         try:
             self._page.goto(target, wait_until="domcontentloaded", timeout=15000)
             time.sleep(random.uniform(3.0, 5.0))
@@ -232,8 +421,7 @@ class JDCrawlerViaSearch:
         绕过 page.goto() 直接程序化导航被 JD 累积检测的问题."""
         # 当前页若是风控/403/空白,先回首页拿个干净起点
         current = (self._page.url or '').lower()
-        bad = ('reason=403', 'risk_handler', 'verify', 'about:blank')
-        if any(s in current for s in bad) or 'jd.com' not in current:
+        if any(s in current for s in BAD_START_MARKERS) or 'jd.com' not in current:
             self._page.goto('https://www.jd.com',
                             wait_until='domcontentloaded', timeout=10000)
             time.sleep(random.uniform(1.5, 2.5))
@@ -241,19 +429,7 @@ class JDCrawlerViaSearch:
         # 注入一个不可见但可点击的链接
         link_id = f"__cl_{int(time.time() * 1000) % 1000000}__"
         try:
-            self._page.evaluate(
-                """({lid, url}) => {
-                    const old = document.getElementById(lid);
-                    if (old) old.remove();
-                    const a = document.createElement('a');
-                    a.id = lid;
-                    a.href = url;
-                    a.textContent = '\\u00A0';
-                    a.style.cssText = 'position:fixed;top:80px;left:80px;width:40px;height:20px;z-index:2147483647;background:transparent;';
-                    document.body.appendChild(a);
-                }""",
-                {"lid": link_id, "url": target_url},
-            )
+            self._page.evaluate(INJECT_LINK_JS, {"lid": link_id, "url": target_url})
         except Exception as e:
             print(f"  ⚠️ 注入链接失败,回退 goto: {e}")
             self._page.goto(target_url, referer='https://www.jd.com/',
@@ -271,70 +447,201 @@ class JDCrawlerViaSearch:
             self._page.goto(target_url, referer='https://www.jd.com/',
                             wait_until='domcontentloaded', timeout=timeout_ms)
 
+    def _on_response(self, response):
+        """记录主 frame 的文档响应链(含 3xx 中间跳转)和价格接口是否发出."""
+        _record_response(self._nav_probe, self._page, response)
+
+    # ============ 流水线预取(后台标签页) ============
+
+    def queue_prefetch(self, product_id: Optional[str]):
+        """告诉爬虫下一条要取的商品:本条停留期间把它开在同一 context 的后台标签页.
+        传 None 取消.下一次 get_price_via_search 正好是它时直接切过去,省掉导航等待."""
+        self._prefetch_pid = str(product_id) if product_id else None
+
+    def _start_prefetch(self):
+        """在当前商品页上 Ctrl/⌘+点击下一个商品的链接 → 后台新标签页加载(带 referer + user activation).
+        链接带 target=_blank,修饰键不生效也只会开新标签页,不会把当前页导航走.
+        只发起导航不等加载,当前页的滚动停留照常进行."""
+        pid, self._prefetch_pid = self._prefetch_pid, None
+        if not pid or self._prefetch is not None or self._context is None:
+            return
+        current = (self._page.url or '').lower()
+        if any(s in current for s in BAD_START_MARKERS) or 'jd.com' not in current:
+            return
+        link_id = f"__pf_{int(time.time() * 1000) % 1000000}__"
+        probe = {'chain': [], 'price_api': False, 'nav_seconds': None}
+        try:
+            self._page.evaluate(INJECT_LINK_JS, {"lid": link_id, "url": f"https://item.jd.com/{pid}.html",
+                                                 "target": "_blank"})
+            with self._context.expect_page(timeout=5000) as info:
+                self._page.locator(f'#{link_id}').click(
+                    modifiers=[PREFETCH_MODIFIER], delay=random.randint(40, 120))
+            page = info.value
+        except Exception as e:
+            print(f"  ⚠️ 预取 {pid} 未能打开后台标签页(忽略): {e}")
+            return
+        listener = lambda response: _record_response(probe, page, response)
+        page.on('response', listener)
+        self._prefetch = {'pid': pid, 'page': page, 'probe': probe, 'listener': listener}
+        print(f"  ⇢ 后台标签页预取 {pid}")
+
+    def _take_prefetch(self, product_id: str) -> bool:
+        """预取的正是 product_id → 切到那个标签页、关掉旧页,沿用它的响应链;否则丢弃预取."""
+        pf = self._prefetch
+        if pf is None:
+            return False
+        if pf['pid'] != str(product_id):
+            self._discard_prefetch()
+            return False
+        self._prefetch = None
+        page, old = pf['page'], self._page
+        try:
+            page.bring_to_front()
+            page.wait_for_load_state('domcontentloaded', timeout=20000)
+            # 后台加载用了多久(导航开始 → DOMContentLoaded),供 'slow' 软风控信号判断
+            ms = page.evaluate("() => { const t = performance.timing;"
+                               " return t.domContentLoadedEventEnd - t.navigationStart; }")
+            if ms and ms > 0:
+                pf['probe']['nav_seconds'] = ms / 1000
+        except Exception as e:
+            print(f"  ⚠️ 预取标签页不可用,改为点击导航: {e}")
+            try:
+                page.close()
+            except Exception:
+                pass
+            return False
+        page.remove_listener('response', pf['listener'])
+        page.on('response', self._on_response)
+        self._page = page
+        self._nav_probe = pf['probe']
+        try:
+            old.close()
+        except Exception:
+            pass
+        return True
+
+    def _discard_prefetch(self):
+        """关掉没用上的预取标签页(换号 / 重启 / 下一条不是它)."""
+        pf, self._prefetch = self._prefetch, None
+        if pf is not None:
+            try:
+                pf['page'].close()
+            except Exception:
+                pass
+
+    def _soft_block_signals(self, prices: Optional[dict]) -> List[str]:
+        probe = self._nav_probe
+        urls = [u.lower() for _, u in probe['chain']] + [(self._page.url or '').lower()]
+        signals = []
+        for marker, signal_name in SOFT_BLOCK_URL_MARKERS:
+            if signal_name not in signals and any(marker in u for u in urls):
+                signals.append(signal_name)
+        for status, _ in probe['chain']:
+            name = SOFT_BLOCK_STATUSES.get(status)
+            if name and name not in signals:
+                signals.append(name)
+        if probe['nav_seconds'] is not None and probe['nav_seconds'] > SLOW_NAV_SECONDS:
+            signals.append('slow')
+        if prices is None and not probe['price_api'] and not signals:
+            signals.append('no_price_api')
+        return signals
+
     def get_price_via_search(self, product_id: str) -> Optional[dict]:
-        """访问商品页提取价格."""
+        """访问商品页提取价格;顺带把导航响应链里的软风控信号记到 self.last_signals."""
+        self._nav_probe = {'chain': [], 'price_api': False, 'nav_seconds': None}
+        prices = self._get_price(product_id)
+        try:
+            self.last_signals = self._soft_block_signals(prices) if self.is_logged_in else []
+        except Exception:
+            self.last_signals = []
+        if self.last_signals:
+            print(f"  ⚠️ 软风控信号: {', '.join(self.last_signals)}")
+        return prices
+
+    def get_prices_via_api(self, product_ids: List[str]) -> tuple:
+        """不开页面,用当前 context 的 request(与页面共享 cookie / UA / 代理)调批量价格接口.
+        返回 ({product_id: {'original','promo'}}, anomaly):只含接口给出有效价格的 SKU;
+        anomaly 非空(非 200、非 JSON、结构不对、请求异常)时本次后续批次不再调用,
+        没拿到价的 SKU 由调用方照常走 get_price_via_search."""
+        if not self.is_logged_in or not self._context:
+            return {}, 'not_logged_in'
+        ids = [str(p) for p in product_ids if str(p).isdigit()]
+        found = {}
+        for i in range(0, len(ids), PRICE_API_BATCH):
+            part = ids[i:i + PRICE_API_BATCH]
+            wait = self._api_last_call + PRICE_API_MIN_INTERVAL - time.time()
+            if wait > 0:
+                time.sleep(wait)
+            try:
+                resp = self._context.request.get(
+                    PRICE_API_URL,
+                    params={'skuIds': ','.join(f'J_{p}' for p in part), 'type': '1',
+                            'source': 'item-pc'},
+                    headers={'Referer': 'https://item.jd.com/'},
+                    timeout=10000)
+                self._api_last_call = time.time()
+                if resp.status != 200:
+                    return found, f'http_{resp.status}'
+                data = resp.json()
+            except Exception as e:
+                self._api_last_call = time.time()
+                return found, f'error: {str(e)[:80]}'
+            if not isinstance(data, list):
+                return found, f'unexpected: {str(data)[:80]}'
+            for entry in data:
+                pid = str((entry or {}).get('id', '')).replace('J_', '')
+                prices = prices_from_api(entry or {})
+                if pid in part and prices:
+                    found[pid] = prices
+        return found, ''
+
+    def _get_price(self, product_id: str) -> Optional[dict]:
         if not self.is_logged_in:
             print("  ✗ 未登录")
             return None
 
         product_url = f"https://item.jd.com/{product_id}.html"
+        self.pages_since_launch += 1
 
         try:
-            print(f"  访问商品页 {product_id}...")
-            self._navigate_via_click(product_url, timeout_ms=20000)
+            prefetched = self._take_prefetch(product_id)
+            if prefetched:
+                print(f"  切到预取标签页 {product_id}...")
+            else:
+                print(f"  访问商品页 {product_id}...")
+                t0 = time.time()
+                self._navigate_via_click(product_url, timeout_ms=20000)
+                self._nav_probe['nav_seconds'] = time.time() - t0
+
+            # 快速失败:跳转链 / 落地页已是终态(不存在、风控、403、下架),不必再滚动停留 ~15s
+            verdict = self._redirect_verdict(product_id)
+            if verdict is None and find_unavailable_keyword(self._page_text()):
+                verdict = 'unavailable'
+            if verdict:
+                time.sleep(random.uniform(0.8, 1.8))  # 只留一点真人反应时间
+                return self._verdict_result(verdict, self._page.url)
 
             # 模拟真人浏览:等加载 → 平滑滚动到底 → 停留 → 滚回中部
-            time.sleep(random.uniform(2.0, 3.5))
+            # (预取的页已在后台加载完,只留切标签页后的一点反应时间)
+            time.sleep(random.uniform(0.6, 1.2) if prefetched else random.uniform(2.0, 3.5))
             steps = random.randint(4, 5)
+            prefetch_at = random.randint(*PREFETCH_AFTER_STEP)
             for i in range(1, steps + 1):
                 self._smooth_scroll(i / steps)
                 time.sleep(random.uniform(1.2, 2.0))
+                if i == prefetch_at and self._prefetch_pid:
+                    self._start_prefetch()
             time.sleep(random.uniform(2.0, 3.5))
             self._smooth_scroll(random.uniform(0.3, 0.5))
             time.sleep(random.uniform(0.8, 1.5))
 
+            # 停留期间仍可能被 JS 跳走:落地 URL / 下架关键字再判一次
             current_url = self._page.url
-
-            def _diag():
-                try:
-                    src_len = len(self._page.content() or '')
-                except Exception:
-                    src_len = -1
-                try:
-                    title = (self._page.title() or '')[:50]
-                except Exception:
-                    title = '?'
-                return f'url="{current_url[:90]}" title="{title}" src_len={src_len}'
-
-            # 风控判定
-            if "risk_handler" in current_url or "verify" in current_url.lower():
-                print(f"  ⚠️ 触发反爬验证页 | {_diag()}")
-                return {'original': 'blocked', 'promo': 'blocked', '_diag': _diag()}
-
-            if "error" in current_url.lower() and "403" in current_url:
-                print(f"  ⚠️ 403 错误 | {_diag()}")
-                return {'original': 'forbidden', 'promo': 'forbidden', '_diag': _diag()}
-
-            if current_url.startswith("https://www.jd.com/?") or current_url == "https://www.jd.com/":
-                if current_url == "https://www.jd.com/?d":
-                    print(f"  ✗ 商品不存在")
-                    return {'original': 'not_found', 'promo': 'not_found'}
-                print(f"  ⚠️ 被重定向到首页 | {_diag()}")
-                return {'original': 'blocked', 'promo': 'blocked', '_diag': _diag()}
-
-            # 检查下架
-            try:
-                page_text = self._page.content()
-            except Exception:
-                page_text = ''
-            unavailable_keywords = [
-                "该商品已下柜", "商品已下架", "该商品已下架",
-                "抱歉，该商品已下柜", "欢迎挑选其他商品", "很抱歉，该商品已售馨或下架",
-            ]
-            for keyword in unavailable_keywords:
-                if keyword in page_text:
-                    print(f"  ⚠️ 商品已下架")
-                    return {'original': 'unavailable', 'promo': 'unavailable'}
+            verdict = classify_landing_url(current_url)
+            if verdict is None and find_unavailable_keyword(self._page_text()):
+                verdict = 'unavailable'
+            if verdict:
+                return self._verdict_result(verdict, current_url)
 
             # 提取价格
             return self._extract_price()
@@ -343,92 +650,57 @@ class JDCrawlerViaSearch:
             print(f"  ✗ 错误: {e}")
             return None
 
+    def _page_text(self) -> str:
+        try:
+            return self._page.content() or ''
+        except Exception:
+            return ''
+
+    def _redirect_verdict(self, product_id: str) -> Optional[str]:
+        """导航刚结束时按响应链判终态:从商品页那一跳起,任何一跳被 classify_landing_url 判中
+        (或商品页本身 403)即返回;链上商品页之前的跳转(如先回首页拿干净起点)不算."""
+        chain = self._nav_probe['chain']
+        start = next((i for i, (_, url) in enumerate(chain) if f'/{product_id}.html' in url), len(chain))
+        for status, url in chain[start:]:
+            if status == 403:
+                return 'forbidden'
+            verdict = classify_landing_url(url)
+            if verdict:
+                return verdict
+        return classify_landing_url(self._page.url or '')
+
+    def _verdict_result(self, verdict: str, current_url: str) -> dict:
+        """终态 → get_price_via_search 的返回结构(风控类带诊断信息)."""
+        if verdict == 'not_found':
+            print(f"  ✗ 商品不存在")
+            return {'original': 'not_found', 'promo': 'not_found'}
+        if verdict == 'unavailable':
+            print(f"  ⚠️ 商品已下架")
+            return {'original': 'unavailable', 'promo': 'unavailable'}
+        try:
+            title = (self._page.title() or '')[:50]
+        except Exception:
+            title = '?'
+        diag = f'url="{current_url[:90]}" title="{title}" src_len={len(self._page_text()) or -1}'
+        if verdict == 'forbidden':
+            print(f"  ⚠️ 403 错误 | {diag}")
+        else:
+            print(f"  ⚠️ 触发反爬验证页 / 被重定向到首页 | {diag}")
+        return {'original': verdict, 'promo': verdict, '_diag': diag}
+
     def _extract_price(self) -> Optional[dict]:
-        """从商品页提取价格 — 完整移植 selenium 老版的多选择器逻辑.
-        京东 2025/2026 新版页面:
-        - .product-price--value: 当前售价(促销价)
-        - .product-price--gray: 灰色划线原价
-        - 备用容器若干
-        """
+        """从商品页提取价格 — 完整移植 selenium 老版的多选择器逻辑(见 EXTRACT_PRICE_JS)."""
         try:
             time.sleep(1.0)
-            prices = {'original': None, 'promo': None}
-
-            js_script = r"""
-            () => {
-                var result = {main: null, gray: null, fallback: null};
-
-                // 1. 主价格: product-price--value (当前售价/促销价)
-                var mainEl = document.querySelector('.product-price--value');
-                if (mainEl) {
-                    var m = mainEl.textContent.trim().match(/([\.\d]+)/);
-                    if (m) result.main = parseFloat(m[1]);
-                }
-
-                // 2. 灰色价格: product-price--gray (原价/日常价)
-                var grayEl = document.querySelector('.product-price--gray');
-                if (grayEl) {
-                    var g = grayEl.textContent.trim().match(/[¥￥]\s*([\.\d]+)/);
-                    if (g) result.gray = parseFloat(g[1]);
-                }
-
-                // 3. 备用: calculator-product-info 内的 product-price
-                if (!result.main) {
-                    var calcEl = document.querySelector('.calculator-product-info .product-price');
-                    if (calcEl) {
-                        var c = calcEl.textContent.trim().match(/[¥￥]\s*([\.\d]+)/);
-                        if (c) result.fallback = parseFloat(c[1]);
-                    }
-                }
-
-                // 4. 再备用: 页面上第一个 product-price 容器
-                if (!result.main && !result.fallback) {
-                    var ppEl = document.querySelector('.product-price');
-                    if (ppEl) {
-                        var p = ppEl.textContent.match(/[¥￥]\s*([\.\d]+)/);
-                        if (p) result.fallback = parseFloat(p[1]);
-                    }
-                }
-
-                // 5. 旧版兼容: .p-price .price
-                if (!result.main && !result.fallback) {
-                    var oldEl = document.querySelector('.p-price .price');
-                    if (oldEl) {
-                        var o = oldEl.textContent.trim().match(/([\.\d]+)/);
-                        if (o) result.fallback = parseFloat(o[1]);
-                    }
-                }
-
-                return result;
-            }
-            """
-            data = self._page.evaluate(js_script)
+            data = self._page.evaluate(EXTRACT_PRICE_JS)
             if not data:
                 print("  未找到价格元素")
                 return None
 
-            main_price = data.get('main')
-            gray_price = data.get('gray')
-            fallback_price = data.get('fallback')
-
-            print(f"  价格数据: 主价={main_price}, 灰色={gray_price}, 备用={fallback_price}")
-
-            current_price = main_price or fallback_price
-
-            if current_price:
-                if gray_price and gray_price > current_price:
-                    prices['original'] = gray_price
-                    prices['promo'] = current_price
-                    print(f"  ✓ 原价: ¥{gray_price}, 当前价: ¥{current_price}")
-                else:
-                    prices['original'] = current_price
-                    prices['promo'] = current_price
-                    print(f"  ✓ 价格: ¥{current_price} (无促销)")
-                return prices
-            elif gray_price:
-                prices['original'] = gray_price
-                prices['promo'] = gray_price
-                print(f"  ✓ 仅灰色价格: ¥{gray_price}")
+            print(f"  价格数据: 主价={data.get('main')}, 灰色={data.get('gray')}, 备用={data.get('fallback')}")
+            prices = prices_from_extract(data)
+            if prices:
+                print(f"  ✓ 原价: ¥{prices['original']}, 当前价: ¥{prices['promo']}")
                 return prices
 
             print("  未找到有效价格")
@@ -440,6 +712,33 @@ class JDCrawlerViaSearch:
             traceback.print_exc()
             return None
 
+    def failure_snapshot(self) -> Optional[dict]:
+        """失败现场(failure_snapshots 落盘):当前页 MHTML(CDP 取不到退回 HTML)、视口截图、
+        本次导航的响应链和软风控信号.只取原始数据,压缩 / 写盘在后台线程."""
+        if self._page is None:
+            return None
+        probe = self._nav_probe
+        snap = {'url': self._page.url, 'title': '', 'chain': list(probe['chain']),
+                'signals': list(self.last_signals), 'nav_seconds': probe['nav_seconds'],
+                'price_api': probe['price_api'], 'profile_id': self.current_profile_id}
+        try:
+            snap['title'] = self._page.title() or ''
+        except Exception:
+            pass
+        try:
+            cdp = self._context.new_cdp_session(self._page)
+            try:
+                snap['mhtml'] = cdp.send('Page.captureSnapshot', {'format': 'mhtml'})['data']
+            finally:
+                cdp.detach()
+        except Exception:
+            snap['html'] = self._page_text()
+        try:
+            snap['screenshot'] = self._page.screenshot(type='jpeg', quality=60, timeout=5000)
+        except Exception:
+            pass
+        return snap
+
     # ============ Session 管理 ============
 
     def is_session_valid(self) -> bool:
@@ -455,6 +754,12 @@ class JDCrawlerViaSearch:
         except Exception:
             return False
 
+    def context_rss_mb(self) -> Optional[float]:
+        """当前 profile 的 chromium 进程树总内存(MB),取不到返回 None."""
+        if self.current_profile_id is None:
+            return None
+        return browser_watchdog.user_data_dir_rss_mb(jd_profile_pool.profile_dir(self.current_profile_id))
+
     def restart_browser(self) -> bool:
         """重启当前 profile 的 chromium."""
         print("\n  ⚠️ 重启 chromium...")
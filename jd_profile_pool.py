@@ -9,9 +9,11 @@
 """
 import os
 import re
+import json
 import time
 import socket
 import signal
+import threading
 import subprocess
 from typing import List, Optional
 
@@ -24,6 +26,24 @@ CHROME_PATH = "/Applications/Google Chrome.app/Contents/MacOS/Google Chrome"
 
 SIDECAR = '.jd_account.json'
 
+_PROFILE_RE = re.compile(r'^profile_(\d+)(\.cooldown)?$')
+
+# 账号池清单(内存缓存):id → {'id','cooldown','path','sidecar'}.
+# POOL_DIR 的 mtime 变了(新建 / 改名冷却 / 移除)就整表重扫;旁车写在 profile 子目录里、
+# 不改 POOL_DIR 的 mtime,所以写旁车的一方(profile_provision)要调 invalidate_inventory().
+# 健康数据(最近验证结果、目录体积等)单独存 _health,不随重扫丢失.
+_inventory_lock = threading.Lock()
+_inventory = {'mtime': None, 'profiles': {}}
+_health = {}
+
+
+def _read_sidecar_file(path: str) -> dict:
+    try:
+        with open(os.path.join(path, SIDECAR), encoding='utf-8') as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
 
 def has_login_sidecar(path: str) -> bool:
     """profile 目录里有带昵称的旁车 = 真正扫码登录过.
@@ -32,26 +52,70 @@ def has_login_sidecar(path: str) -> bool:
     Default,所以一个被取消/失败/移除后残留的空 profile 也会有 Default,会被误判
     成「已登录」。旁车 .jd_account.json 只在扫码/验证成功时写入,是唯一可靠信号.
     """
+    return bool(_read_sidecar_file(path).get('nickname'))
+
+
+def _pool_mtime():
     try:
-        import json
-        with open(os.path.join(path, SIDECAR), encoding='utf-8') as f:
-            return bool(json.load(f).get('nickname'))
-    except Exception:
-        return False
+        return os.stat(POOL_DIR).st_mtime_ns
+    except OSError:
+        return None
 
 
-def list_available_profiles() -> List[int]:
-    """扫描 pool 目录,返回所有已登录的 profile id(按 ID 排序)."""
+def _scan_pool() -> dict:
+    profiles = {}
     if not os.path.isdir(POOL_DIR):
-        return []
-    ids = []
+        return profiles
     for name in os.listdir(POOL_DIR):
-        m = re.match(r'^profile_(\d+)$', name)
-        if m:
-            path = os.path.join(POOL_DIR, name)
-            if os.path.isdir(path) and has_login_sidecar(path):  # 真正登录过才算"已准备"
-                ids.append(int(m.group(1)))
-    return sorted(ids)
+        m = _PROFILE_RE.match(name)
+        if not m:
+            continue
+        path = os.path.join(POOL_DIR, name)
+        if not os.path.isdir(path):
+            continue
+        pid = int(m.group(1))
+        if pid in profiles and not profiles[pid]['cooldown']:
+            continue  # profile_N 与 profile_N.cooldown 同时存在时以正常名为准
+        profiles[pid] = {'id': pid, 'cooldown': bool(m.group(2)), 'path': path,
+                         'sidecar': _read_sidecar_file(path)}
+    return profiles
+
+
+def inventory() -> dict:
+    """id → 清单条目(只读视图,勿修改).只 stat 一次 POOL_DIR,没变化就不碰磁盘."""
+    mtime = _pool_mtime()
+    with _inventory_lock:
+        if mtime is None or mtime != _inventory['mtime']:
+            _inventory['profiles'] = _scan_pool()
+            _inventory['mtime'] = mtime
+        return _inventory['profiles']
+
+
+def invalidate_inventory() -> None:
+    """写旁车 / 改名后调用,下次查询重扫."""
+    with _inventory_lock:
+        _inventory['mtime'] = None
+
+
+def get_profile(profile_id: int) -> Optional[dict]:
+    return inventory().get(profile_id)
+
+
+def record_health(profile_id: int, **fields) -> None:
+    """记一笔健康数据(如 state='ok' / 'expired'、checked_at、size_mb),随清单一起返回."""
+    with _inventory_lock:
+        _health.setdefault(profile_id, {}).update(fields)
+
+
+def profile_health(profile_id: int) -> dict:
+    with _inventory_lock:
+        return dict(_health.get(profile_id, {}))
+
+
+def list_available_profiles() -> List[int]:
+    """返回所有已登录、未冷却的 profile id(按 ID 排序)."""
+    return sorted(pid for pid, p in inventory().items()
+                  if not p['cooldown'] and p['sidecar'].get('nickname'))  # 真正登录过才算"已准备"
 
 
 def profile_dir(profile_id: int) -> str:
@@ -1,467 +1,262 @@
 #!/usr/bin/env python3
 """
-京东价格批量爬取工具
-支持原价和促销价双价格提取
-使用搜索方式绕过反爬检测
-"""
-import warnings
-# 抑制 urllib3 的 OpenSSL 警告
-warnings.filterwarnings('ignore', message='urllib3 v2 only supports OpenSSL 1.1.1+')
+京东价格批量爬取 —— 命令行版(非交互,适合 cron / shell 管道)
 
-import pandas as pd
-from datetime import datetime
-import time
-import random
-import os
-import re
-from jd_crawler_via_search import JDCrawlerViaSearch
+与 Web 端共用同一套行解析、分批调度(jd_batch)和 patchright 引擎(JDCrawlerViaSearch),
+账号池同样取自 jd_chrome_profile_pool/(需先在 Web 端「账号管理」扫码登录).
 
+用法:
+    python3 main_batch.py "Product URL List.xlsx"                     # JSONL 逐行输出到 stdout
+    python3 main_batch.py list.xlsx -o prices.csv --format csv --speed fast
+    python3 main_batch.py list.xlsx --engine async | jq -c 'select(.status=="success")'
+    python3 main_batch.py list.xlsx --check-pool                       # 先并发验证账号池再跑
 
-def main():
-    """主函数"""
-    print("=" * 70)
-    print("京东价格批量爬取工具 - 双价格版本")
-    print("=" * 70)
-
-    # 文件路径
-    input_file = "Product URL List.xlsx"
-    output_file = "Price Marks.xlsx"
-    sheet_name = "JD Top Model by Brand"
-
-    # 检查输入文件
-    if not os.path.exists(input_file):
-        print(f"✗ 找不到文件: {input_file}")
-        return
+结果每完成一条就写出并 flush;日志(含 crawler 内部 print)一律走 stderr,不污染 stdout.
+退出码: 0 全部拿到终态 / 1 有可重试的失败项 / 2 启动失败或浏览器会话中止 / 130 被信号中止
+"""
+import os
+import sys
+import csv
+import json
+import time
+import signal
+import argparse
+from datetime import datetime
 
-    # 读取URL列表
-    print(f"\n正在读取 {input_file}...")
-    try:
-        df_urls = pd.read_excel(input_file, sheet_name=sheet_name)
-        print(f"✓ 成功读取 {len(df_urls)} 条记录")
-    except Exception as e:
-        print(f"✗ 读取Excel失败: {str(e)}")
-        return
-
-    # 获取URL列表
-    if 'URL' not in df_urls.columns:
-        print("✗ 未找到'URL'列")
-        return
-
-    urls = df_urls['URL'].dropna().tolist()
-    print(f"  找到 {len(urls)} 个有效URL")
-
-    # 询问用户运行模式
-    print("\n" + "-" * 70)
-    mode = input("选择运行模式:\n  1. 测试模式（只爬取前3个URL）\n  2. 小批量模式（爬取前10个URL）\n  3. 完整模式（爬取全部URL）\n请输入 1、2 或 3: ").strip()
-
-    if mode == "1":
-        urls = urls[:3]
-        print(f"\n✓ 测试模式：将爬取前3个URL")
-    elif mode == "2":
-        urls = urls[:10]
-        print(f"\n✓ 小批量模式：将爬取前10个URL")
-    else:
-        print(f"\n✓ 完整模式：将爬取全部{len(urls)}个URL")
-        confirm = input(f"这将花费约 {len(urls) * 5 / 60:.0f}-{len(urls) * 10 / 60:.0f} 分钟，确认继续？(y/n): ").strip().lower()
-        if confirm != 'y':
-            print("已取消")
+import jd_batch
+
+EXIT_OK = 0
+EXIT_RETRYABLE = 1
+EXIT_ABORTED = 2
+EXIT_INTERRUPTED = 130
+
+
+class ResultWriter:
+    """逐行写出结果:jsonl 写完整结果行,csv 用与 Excel 主文件相同的表头"""
+
+    def __init__(self, stream, fmt):
+        self.stream = stream
+        self.fmt = fmt
+        self._csv = None
+        self.counts = {}
+
+    def write(self, row):
+        self.counts[row['status']] = self.counts.get(row['status'], 0) + 1
+        if self.fmt == 'csv':
+            out = jd_batch.jd_excel_row(row)
+            if self._csv is None:
+                self._csv = csv.DictWriter(self.stream, fieldnames=list(out.keys()))
+                self._csv.writeheader()
+            self._csv.writerow(out)
+        else:
+            self.stream.write(json.dumps(row, ensure_ascii=False) + '\n')
+        self.stream.flush()
+
+
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='京东价格批量爬取(命令行,非交互)')
+    parser.add_argument('input', help='商品清单 Excel(与 Web 上传格式相同)')
+    parser.add_argument('-o', '--output', default='-', help='结果输出文件,默认 - 即 stdout')
+    parser.add_argument('--format', choices=('jsonl', 'csv'), default=None,
+                        help='输出格式;默认按 -o 的扩展名推断,stdout 为 jsonl')
+    parser.add_argument('--speed', choices=sorted(jd_batch.JD_SPEED_PRESETS), default='regular',
+                        help='爬取强度(每批条数),同 Web 端')
+    parser.add_argument('--engine', choices=('sync', 'async', 'process'), default='sync',
+                        help='sync = 单浏览器账号交替;async = 整个账号池并发;'
+                             'process = 每个账号一个子进程(崩溃自动重启)')
+    parser.add_argument('--headless', action='store_true', help='无窗口运行(京东对无头浏览器更敏感)')
+    parser.add_argument('--max-attempts', type=int, default=jd_batch.MAX_ROW_ATTEMPTS,
+                        help='失败行在本次运行内最多尝试几次(换号 + 指数退避;1 = 不自动重试,仅 sync 引擎)')
+    parser.add_argument('--price-api', action='store_true',
+                        help='每批先用已登录浏览器调批量价格接口,取到价的商品不开页面(仅 sync 引擎)')
+    parser.add_argument('--prefetch', action='store_true',
+                        help='流水线:停留当前商品时在后台标签页预先打开下一个商品(仅 sync 引擎)')
+    parser.add_argument('--no-snapshots', action='store_true',
+                        help='失败行不保存页面 / 截图 / 响应链快照(默认保存到 snapshots/,仅 sync 引擎)')
+    parser.add_argument('--recheck-dead', action='store_true',
+                        help='不用负缓存:近期判过下架 / 不存在的商品也重新爬(仅 sync 引擎)')
+    parser.add_argument('--check-pool', action='store_true',
+                        help='开跑前并发无头验证全部账号的登录态,没有可用账号就直接退出')
+    parser.add_argument('--limit', type=int, default=0, help='只跑前 N 条(0 = 全部)')
+    parser.add_argument('-q', '--quiet', action='store_true', help='只输出 WARNING/ERROR 日志')
+    args = parser.parse_args(argv)
+    if args.format is None:
+        args.format = 'csv' if args.output.lower().endswith('.csv') else 'jsonl'
+    return args
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+    result_stream = sys.stdout
+    # crawler 内部大量 print —— 全部改道 stderr,stdout 只留结果
+    sys.stdout = sys.stderr
+
+    def log(level, message):
+        if args.quiet and level == 'INFO':
             return
-
-    print("\n" + "-" * 70)
-
-    # 初始化爬虫（有窗口模式，方便观察）
-    print("\n初始化浏览器...")
-    crawler = JDCrawlerViaSearch(headless=False)
+        print(f'{datetime.now().strftime("%H:%M:%S")} [{level}] {message}', file=sys.stderr, flush=True)
+
+    stop = {'signal': None}
+
+    def on_signal(signum, _frame):
+        if stop['signal'] is None:
+            log('WARNING', f'收到信号 {signum},处理完当前商品后停止(再按一次强制退出)')
+            stop['signal'] = signum
+        else:
+            raise KeyboardInterrupt
+
+    signal.signal(signal.SIGINT, on_signal)
+    signal.signal(signal.SIGTERM, on_signal)
+
+    if not os.path.exists(args.input):
+        log('ERROR', f'找不到文件: {args.input}')
+        return EXIT_ABORTED
+
+    import jd_profile_pool
+    if not jd_profile_pool.list_available_profiles():
+        log('ERROR', 'JD profile 池为空 —— 先启动 Web 端在「账号管理」里扫码登录至少一个账号')
+        return EXIT_ABORTED
+    if args.check_pool:
+        import profile_provision
+        report, err = profile_provision.verify_pool()
+        if report is None:
+            log('ERROR', err)
+            return EXIT_ABORTED
+        log('INFO' if report['rotation_ready'] else 'WARNING',
+            f'账号池检查:{profile_provision.describe_pool_report(report)}')
+        if not report['ready']:
+            log('ERROR', '没有登录有效的账号 —— 先在 Web 端重新扫码')
+            return EXIT_ABORTED
+
+    rows = jd_batch.parse_jd_excel(args.input)
+    if args.limit > 0:
+        rows = rows[:args.limit]
+    if not rows:
+        log('ERROR', f'{args.input} 中没有可爬取的行(需要 URL 或 Product Key 列)')
+        return EXIT_ABORTED
+
+    out_file = None
+    if args.output != '-':
+        out_file = open(args.output, 'w', encoding='utf-8-sig' if args.format == 'csv' else 'utf-8',
+                        newline='')
+    writer = ResultWriter(out_file or result_stream, args.format)
+    preset = jd_batch.speed_preset(args.speed)
+    should_stop = lambda: stop['signal'] is not None
+    start_time = time.time()
+    log('INFO', f'开始爬取 {len(rows)} 条({preset["label"]}强度, {args.engine} 引擎)')
 
     try:
-        # 登录（会自动处理 cookies 失效的情况）
-        crawler.login()
-
-        if not crawler.is_logged_in:
-            print("\n✗ 登录失败")
-            return
-
-        print("✓ 登录成功！")
-
-        # 记录批次开始时间
-        batch_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        batch_start_timestamp = time.time()
-
-        # 开始爬取
-        results = []
-        success_count = 0
-        failed_count = 0
-        unavailable_count = 0  # 已下架的商品
-        total_item_time = 0  # 累计处理时间
-
-        print("\n" + "=" * 70)
-        print("开始爬取价格")
-        print("=" * 70 + "\n")
-
-        for idx, url in enumerate(urls, 1):
-            item_start_time = time.time()
-            print(f"[{idx}/{len(urls)}] {url}")
-
-            # 定期重启浏览器（每50个商品），避免内存泄漏
-            if idx > 1 and (idx - 1) % 50 == 0:
-                print(f"\n  🔄 已完成 {idx-1} 个商品，重启浏览器释放内存...\n")
-                crawler.restart_browser()
-                time.sleep(1.5)  # 优化后：3s → 2s → 1.5s
-
-            # 提取商品ID
-            match = re.search(r'/(\d+)\.html', url)
-            if not match:
-                print(f"  ✗ 无法提取商品ID\n")
-                crawl_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                results.append({
-                    'Batch Time': batch_time,
-                    'Crawl Time': crawl_time,
-                    'URL': url,
-                    'Price': 'N/A',
-                    'Promotion Price': 'N/A'
-                })
-                failed_count += 1
-                continue
-
-            product_id = match.group(1)
-
-            # 获取价格（带重试机制）
-            max_retries = 2
-            retry_count = 0
-            prices = None
-
-            while retry_count <= max_retries:
-                try:
-                    # 检查会话是否有效
-                    if not crawler.is_session_valid():
-                        print(f"  ⚠️  会话失效，尝试重启浏览器...")
-                        if not crawler.restart_browser():
-                            print(f"  ✗ 浏览器重启失败")
-                            break
-                        time.sleep(1.0)  # 优化后：2s → 1.5s → 1s
-
-                    prices = crawler.get_price_via_search(product_id)
-                    break  # 成功则退出重试循环
-
-                except Exception as e:
-                    error_msg = str(e)
-                    if "invalid session id" in error_msg.lower():
-                        retry_count += 1
-                        if retry_count <= max_retries:
-                            print(f"  ⚠️  会话失效，第 {retry_count} 次重试...")
-                            if crawler.restart_browser():
-                                time.sleep(1.0)  # 优化后：2s → 1.5s → 1s
-                                continue
-                            else:
-                                print(f"  ✗ 浏览器重启失败")
-                                break
-                        else:
-                            print(f"  ✗ 重试 {max_retries} 次后仍失败")
-                            break
-                    else:
-                        # 其他错误直接抛出
-                        raise
-
-            # 处理结果
-            try:
-
-                if prices:
-                    original = prices.get('original')
-                    promo = prices.get('promo')
-
-                    # 检查商品是否下架
-                    if original == 'unavailable' and promo == 'unavailable':
-                        print(f"  ⚠️  商品已下架")
-                        crawl_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                        results.append({
-                            'Batch Time': batch_time,
-                            'Crawl Time': crawl_time,
-                            'URL': url,
-                            'Price': 'Unavailable',
-                            'Promotion Price': 'Unavailable'
-                        })
-                        unavailable_count += 1
-                        continue
-
-                    # 检查商品是否不存在（真实无法访问）
-                    if original == 'not_found' and promo == 'not_found':
-                        print(f"  ⚠️  商品不存在")
-                        crawl_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                        results.append({
-                            'Batch Time': batch_time,
-                            'Crawl Time': crawl_time,
-                            'URL': url,
-                            'Price': 'Not Found',
-                            'Promotion Price': 'Not Found'
-                        })
-                        unavailable_count += 1
-                        continue
-
-                    # 检查是否触发反爬验证（可重试）
-                    if original == 'blocked' and promo == 'blocked':
-                        print(f"  ⚠️  触发反爬验证 (建议重试)")
-                        crawl_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                        results.append({
-                            'Batch Time': batch_time,
-                            'Crawl Time': crawl_time,
-                            'URL': url,
-                            'Price': 'Blocked (Retry)',
-                            'Promotion Price': 'Blocked (Retry)'
-                        })
-                        failed_count += 1
-                        continue
-
-                    # 检查是否403禁止访问（反爬拦截，可重试）
-                    if original == 'forbidden' and promo == 'forbidden':
-                        print(f"  ⚠️  403禁止访问 (建议重试)")
-                        crawl_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                        results.append({
-                            'Batch Time': batch_time,
-                            'Crawl Time': crawl_time,
-                            'URL': url,
-                            'Price': 'Forbidden (Retry)',
-                            'Promotion Price': 'Forbidden (Retry)'
-                        })
-                        failed_count += 1
-                        continue
-
-                    # 安全检查：确保至少有一个价格，且两个字段都有值
-                    # 商品一定有常规价格，可能没有促销价
-                    if original and promo:
-                        # 最理想的情况：两个价格都有
-                        print(f"  ✓ 原价: ¥{original}, 促销价: ¥{promo}")
-                        success_count += 1
-                    elif original and not promo:
-                        # 只有原价，说明无促销，两个字段写相同价格
-                        print(f"  ✓ 原价: ¥{original} (无促销)")
-                        promo = original
-                        success_count += 1
-                    elif promo and not original:
-                        # 只找到促销价，实际上这应该是常规价格
-                        print(f"  ✓ 价格: ¥{promo} (作为原价和促销价)")
-                        original = promo
-                        success_count += 1
-                    else:
-                        print(f"  ✗ 未找到价格 (可重试)")
-                        failed_count += 1
-
-                    # 保存结果（现在 original 和 promo 要么都有值，要么都是 None）
-                    crawl_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    results.append({
-                        'Batch Time': batch_time,
-                        'Crawl Time': crawl_time,
-                        'URL': url,
-                        'Price': original if original else 'N/A (Retry)',
-                        'Promotion Price': promo if promo else 'N/A (Retry)'
-                    })
-                else:
-                    print(f"  ✗ 获取失败 (可重试)")
-                    failed_count += 1
-                    crawl_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    results.append({
-                        'Batch Time': batch_time,
-                        'Crawl Time': crawl_time,
-                        'URL': url,
-                        'Price': 'N/A (Retry)',
-                        'Promotion Price': 'N/A (Retry)'
-                    })
-
-            except Exception as e:
-                print(f"  ✗ 错误: {e} (可重试)")
-                failed_count += 1
-                crawl_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                results.append({
-                    'Batch Time': batch_time,
-                    'Crawl Time': crawl_time,
-                    'URL': url,
-                    'Price': 'N/A (Retry)',
-                    'Promotion Price': 'N/A (Retry)'
-                })
-
-            # 计算和显示时间信息
-            item_elapsed = time.time() - item_start_time
-            total_item_time += item_elapsed
-            avg_time_per_item = total_item_time / idx
-            remaining_items = len(urls) - idx
-            estimated_remaining_time = avg_time_per_item * remaining_items
-
-            print(f"  ⏱️  本商品用时: {item_elapsed:.1f}秒 | 平均: {avg_time_per_item:.1f}秒/商品", end="")
-            if remaining_items > 0:
-                minutes = int(estimated_remaining_time // 60)
-                seconds = int(estimated_remaining_time % 60)
-                print(f" | 预计剩余: {minutes}分{seconds}秒")
-            else:
-                print()
-
-            # 添加延迟
-            if idx < len(urls):
-                delay = random.uniform(1.5, 2.5)  # 优化后：3-5s → 2-3s → 1.5-2.5s
-                print(f"  等待 {delay:.1f} 秒...\n")
-                time.sleep(delay)
-
-        # 显示统计
-        total_elapsed = time.time() - batch_start_timestamp
-        total_minutes = int(total_elapsed // 60)
-        total_seconds = int(total_elapsed % 60)
-
-        print("\n" + "=" * 70)
-        print("爬取完成！")
-        print("=" * 70)
-        print(f"  成功: {success_count}")
-        print(f"  已下架: {unavailable_count}")
-        print(f"  失败: {failed_count}")
-        print(f"  总计: {len(urls)}")
-        if len(urls) > 0:
-            print(f"  成功率: {success_count/len(urls)*100:.1f}%")
-            if unavailable_count > 0:
-                print(f"  下架率: {unavailable_count/len(urls)*100:.1f}%")
-        print(f"\n  ⏱️  总用时: {total_minutes}分{total_seconds}秒")
-        if len(urls) > 0:
-            avg_per_item = total_elapsed / len(urls)
-            print(f"  平均: {avg_per_item:.1f}秒/商品")
-
-        # 保存结果
-        print(f"\n正在保存结果到 {output_file}...")
-
-        try:
-            from openpyxl import load_workbook
-            from openpyxl.utils.dataframe import dataframe_to_rows
-
-            # 创建新数据
-            df_new = pd.DataFrame(results)
-
-            if os.path.exists(output_file):
-                # 文件存在，追加数据（保留 Excel Table 格式）
-                print(f"  检测到现有文件，追加新数据...")
-
-                # 加载现有工作簿
-                wb = load_workbook(output_file)
-
-                # 获取 Marks sheet
-                if 'Marks' in wb.sheetnames:
-                    ws = wb['Marks']
-
-                    # 检查是否需要迁移旧格式（Runtime → Batch Time + Crawl Time）
-                    header_row = [cell.value for cell in ws[1]]
-
-                    if 'Runtime' in header_row and 'Batch Time' not in header_row:
-                        print(f"  检测到旧格式 (Runtime 列)，自动迁移...")
-
-                        # 找到 Runtime 列的位置
-                        runtime_col_idx = header_row.index('Runtime') + 1  # openpyxl 从1开始
-
-                        # 1. 将 "Runtime" 改为 "Batch Time"
-                        ws.cell(row=1, column=runtime_col_idx, value='Batch Time')
-                        print(f"    ✓ 'Runtime' → 'Batch Time'")
-
-                        # 2. 在 Batch Time 右边插入新列 "Crawl Time"
-                        ws.insert_cols(runtime_col_idx + 1)
-                        ws.cell(row=1, column=runtime_col_idx + 1, value='Crawl Time')
-                        print(f"    ✓ 插入 'Crawl Time' 列")
-
-                        # 3. 复制 Batch Time 的值到 Crawl Time（旧数据没有分开记录）
-                        for row_idx in range(2, ws.max_row + 1):
-                            batch_time_value = ws.cell(row=row_idx, column=runtime_col_idx).value
-                            ws.cell(row=row_idx, column=runtime_col_idx + 1, value=batch_time_value)
-                        print(f"    ✓ 已填充 {ws.max_row - 1} 行数据的 Crawl Time")
-
-                        # 4. 如果有 Table，更新其范围（多了一列）
-                        if ws.tables:
-                            table_name = list(ws.tables.keys())[0]
-                            table = ws.tables[table_name]
-                            # 获取新的列数
-                            from openpyxl.utils import get_column_letter
-                            new_col_count = len(header_row) + 1  # 多了一列
-                            new_ref = f"A1:{get_column_letter(new_col_count)}{ws.max_row}"
-                            table.ref = new_ref
-                            print(f"    ✓ 更新 Table 范围: {new_ref}")
-
-                        # 5. 保存迁移后的文件
-                        wb.save(output_file)
-                        print(f"  ✓ 列格式迁移完成！")
-
-                        # 重新加载工作簿（确保后续操作使用更新后的结构）
-                        wb = load_workbook(output_file)
-                        ws = wb['Marks']
-
-                    # 找到表格（如果存在）
-                    table = None
-                    if ws.tables:
-                        table_name = list(ws.tables.keys())[0]
-                        table = ws.tables[table_name]
-                        print(f"  发现 Excel Table: {table_name}")
-
-                    # 找到最后一行
-                    last_row = ws.max_row
-
-                    # 读取现有数据行数
-                    existing_count = last_row - 1  # 减去表头
-
-                    # 追加新数据（从最后一行的下一行开始）
-                    for r_idx, row in enumerate(dataframe_to_rows(df_new, index=False, header=False), start=last_row + 1):
-                        for c_idx, value in enumerate(row, start=1):
-                            ws.cell(row=r_idx, column=c_idx, value=value)
-
-                    # 如果有 Table，扩展其范围
-                    if table:
-                        # 计算新的表格范围
-                        new_last_row = last_row + len(df_new)
-                        # 获取列数
-                        num_cols = len(df_new.columns)
-                        # 更新表格范围
-                        from openpyxl.utils import get_column_letter
-                        new_ref = f"A1:{get_column_letter(num_cols)}{new_last_row}"
-                        table.ref = new_ref
-                        print(f"  已扩展 Table 范围到: {new_ref}")
-
-                    # 保存
-                    wb.save(output_file)
-                    print(f"✓ 成功追加 {len(df_new)} 条新记录")
-                    print(f"  总记录数: {existing_count + len(df_new)}")
-
-                else:
-                    # Sheet 不存在，创建新的
-                    df_new.to_excel(output_file, sheet_name='Marks', index=False)
-                    print(f"✓ 创建新表格，保存 {len(df_new)} 条记录")
-
-            else:
-                # 文件不存在，创建新文件
-                df_new.to_excel(output_file, sheet_name='Marks', index=False)
-                print(f"✓ 创建新文件，保存 {len(df_new)} 条记录")
-
-            # 显示Excel列格式
-            print("\nExcel 列格式:")
-            print("  1. Batch Time - 批次开始时间")
-            print("  2. Crawl Time - 商品爬取完成时间")
-            print("  3. URL - 商品链接")
-            print("  4. Price - 原价")
-            print("  5. Promotion Price - 促销价")
-
-        except Exception as e:
-            print(f"✗ 保存失败: {str(e)}")
-            # 保存到备份文件
-            backup_file = f"Price_Marks_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-            try:
-                df_new.to_excel(backup_file, index=False)
-                print(f"  已保存到备份文件: {backup_file}")
-            except:
-                pass
-
-        print("\n" + "=" * 70)
-        print("程序结束")
-        print("=" * 70)
-
+        if args.engine in ('async', 'process'):
+            summary = _run_pool(args.engine, rows, preset, writer, log, should_stop, args.headless)
+        else:
+            summary = _run_sync(rows, preset, writer, log, should_stop, args.headless,
+                                args.max_attempts, not args.recheck_dead, args.price_api,
+                                args.prefetch, not args.no_snapshots)
     except KeyboardInterrupt:
-        print("\n\n程序被用户中断")
-    except Exception as e:
-        print(f"\n\n发生错误: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        summary = {'stopped': True, 'error': '强制中止'}
     finally:
-        print("\n正在关闭浏览器...")
-        crawler.close()
-        print("✓ 已关闭")
+        if out_file:
+            out_file.close()
+
+    counts = writer.counts
+    retryable = sum(counts.get(s, 0) for s in jd_batch.RETRYABLE_STATUSES)
+    done = sum(counts.values())
+    log('WARNING' if retryable or summary.get('error') else 'INFO',
+        f'完成 {done}/{len(rows)} 条 | '
+        + ', '.join(f'{k}: {v}' for k, v in sorted(counts.items()))
+        + f' | 用时 {time.time() - start_time:.0f}s')
+
+    if summary.get('error'):
+        log('ERROR', summary['error'])
+    if stop['signal'] is not None or (summary.get('stopped') and not summary.get('session_dead')):
+        return EXIT_INTERRUPTED
+    if summary.get('error') or summary.get('session_dead'):
+        return EXIT_ABORTED
+    if retryable or done < len(rows):
+        return EXIT_RETRYABLE
+    return EXIT_OK
+
+
+def _interruptible_sleep(seconds, should_stop, log):
+    log('INFO', f'⏳ 批次间冷却 {seconds // 60} 分钟...')
+    end = time.time() + seconds
+    while time.time() < end:
+        if should_stop():
+            return False
+        time.sleep(min(5, max(0.1, end - time.time())))
+    return True
+
+
+def _run_sync(rows, preset, writer, log, should_stop, headless, max_attempts, use_dead_cache,
+              price_api, prefetch, use_snapshots):
+    from jd_crawler_patchright import JDCrawlerViaSearch
+    from browser_watchdog import ContextWatchdog
+    import profile_provision
+    import failure_snapshots
+    crawler = JDCrawlerViaSearch(headless=headless)
+    snapshots = failure_snapshots.SnapshotStore() if use_snapshots else None
+    try:
+        # 非交互:未登录直接报错,不等扫码
+        crawler.login(auto_login=False)
+        if not crawler.is_logged_in:
+            return {'error': f'profile_{crawler.current_profile_id} 未登录京东,请先在 Web 端扫码'}
+        warmup_ok, warmup_err = crawler.warmup()
+        if not warmup_ok or not crawler.is_session_valid():
+            return {'error': f'热身失败,浏览器会话已失效: {warmup_err}'}
+        return jd_batch.run_jd_batch(
+            crawler, rows, preset, writer.write,
+            log=log,
+            should_stop=should_stop,
+            cooldown=lambda seconds: _interruptible_sleep(seconds, should_stop, log),
+            watchdog=ContextWatchdog(),
+            maintenance=lambda: profile_provision.compact_pool(log=log, should_stop=should_stop),
+            max_attempts=max(1, max_attempts),
+            sizer=jd_batch.AccountBatchSizer(),
+            dead_cache=jd_batch.DeadSkuCache() if use_dead_cache else None,
+            price_api=price_api,
+            prefetch=prefetch,
+            snapshots=snapshots,
+        )
+    finally:
+        try:
+            crawler.close()
+        except Exception:
+            pass
+        if snapshots:
+            snapshots.close()  # 等后台把排队的快照写完
 
 
-if __name__ == "__main__":
-    main()
+def _run_pool(engine, rows, preset, writer, log, should_stop, headless):
+    if engine == 'process':
+        from profile_workers import run_rows
+    else:
+        from jd_crawler_async import run_rows
+    batch_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    total = len(rows)
+
+    def on_result(idx, input_row, product_id, prices, profile_id):
+        url = str(input_row.get('url', ''))
+        if not product_id:
+            log('WARNING', f'[{idx}/{total}] Cannot extract product ID: {url}')
+            return
+        who = f'profile_{profile_id}' if profile_id else '未分配'  # 收尾记 skipped 的行可能没账号
+        log('INFO', f'[{idx}/{total}] {who}: {input_row.get("item") or product_id}')
+        writer.write(jd_batch.apply_jd_prices(
+            jd_batch.new_jd_row(input_row, idx, product_id, url, batch_time),
+            prices, who, log))
+
+    summary = run_rows(rows, on_result, should_stop=should_stop, headless=headless,
+                       rows_per_profile=preset['batch_size'], cooldown=preset['cooldown'])
+    if summary.get('restarts'):
+        log('WARNING', '自动重启过的账号 worker: '
+            + ', '.join(f'profile_{p} ×{n}' for p, n in summary['restarts'].items()))
+    if summary.get('retired'):
+        log('WARNING', '被风控退出轮换的账号: ' + ', '.join(f'profile_{p}' for p in summary['retired']))
+    if summary.get('unprocessed'):
+        log('WARNING', f'{summary["unprocessed"]} 条未处理'
+                       f'({summary.get("reason") or "停止或账号全部退出轮换"}),已记 skipped')
+    return summary
+
+
+if __name__ == '__main__':
+    sys.exit(main())
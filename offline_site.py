@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""离线替身站点 + 替身 crawler —— 不碰京东、不开浏览器,用来在本机验证批量调度 / 分布式协调.
+
+站点(标准库 http.server):
+    python3 offline_site.py --port 5090 --block-rate 0.05
+    GET /price/<product_id>   → {"original": "...", "promo": "..."}(按 ID 哈希出稳定价格)
+    GET /health               → {"ok": true}
+    product_id 尾号 0 = 下架(unavailable),尾号 9 = 不存在(not_found),
+    另按 --block-rate 随机返回 blocked,模拟风控.
+
+替身 crawler:OfflineCrawler(base_url) 实现 jd_batch.run_jd_batch 用到的
+JDCrawlerViaSearch 接口(登录/热身/取价/游走/切 profile/探活),价格改为请求上面的站点.
+    python3 crawl_worker.py http://127.0.0.1:5002 --offline http://127.0.0.1:5090
+"""
+import json
+import time
+import random
+import hashlib
+import argparse
+import urllib.request
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+# ==================== 站点 ====================
+
+def offline_price(product_id: str) -> dict:
+    """按 ID 哈希出稳定的「原价 / 促销价」,同一 ID 每次一样,便于核对合并结果."""
+    if product_id.endswith('0'):
+        return {'original': 'unavailable', 'promo': None}
+    if product_id.endswith('9'):
+        return {'original': 'not_found', 'promo': None}
+    h = int(hashlib.md5(product_id.encode()).hexdigest()[:8], 16)
+    original = 99 + h % 9000
+    promo = original - (h // 9000) % max(1, original // 5)
+    return {'original': f'{original:.2f}', 'promo': f'{promo:.2f}'}
+
+
+def make_handler(block_rate: float = 0.0, latency: float = 0.0):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, code, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == '/health':
+                return self._send(200, {'ok': True})
+            if self.path.startswith('/price/'):
+                pid = self.path[len('/price/'):].strip('/')
+                if not pid.isdigit():
+                    return self._send(404, {'error': 'bad product id'})
+                if latency:
+                    time.sleep(random.uniform(latency * 0.5, latency * 1.5))
+                if random.random() < block_rate:
+                    return self._send(200, {'original': 'blocked', 'promo': None,
+                                            '_diag': 'offline block'})
+                return self._send(200, offline_price(pid))
+            self._send(404, {'error': 'not found'})
+
+        def log_message(self, fmt, *args):
+            pass  # 安静:worker 多时逐请求日志没意义
+
+    return Handler
+
+
+def serve(host: str = '127.0.0.1', port: int = 5090, block_rate: float = 0.0,
+          latency: float = 0.0) -> ThreadingHTTPServer:
+    """创建站点 server;调用方 serve_forever()(阻塞)或放进后台线程."""
+    return ThreadingHTTPServer((host, port), make_handler(block_rate, latency))
+
+
+# ==================== 替身 crawler ====================
+
+class _OfflineDriver:
+    """对应 JDCrawlerViaSearch.driver(_DriverShim)—— 调度器冷却后会 get 首页 / 滚动."""
+
+    current_url = 'offline://home'
+    title = 'offline'
+
+    def get(self, url):
+        self.current_url = url
+
+    def execute_script(self, script):
+        return None
+
+
+class OfflineCrawler:
+    """JDCrawlerViaSearch 的离线替身:同样的方法名和返回约定,价格取自 offline_site."""
+
+    def __init__(self, base_url: str, profile_ids=(1, 2, 3), timeout: float = 10):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.available_profiles = list(profile_ids)
+        self.current_profile_id = self.available_profiles[0]
+        self.is_logged_in = False
+        self.driver = _OfflineDriver()
+
+    def _get(self, path):
+        with urllib.request.urlopen(self.base_url + path, timeout=self.timeout) as resp:
+            return json.loads(resp.read().decode('utf-8'))
+
+    def login(self, auto_login: bool = True):
+        self.is_logged_in = self.is_session_valid()
+
+    def warmup(self):
+        return (True, None) if self.is_session_valid() else (False, f'{self.base_url} 无响应')
+
+    def is_session_valid(self) -> bool:
+        try:
+            return bool(self._get('/health').get('ok'))
+        except Exception:
+            return False
+
+    def get_price_via_search(self, product_id: str):
+        try:
+            return self._get(f'/price/{product_id}')
+        except Exception:
+            return None
+
+    def random_walk(self) -> str:
+        return 'offline'
+
+    def _next_profile(self):
+        if self.current_profile_id not in self.available_profiles:
+            return None
+        i = self.available_profiles.index(self.current_profile_id)
+        if i + 1 >= len(self.available_profiles):
+            return None
+        self.current_profile_id = self.available_profiles[i + 1]
+        return self.current_profile_id
+
+    def switch_to_next_profile(self):
+        if not self.available_profiles:
+            return None
+        if self.current_profile_id not in self.available_profiles:
+            # 同 JDCrawlerViaSearch:池耗尽后游标被重置为 None,冷却完从第一个账号重新开始
+            self.current_profile_id = self.available_profiles[0]
+            return self.current_profile_id
+        return self._next_profile()
+
+    def rotate_profile(self):
+        if len(self.available_profiles) < 2:
+            return None
+        if self._next_profile() is None:
+            self.current_profile_id = self.available_profiles[0]
+        return self.current_profile_id
+
+    def close(self):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description='离线替身站点(本机验证调度/分布式用)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5090)
+    parser.add_argument('--block-rate', type=float, default=0.0, help='随机返回 blocked 的比例')
+    parser.add_argument('--latency', type=float, default=0.0, help='平均响应延迟(秒)')
+    args = parser.parse_args()
+    server = serve(args.host, args.port, args.block_rate, args.latency)
+    print(f'offline site: http://{args.host}:{args.port}  (block_rate={args.block_rate})')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""两次京东爬取结果的价格对比(向量化 pandas,5k 行秒级).
+
+以前每跑完一轮要人工在表格里把 Price 和 Price Reference、和上一份 JD_Price_Marks_*.xlsx 逐行对.
+这里把本次主文件与基线(默认上一份主文件)按行身份(jd_batch.row_identity 的四元组:
+Brand, Item, URL, Product Key)做一次 outer merge,整列算出:
+- Change:up / down / same(与基线比 Price)、new(基线没有这一行或基线没价)、
+  missing(基线有、本次没有)、no_price(本次没取到价);
+- Price Delta / Price Delta %:本次 Price − 基线 Price;
+- Ref Delta / Ref Delta %:本次 Price − Price Reference.
+
+结果写进主文件的「Price Diff」sheet(首个 sheet 不动,retry 回填照旧只读首个 sheet),
+Web 端另有 /api/diff 返回同样的数据.
+"""
+import os
+import glob
+from typing import Optional
+
+import jd_batch
+
+DIFF_SHEET = 'Price Diff'
+KEY_COLUMNS = ['Brand', 'Item', 'URL', 'Product Key']
+CHANGES = ('up', 'down', 'new', 'missing', 'no_price', 'same')
+
+
+def list_masters(output_dir: str) -> list:
+    """outputs 下的京东主文件(不含 _errors),新的在前"""
+    files = [f for f in glob.glob(os.path.join(output_dir, 'JD_*.xlsx'))
+             if not f.endswith('_errors.xlsx')]
+    return sorted(files, key=os.path.getmtime, reverse=True)
+
+
+def previous_master(path: str, output_dir: Optional[str] = None) -> Optional[str]:
+    """path 之前最近的一份主文件(按修改时间);没有返回 None"""
+    path = os.path.abspath(path)
+    mtime = os.path.getmtime(path)
+    for f in list_masters(output_dir or os.path.dirname(path)):
+        if os.path.abspath(f) != path and os.path.getmtime(f) <= mtime:
+            return f
+    return None
+
+
+def load_master(path: str):
+    """读主文件首个 sheet;身份列按字符串读(Product Key 不变成 1.0001e8),价格列转数值"""
+    import pandas as pd
+    df = pd.read_excel(path, sheet_name=0, dtype=str)
+    for col in KEY_COLUMNS + ['Status', 'Price', 'Promotion Price', 'Price Reference']:
+        if col not in df.columns:
+            df[col] = ''
+    for col in KEY_COLUMNS:
+        df[col] = df[col].fillna('').str.strip()
+    for col in ('Price', 'Promotion Price', 'Price Reference'):
+        df[col] = pd.to_numeric(df[col], errors='coerce')  # 'N/A' / '-' / 空 → NaN
+    # 同身份多行(不该有,保险起见)只留最后一条,免得 merge 成笛卡尔积
+    return df.drop_duplicates(subset=KEY_COLUMNS, keep='last')
+
+
+def diff_frames(current, baseline):
+    """本次 DataFrame × 基线 DataFrame → 对比 DataFrame(一行一个身份,按本次顺序,missing 在最后)"""
+    import numpy as np
+    cur = current[KEY_COLUMNS + ['Status', 'Price', 'Promotion Price', 'Price Reference']].assign(
+        _order=range(len(current)))
+    base = baseline[KEY_COLUMNS + ['Status', 'Price', 'Promotion Price']].rename(columns={
+        'Status': 'Baseline Status', 'Price': 'Baseline Price',
+        'Promotion Price': 'Baseline Promotion Price'})
+    df = cur.merge(base, on=KEY_COLUMNS, how='outer', indicator=True)
+
+    price, base_price, ref = df['Price'], df['Baseline Price'], df['Price Reference']
+    df['Price Delta'] = (price - base_price).round(2)
+    df['Price Delta %'] = (df['Price Delta'] / base_price.where(base_price != 0) * 100).round(2)
+    df['Ref Delta'] = (price - ref).round(2)
+    df['Ref Delta %'] = (df['Ref Delta'] / ref.where(ref != 0) * 100).round(2)
+
+    only_base = df['_merge'] == 'right_only'
+    only_cur = df['_merge'] == 'left_only'
+    df['Change'] = np.select(
+        [only_base, price.isna(), only_cur | base_price.isna(),
+         df['Price Delta'] > 0, df['Price Delta'] < 0],
+        ['missing', 'no_price', 'new', 'up', 'down'],
+        default='same')
+    # outer merge 会按键重排:按本次文件的行序排回去,missing(_order 为空)排最后
+    df = df.sort_values('_order', kind='stable', na_position='last', ignore_index=True)
+    return df[KEY_COLUMNS + ['Change', 'Status', 'Baseline Status', 'Price', 'Baseline Price',
+                             'Price Delta', 'Price Delta %', 'Promotion Price',
+                             'Baseline Promotion Price', 'Price Reference', 'Ref Delta',
+                             'Ref Delta %']]
+
+
+def summarize(diff) -> dict:
+    counts = diff['Change'].value_counts()
+    return {change: int(counts.get(change, 0)) for change in CHANGES}
+
+
+def build_diff(path: str, baseline: Optional[str] = None) -> tuple:
+    """(对比 DataFrame, 基线路径, err).baseline 不传取上一份主文件;没有基线时全部是 new."""
+    if not os.path.exists(path):
+        return None, None, f'找不到文件: {os.path.basename(path)}'
+    baseline = baseline or previous_master(path)
+    if baseline and not os.path.exists(baseline):
+        return None, None, f'找不到基线文件: {os.path.basename(baseline)}'
+    try:
+        current = load_master(path)
+        if baseline:
+            base = load_master(baseline)
+        else:
+            base = current.iloc[0:0]
+        return diff_frames(current, base), baseline, ''
+    except Exception as e:
+        return None, None, f'对比失败: {e}'
+
+
+def write_diff_sheet(path: str, diff) -> None:
+    """对比结果写进主文件的 DIFF_SHEET(已有则替换),首个 sheet 不动"""
+    import pandas as pd
+    with pd.ExcelWriter(path, engine='openpyxl', mode='a', if_sheet_exists='replace') as writer:
+        diff.to_excel(writer, sheet_name=DIFF_SHEET, index=False)
+
+
+def diff_records(diff, changes_only: bool = True, limit: int = 0) -> list:
+    """DataFrame → JSON 友好的 list[dict](NaN → None);changes_only 去掉 same"""
+    if changes_only:
+        diff = diff[diff['Change'] != 'same']
+    if limit:
+        diff = diff.head(limit)
+    return diff.astype(object).where(diff.notna(), None).to_dict('records')
+
+
+def annotate_master(path: str, log=jd_batch._print_log) -> Optional[dict]:
+    """爬取收尾:和上一份主文件对比,写 Price Diff sheet 并打一行汇总日志;返回汇总(失败返回 None)"""
+    diff, baseline, err = build_diff(path)
+    if err:
+        log('WARNING', f'价格对比跳过: {err}')
+        return None
+    try:
+        write_diff_sheet(path, diff)
+    except Exception as e:
+        log('WARNING', f'价格对比写入失败(忽略): {e}')
+        return None
+    summary = summarize(diff)
+    base_label = os.path.basename(baseline) if baseline else '无基线'
+    log('INFO', f'  价格对比(vs {base_label}): 涨 {summary["up"]} / 跌 {summary["down"]} / '
+                f'新增 {summary["new"]} / 缺失 {summary["missing"]} / 无价 {summary["no_price"]} '
+                f'→ sheet「{DIFF_SHEET}」')
+    return dict(summary, baseline=base_label)
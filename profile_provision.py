@@ -2,7 +2,8 @@
 """Web 端 JD 账号池配置 —— 替代终端的 prepare_jd_profile_pool_patchright.py。
 
 启一个可见的 patchright chromium 让用户扫码,后台轮询登录态(不阻塞在 input()),
-全程通过传入的 emit 回调把状态推到前端。同时提供 冷却/恢复、移除、验证登录、列表。
+全程通过传入的 emit 回调把状态推到前端。同时提供 冷却/恢复、移除、验证登录、列表、
+批量并发验证(就绪报告)、目录瘦身(清缓存,保留登录态)。
 
 设计要点:
 - 与批量爬虫的 crawler_instance 完全隔离:每次扫码/验证用独立线程 + 独立 sync_playwright。
@@ -11,19 +12,19 @@
   列表直接读旁车、无需每次启浏览器。
 """
 import os
-import re
 import json
 import time
+import shutil
 import threading
 from typing import Optional, Callable
-
-from patchright.sync_api import sync_playwright
+from concurrent.futures import ThreadPoolExecutor
 
 import jd_profile_pool
 
 POOL_DIR = jd_profile_pool.POOL_DIR
 SIDECAR = '.jd_account.json'
 SCAN_TIMEOUT = 180          # 扫码最多等 180s
+VERIFY_CONCURRENCY = 4      # 批量验证同时开几个无头 chromium(每个 ~200MB)
 LAUNCH_ARGS = [
     '--no-first-run',
     '--no-default-browser-check',
@@ -31,6 +32,20 @@ LAUNCH_ARGS = [
     '--lang=zh-CN',
 ]
 
+# 目录瘦身:只删 chromium 可随时重建的缓存 / 历史,登录态相关的一律不碰
+# (Cookies、Network/、Local Storage、IndexedDB、Session Storage、Preferences、旁车)
+DISPOSABLE_TOP = ['GrShaderCache', 'ShaderCache', 'GraphiteDawnCache', 'BrowserMetrics',
+                  os.path.join('Crashpad', 'completed')]
+DISPOSABLE_PER_PROFILE = [
+    'Cache', 'Code Cache', 'GPUCache', 'DawnCache', 'DawnGraphiteCache', 'DawnWebGPUCache',
+    os.path.join('Service Worker', 'CacheStorage'), os.path.join('Service Worker', 'ScriptCache'),
+    'History', 'History-journal', 'Favicons', 'Favicons-journal', 'Top Sites', 'Top Sites-journal',
+    'Visited Links', 'Shortcuts', 'Shortcuts-journal',
+    'Network Action Predictor', 'Network Action Predictor-journal',
+]
+# 可清理部分低于这个值就不动(省掉两次测启动);可用环境变量覆盖
+COMPACT_MIN_MB = int(os.environ.get('JD_PROFILE_COMPACT_MIN_MB', 100))
+
 # 全局配置状态(同一时刻只允许一个扫码/验证操作)
 _LOCK = threading.Lock()
 _state = {'busy': False, 'profile_id': None, 'action': None, 'cancel': False}
@@ -51,49 +66,50 @@ def _read_sidecar(path: str) -> dict:
 
 
 def _write_sidecar(path: str, nickname: Optional[str], ts: str) -> None:
+    """扫码成功:重写昵称 + 扫码时间(旧的 verified_at 等字段保留)."""
+    _update_sidecar(path, nickname=nickname, scanned_at=ts)
+
+
+def _update_sidecar(path: str, **fields) -> None:
+    """合并写旁车:只改传入的字段,其余原样保留;先写临时文件再替换,并发验证不会写坏."""
     try:
-        with open(os.path.join(path, SIDECAR), 'w', encoding='utf-8') as f:
-            json.dump({'nickname': nickname, 'scanned_at': ts}, f, ensure_ascii=False)
+        side = _read_sidecar(path)
+        side.update(fields)
+        tmp = os.path.join(path, SIDECAR + '.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(side, f, ensure_ascii=False)
+        os.replace(tmp, os.path.join(path, SIDECAR))
     except Exception:
         pass
+    jd_profile_pool.invalidate_inventory()
 
 
 # ---------- 查询 ----------
 
 def list_profiles_status() -> list:
-    """列出所有 profile 槽位 + 状态(不启浏览器,只读目录与旁车)。"""
+    """列出所有 profile 槽位 + 状态(不启浏览器;读 jd_profile_pool 的内存清单,目录没变不碰磁盘)。"""
     os.makedirs(POOL_DIR, exist_ok=True)
     out = []
-    for name in os.listdir(POOL_DIR):
-        m = re.match(r'^profile_(\d+)(\.cooldown)?$', name)
-        if not m:
-            continue
-        path = os.path.join(POOL_DIR, name)
-        if not os.path.isdir(path):
-            continue
-        side = _read_sidecar(path)
+    for pid, p in sorted(jd_profile_pool.inventory().items()):
+        side = p['sidecar']
         out.append({
-            'id': int(m.group(1)),
-            'cooldown': bool(m.group(2)),
+            'id': pid,
+            'cooldown': p['cooldown'],
             # 旁车里有昵称 = 真正扫码登录过.不能用「有 Default 子目录」判断——
             # Chromium 一启动就建 Default,被取消/失败/移除后残留的空 profile 也会有,
             # 会被误判成「已登录(未取到昵称)」。旁车只在扫码/验证成功时写,可靠.
             'configured': bool(side.get('nickname')),
             'nickname': side.get('nickname'),
             'scanned_at': side.get('scanned_at'),
+            'verified_at': side.get('verified_at'),
+            'health': jd_profile_pool.profile_health(pid),
         })
-    out.sort(key=lambda x: x['id'])
     return out
 
 
 def next_free_id() -> int:
     """下一个空闲 profile 编号(填补空缺)。"""
-    used = set()
-    if os.path.isdir(POOL_DIR):
-        for name in os.listdir(POOL_DIR):
-            m = re.match(r'^profile_(\d+)(\.cooldown)?$', name)
-            if m:
-                used.add(int(m.group(1)))
+    used = set(jd_profile_pool.inventory())
     i = 1
     while i in used:
         i += 1
@@ -176,8 +192,10 @@ def _scan_worker(pid, emit, before_launch, on_done):
         if os.path.isdir(cdir) and not os.path.isdir(pdir):
             os.rename(cdir, pdir)
         os.makedirs(pdir, exist_ok=True)
+        jd_profile_pool.invalidate_inventory()
 
         _emit_status(emit, pid, 'launching', '启动浏览器…')
+        from patchright.sync_api import sync_playwright  # 延迟加载:列表/冷却等纯文件接口不需要
         with sync_playwright() as p:
             ctx = p.chromium.launch_persistent_context(
                 user_data_dir=pdir, headless=False, channel='chromium',
@@ -234,6 +252,24 @@ def _scan_worker(pid, emit, before_launch, on_done):
             on_done()
 
 
+def _probe_login(pdir: str, headless: bool) -> tuple:
+    """独立 sync_playwright 启一次 profile,查完登录态就关。返回 (logged_in, nickname)。
+    每次调用自带 playwright 实例,可在多个线程里并发。"""
+    from patchright.sync_api import sync_playwright  # 延迟加载:列表/冷却等纯文件接口不需要
+    with sync_playwright() as p:
+        ctx = p.chromium.launch_persistent_context(
+            user_data_dir=pdir, headless=headless, channel='chromium',
+            no_viewport=True, args=LAUNCH_ARGS)
+        try:
+            page = ctx.pages[0] if ctx.pages else ctx.new_page()
+            return _check_login(page)
+        finally:
+            try:
+                ctx.close()
+            except Exception:
+                pass
+
+
 def _verify_worker(pid, emit, before_launch, on_done):
     try:
         if before_launch:
@@ -245,28 +281,316 @@ def _verify_worker(pid, emit, before_launch, on_done):
             _emit_status(emit, pid, 'error', 'profile 不存在')
             return
         _emit_status(emit, pid, 'verifying', '验证登录态…')
-        with sync_playwright() as p:
-            ctx = p.chromium.launch_persistent_context(
-                user_data_dir=pdir, headless=False, channel='chromium',
-                no_viewport=True, args=LAUNCH_ARGS)
-            page = ctx.pages[0] if ctx.pages else ctx.new_page()
-            logged, nick = _check_login(page)
-            if logged:
-                ts = time.strftime('%Y-%m-%d %H:%M')
-                # 旁车里的昵称以新抓到的为准(抓不到则保留旧的)
-                old = _read_sidecar(pdir)
-                _write_sidecar(pdir, nick or old.get('nickname') or '已登录', ts)
-                _emit_status(emit, pid, 'verified_ok',
-                             f'✓ 登录有效:{nick or old.get("nickname") or "已登录"}',
-                             nickname=nick or old.get('nickname'), scanned_at=ts)
-            else:
-                _emit_status(emit, pid, 'verified_expired', '⚠ 登录已过期,需重新扫码')
+        logged, nick = _probe_login(pdir, headless=False)
+        if logged:
+            ts = time.strftime('%Y-%m-%d %H:%M')
+            # 旁车里的昵称以新抓到的为准(抓不到则保留旧的)
+            nickname = nick or _read_sidecar(pdir).get('nickname')
+            _update_sidecar(pdir, nickname=nickname or '已登录', verified_at=ts)
+            _emit_status(emit, pid, 'verified_ok', f'✓ 登录有效:{nickname or "已登录"}',
+                         nickname=nickname, verified_at=ts)
+        else:
+            _emit_status(emit, pid, 'verified_expired', '⚠ 登录已过期,需重新扫码')
+        jd_profile_pool.record_health(pid, login='ok' if logged else 'expired',
+                                      checked_at=time.strftime('%Y-%m-%d %H:%M'))
+    except Exception as e:
+        _emit_status(emit, pid, 'error', f'验证出错:{e}')
+    finally:
+        with _LOCK:
+            _state.update(busy=False, profile_id=None, action=None, cancel=False)
+        if on_done:
+            on_done()
+
+
+# ---------- 批量验证(并发无头,出就绪报告) ----------
+
+def _verify_one(p: dict, headless: bool) -> dict:
+    pdir = _ppath(p['id'], '.cooldown' if p['cooldown'] else '')
+    entry = {'id': p['id'], 'nickname': p.get('nickname'), 'cooldown': p['cooldown'],
+             'state': 'error', 'seconds': None, 'message': ''}
+    if _profile_in_use(pdir):
+        entry.update(state='in_use', message='正被爬虫或其它窗口占用,未验证')
+        return entry
+    t0 = time.time()
+    try:
+        logged, nick = _probe_login(pdir, headless)
+        if not logged and headless:
+            # 无头偶尔被「我的京东」当成异常环境跳登录页 —— 判过期前用有头再确认一次
+            logged, nick = _probe_login(pdir, False)
+    except Exception as e:
+        entry.update(seconds=round(time.time() - t0, 1), message=f'启动失败:{e}')
+        return entry
+    entry['seconds'] = round(time.time() - t0, 1)
+    if logged:
+        ts = time.strftime('%Y-%m-%d %H:%M')
+        nickname = nick or p.get('nickname')
+        _update_sidecar(pdir, nickname=nickname or '已登录', verified_at=ts)
+        entry.update(state='ok', nickname=nickname, verified_at=ts, message='登录有效')
+    else:
+        entry.update(state='expired', message='登录已过期,需重新扫码')
+    return entry
+
+
+def _verify_all(on_result: Callable, headless: bool, concurrency: int) -> dict:
+    started = time.time()
+    profiles = [p for p in list_profiles_status() if p['configured']]
+    lock = threading.Lock()
+    entries = []
+
+    def run(p):
+        entry = _verify_one(p, headless)
+        jd_profile_pool.record_health(entry['id'], login=entry['state'],
+                                      checked_at=time.strftime('%Y-%m-%d %H:%M'),
+                                      probe_seconds=entry['seconds'])
+        with lock:
+            entries.append(entry)
+            on_result(entry)
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency),
+                            thread_name_prefix='profile-verify') as pool:
+        list(pool.map(run, profiles))
+    entries.sort(key=lambda e: e['id'])
+    ready = [e['id'] for e in entries if e['state'] == 'ok' and not e['cooldown']]
+    return {
+        'checked_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'duration': round(time.time() - started, 1),
+        'total': len(entries),
+        'ready': ready,
+        'expired': [e['id'] for e in entries if e['state'] == 'expired'],
+        'errors': [e['id'] for e in entries if e['state'] in ('error', 'in_use')],
+        # 至少 2 个可用账号才能批间交替;只有 1 个退回单账号 + 10 分钟冷却
+        'rotation_ready': len(ready) >= 2,
+        'profiles': entries,
+    }
+
+
+def describe_pool_report(report: dict) -> str:
+    text = f"就绪 {len(report['ready'])}/{report['total']} 个账号(耗时 {report['duration']:.1f}s)"
+    if report['expired']:
+        text += ';已过期:' + ', '.join(f'profile_{i}' for i in report['expired'])
+    if report['errors']:
+        text += ';未能验证:' + ', '.join(f'profile_{i}' for i in report['errors'])
+    if not report['rotation_ready']:
+        text += ';不足 2 个可用账号,无法账号交替'
+    return text
+
+
+def verify_pool(on_result: Optional[Callable] = None, headless: bool = True,
+                concurrency: int = VERIFY_CONCURRENCY) -> tuple:
+    """并发验证所有已登录 profile(默认无头),刷新旁车 verified_at。
+    on_result(entry) 每验完一个调用一次(串行)。返回 (report, err);有配置操作进行中时 report 为 None。"""
+    with _LOCK:
+        if _state['busy']:
+            return None, '已有账号配置操作在进行,请稍候'
+        _state.update(busy=True, profile_id=None, action='verify_all', cancel=False)
+    try:
+        return _verify_all(on_result or (lambda entry: None), headless, concurrency), ''
+    finally:
+        with _LOCK:
+            _state.update(busy=False, profile_id=None, action=None, cancel=False)
+
+
+def start_verify_all(emit: Callable, before_launch: Optional[Callable] = None,
+                     on_done: Optional[Callable] = None) -> tuple:
+    """网页触发的批量验证(后台线程):逐个推 profile_scan,最后推 profile_pool_report。返回 (ok, err)。"""
+    with _LOCK:
+        if _state['busy']:
+            return False, '已有账号配置操作在进行,请稍候'
+        _state.update(busy=True, profile_id=None, action='verify_all', cancel=False)
+    threading.Thread(target=_verify_all_worker, args=(emit, before_launch, on_done),
+                     daemon=True).start()
+    return True, ''
+
+
+def _verify_all_worker(emit, before_launch, on_done):
+    try:
+        if before_launch:
+            before_launch()
+        _emit_status(emit, None, 'verifying', '正在并发验证全部账号…')
+
+        def on_result(entry):
+            stage = 'verify_item_ok' if entry['state'] == 'ok' else 'verify_item_bad'
+            _emit_status(emit, entry['id'], stage, entry['message'])
+
+        report = _verify_all(on_result, True, VERIFY_CONCURRENCY)
+        emit('profile_pool_report', report)
+        _emit_status(emit, None, 'verified_all', describe_pool_report(report))
+    except Exception as e:
+        _emit_status(emit, None, 'error', f'批量验证出错:{e}')
+    finally:
+        with _LOCK:
+            _state.update(busy=False, profile_id=None, action=None, cancel=False)
+        if on_done:
+            on_done()
+
+
+# ---------- 目录瘦身(清缓存保留登录态,测启动耗时) ----------
+
+def _dir_bytes(path: str) -> int:
+    if os.path.isfile(path) or os.path.islink(path):
+        try:
+            return os.lstat(path).st_size
+        except OSError:
+            return 0
+    total = 0
+    for root, _dirs, files in os.walk(path):
+        for name in files:
             try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def _disposable_paths(pdir: str) -> list:
+    """pdir 下可删的缓存路径:顶层若干 + 每个浏览器 profile(Default / Profile N)里的缓存."""
+    paths = [os.path.join(pdir, rel) for rel in DISPOSABLE_TOP]
+    try:
+        subs = [d for d in os.listdir(pdir) if d == 'Default' or d.startswith('Profile ')]
+    except OSError:
+        subs = []
+    for sub in subs:
+        paths += [os.path.join(pdir, sub, rel) for rel in DISPOSABLE_PER_PROFILE]
+    return [p for p in paths if os.path.lexists(p)]
+
+
+def profile_size_mb(pdir: str) -> tuple:
+    """返回 (整个目录 MB, 其中可清理的缓存 MB)."""
+    mb = 1024 * 1024
+    return _dir_bytes(pdir) / mb, sum(_dir_bytes(p) for p in _disposable_paths(pdir)) / mb
+
+
+def _profile_in_use(pdir: str) -> bool:
+    """有 chromium 正拿着这个 user-data-dir(爬虫当前账号 / 扫码窗口)就不能动."""
+    import browser_watchdog
+    return browser_watchdog.user_data_dir_rss_mb(pdir) is not None
+
+
+def measure_launch_seconds(pdir: str) -> Optional[float]:
+    """无头启动一次该 profile 到 about:blank 就关,返回耗时;失败返回 None.
+    放在独立线程里起 sync_playwright —— 调用线程可能已经有一个(命令行同步引擎)."""
+    result = {}
+
+    def _run():
+        try:
+            from patchright.sync_api import sync_playwright
+            with sync_playwright() as p:
+                t0 = time.time()
+                ctx = p.chromium.launch_persistent_context(
+                    user_data_dir=pdir, headless=True, channel='chromium',
+                    no_viewport=True, args=LAUNCH_ARGS)
+                page = ctx.pages[0] if ctx.pages else ctx.new_page()
+                page.goto('about:blank')
+                result['seconds'] = time.time() - t0
                 ctx.close()
-            except Exception:
+        except Exception:
+            pass
+
+    t = threading.Thread(target=_run, name='profile-launch-probe', daemon=True)
+    t.start()
+    t.join(120)
+    return result.get('seconds')
+
+
+def compact_profile(profile_id: int, measure: bool = True) -> dict:
+    """清掉单个 profile 的缓存;measure=True 时前后各测一次启动耗时.
+    返回 {'id','before_mb','after_mb','launch_before','launch_after','skipped'}."""
+    pdir = _ppath(profile_id)
+    if not os.path.isdir(pdir):
+        pdir = _ppath(profile_id, '.cooldown')
+    out = {'id': profile_id, 'skipped': None}
+    if not os.path.isdir(pdir):
+        out['skipped'] = 'profile 不存在'
+        return out
+    if _profile_in_use(pdir):
+        out['skipped'] = '正在使用中'
+        return out
+    out['before_mb'], disposable_mb = profile_size_mb(pdir)
+    if disposable_mb < COMPACT_MIN_MB:
+        out['after_mb'] = out['before_mb']
+        out['skipped'] = f'可清理缓存仅 {disposable_mb:.0f} MB'
+        return out
+    out['launch_before'] = measure_launch_seconds(pdir) if measure else None
+    for path in _disposable_paths(pdir):
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            try:
+                os.remove(path)
+            except OSError:
                 pass
+    out['after_mb'], _ = profile_size_mb(pdir)
+    out['launch_after'] = measure_launch_seconds(pdir) if measure else None
+    return out
+
+
+def describe_compaction(r: dict) -> str:
+    """一行人话:profile_2: 812 MB → 95 MB,启动 3.4s → 1.1s."""
+    if r.get('skipped'):
+        return f"profile_{r['id']}: 跳过({r['skipped']})"
+    text = f"profile_{r['id']}: {r['before_mb']:.0f} MB → {r['after_mb']:.0f} MB"
+    if r.get('launch_before') is not None and r.get('launch_after') is not None:
+        text += f",启动 {r['launch_before']:.1f}s → {r['launch_after']:.1f}s"
+    return text
+
+
+def _compact_all(on_result: Callable, should_stop: Callable, measure: bool) -> list:
+    results = []
+    for p in list_profiles_status():
+        if should_stop() or _state['cancel']:
+            break
+        r = compact_profile(p['id'], measure=measure)
+        if r.get('after_mb') is not None:
+            health = {'size_mb': round(r['after_mb'])}
+            if r.get('launch_after') is not None:
+                health['launch_seconds'] = round(r['launch_after'], 1)
+            jd_profile_pool.record_health(p['id'], **health)
+        results.append(r)
+        on_result(r)
+    return results
+
+
+def compact_pool(log: Optional[Callable] = None, should_stop: Callable = lambda: False,
+                 measure: bool = True) -> list:
+    """逐个瘦身池里的 profile(含冷却中的),正在使用的自动跳过.
+    与扫码/验证共用 busy 标志:有配置操作在进行时直接返回 [].
+    log(level, message) 与 jd_batch 的日志回调同约定."""
+    with _LOCK:
+        if _state['busy']:
+            return []
+        _state.update(busy=True, profile_id=None, action='compact', cancel=False)
+    def on_result(r):
+        # 「缓存太小没动」不值得刷日志
+        if log and not (r.get('skipped') or '').startswith('可清理缓存仅'):
+            log('INFO', f'  🧹 {describe_compaction(r)}')
+
+    try:
+        return _compact_all(on_result, should_stop, measure)
+    finally:
+        with _LOCK:
+            _state.update(busy=False, profile_id=None, action=None, cancel=False)
+
+
+def start_compact(emit: Callable, on_done: Optional[Callable] = None) -> tuple:
+    """网页手动触发的全池瘦身(后台线程),逐个 profile 推 profile_scan 事件。返回 (ok, err)。"""
+    with _LOCK:
+        if _state['busy']:
+            return False, '已有账号配置操作在进行,请稍候'
+        _state.update(busy=True, profile_id=None, action='compact', cancel=False)
+    threading.Thread(target=_compact_worker, args=(emit, on_done), daemon=True).start()
+    return True, ''
+
+
+def _compact_worker(emit, on_done):
+    try:
+        _emit_status(emit, None, 'compacting', '正在清理各账号的浏览器缓存…')
+        results = _compact_all(
+            lambda r: _emit_status(emit, r['id'], 'compacting', describe_compaction(r)),
+            lambda: False, True)
+        freed = sum(r['before_mb'] - r['after_mb'] for r in results if not r.get('skipped'))
+        _emit_status(emit, None, 'compacted', f'✓ 缓存清理完成,共释放 {freed:.0f} MB')
     except Exception as e:
-        _emit_status(emit, pid, 'error', f'验证出错:{e}')
+        _emit_status(emit, None, 'error', f'清理出错:{e}')
     finally:
         with _LOCK:
             _state.update(busy=False, profile_id=None, action=None, cancel=False)
@@ -283,11 +607,13 @@ def set_cooldown(profile_id: int, on: bool) -> tuple:
         if on:
             if os.path.isdir(pdir):
                 os.rename(pdir, cdir)
+                jd_profile_pool.invalidate_inventory()
                 return True, ''
             return False, 'profile 不存在或已在冷却'
         else:
             if os.path.isdir(cdir):
                 os.rename(cdir, pdir)
+                jd_profile_pool.invalidate_inventory()
                 return True, ''
             return False, 'profile 不在冷却中'
     except Exception as e:
@@ -301,6 +627,7 @@ def remove_profile(profile_id: int) -> tuple:
         if os.path.isdir(d):
             try:
                 os.rename(d, _ppath(profile_id, f'.removed.{int(time.time())}'))
+                jd_profile_pool.invalidate_inventory()
                 return True, ''
             except Exception as e:
                 return False, str(e)
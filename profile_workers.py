@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""进程隔离的账号 worker —— 每个 profile 一个子进程,崩溃 / 卡死只影响它自己.
+
+为什么需要:
+- 同步 / 异步引擎都把 chromium + playwright driver 放在 Flask 进程里。任何一个 context 卡死
+  (页面 hang、driver 管道断)都会拖死共享的 crawler_instance,恢复手段只有
+  _kill_stale_browser_processes() 在整台机器上 pkill -9.
+- 这里每个已登录 profile 起一个 spawn 子进程(独立进程组),子进程里钉死一个 profile 的
+  JDCrawlerViaSearch,父进程经 Pipe 发「取这个商品的价格」,子进程回 prices.
+  单条超时(卡死)或管道 EOF(崩溃)→ killpg 这个子进程组,再按 --user-data-dir 找到它的 chromium
+  进程树一并杀掉(playwright 把 chromium 拉起在独立进程组里,killpg 收不到),然后自动重启,
+  那一行放回队列,其它账号照常推进;父进程这边只是几个阻塞在 pipe 上的线程,Flask 始终能响应.
+
+节奏与 jd_crawler_async 一致:按账号独立计数,每账号跑满 rows_per_profile 条歇 cooldown 秒,
+每 10-15 条插一次伪浏览,连续 max_consecutive_failures 次失败退出轮换.
+节奏状态(计数器)放在父进程,子进程重启后不会清零.
+停止 / 账号全部退出轮换时没跑完的行(队列里剩下的 + 在途的)以 original='skipped' 交给 on_result,
+记 skipped(可重试),不会只剩一个计数.
+
+入口与 jd_crawler_async.run_rows 同签名:
+    summary = run_rows(rows, on_result, should_stop=lambda: not is_crawling, rows_per_profile=25)
+"""
+import os
+import re
+import time
+import queue
+import random
+import signal
+import threading
+import multiprocessing
+from typing import Callable, List, Optional
+
+import jd_profile_pool
+import browser_watchdog
+
+_FAILURE_VERDICTS = ('blocked', 'forbidden')
+# 没跑完的行交给 on_result 时用的结果(jd_batch.apply_jd_prices 记 skipped)
+SKIPPED_PRICES = {'original': 'skipped', 'promo': 'skipped', '_diag': '未处理'}
+
+STARTUP_TIMEOUT = 180   # 启动 + 登录检测 + 热身
+ROW_TIMEOUT = 180       # 单条取价(内部含 10-15s 停留 + 点击导航),超过即判定卡死
+MAX_ROW_ATTEMPTS = 2    # 一行最多因 worker 崩溃重派几次,再失败就记 failed
+MAX_RESTARTS = 3        # 单个账号 worker 最多自动重启几次,再崩就退出轮换
+
+
+class WorkerDied(Exception):
+    """子进程崩溃(管道 EOF)或卡死(超时)."""
+
+
+# ==================== 子进程 ====================
+
+def _child_main(conn, profile_id: int, headless: bool):
+    """子进程入口(spawn):独立进程组.playwright driver 在组里,chromium 却被它拉起在自己的进程组,
+    所以父进程 kill 时除了 killpg 还要按 user-data-dir 收掉 chromium(见 ProfileWorker.kill)."""
+    try:
+        os.setsid()
+    except OSError:
+        pass
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl-C 由父进程统一处理
+    from jd_crawler_patchright import JDCrawlerViaSearch
+    from browser_watchdog import ContextWatchdog
+
+    crawler = None
+    watchdog = ContextWatchdog()
+    try:
+        crawler = JDCrawlerViaSearch(headless=headless, profile_ids=[profile_id])
+        crawler.login(auto_login=False)
+        if not crawler.is_logged_in:
+            conn.send(('fatal', f'profile_{profile_id} 未登录'))
+            return
+        ok, err = crawler.warmup()
+        if not ok:
+            conn.send(('fatal', f'热身失败: {err}'))
+            return
+        conn.send(('ready', profile_id))
+
+        while True:
+            msg = conn.recv()
+            if msg[0] == 'price':
+                conn.send(('prices', crawler.get_price_via_search(msg[1])))
+                # 回完结果再查内存:回收发生在行与行之间(重开耗时计入下一条的超时,远低于 ROW_TIMEOUT)
+                reason = watchdog.check(crawler)
+                if reason and not watchdog.recycle(crawler, reason, lambda lv, m: print(m)):
+                    raise RuntimeError('回收 context 后重开失败')
+            elif msg[0] == 'walk':
+                conn.send(('walked', crawler.random_walk()))
+            elif msg[0] == 'stop':
+                break
+    except (EOFError, KeyboardInterrupt):
+        pass
+    except Exception as e:
+        try:
+            conn.send(('fatal', str(e)))
+        except Exception:
+            pass
+    finally:
+        if crawler is not None:
+            try:
+                crawler.close()
+            except Exception:
+                pass
+
+
+# ==================== 父进程:单个 worker 句柄 ====================
+
+class ProfileWorker:
+    """一个 profile 子进程的句柄:启动、请求(带超时)、强杀重启."""
+
+    def __init__(self, profile_id: int, headless: bool = False):
+        self.profile_id = profile_id
+        self.headless = headless
+        self.restarts = 0
+        self._proc = None
+        self._conn = None
+
+    def start(self, timeout: Optional[float] = None) -> tuple:
+        """启动子进程并等它登录 + 热身完成.返回 (ok, err)."""
+        ctx = multiprocessing.get_context('spawn')
+        parent_conn, child_conn = ctx.Pipe()
+        self._proc = ctx.Process(target=_child_main, name=f'jd-profile-{self.profile_id}',
+                                 args=(child_conn, self.profile_id, self.headless), daemon=True)
+        self._proc.start()
+        child_conn.close()
+        self._conn = parent_conn
+        try:
+            kind, payload = self._recv(timeout or STARTUP_TIMEOUT)
+        except WorkerDied as e:
+            self.kill()
+            return False, str(e)
+        if kind != 'ready':
+            self.kill()
+            return False, str(payload)
+        return True, ''
+
+    def _recv(self, timeout: float):
+        try:
+            if not self._conn.poll(timeout):
+                raise WorkerDied(f'profile_{self.profile_id} 无响应 {timeout:.0f}s(卡死)')
+            return self._conn.recv()
+        except (EOFError, OSError, BrokenPipeError) as e:
+            raise WorkerDied(f'profile_{self.profile_id} 子进程退出: {e!r}')
+
+    def request(self, msg: tuple, timeout: Optional[float] = None):
+        try:
+            self._conn.send(msg)
+        except (OSError, BrokenPipeError) as e:
+            raise WorkerDied(f'profile_{self.profile_id} 子进程退出: {e!r}')
+        kind, payload = self._recv(timeout or ROW_TIMEOUT)
+        if kind == 'fatal':
+            raise WorkerDied(f'profile_{self.profile_id}: {payload}')
+        return payload
+
+    def kill(self):
+        """杀这个子进程组,再杀这个 profile 的 chromium 进程树(它不在组里),不碰机器上其它浏览器.
+        chromium 不死会一直占着 user-data-dir 锁,自动重启时 launch 会失败."""
+        if self._proc is None:
+            return
+        if self._proc.is_alive():
+            try:
+                os.killpg(self._proc.pid, signal.SIGKILL)
+            except (OSError, AttributeError):
+                self._proc.kill()
+        self._proc.join(5)
+        try:
+            self._conn.close()
+        except Exception:
+            pass
+        self._proc = None
+        self._kill_browser()
+
+    def _kill_browser(self, timeout: float = 5):
+        """按 --user-data-dir 找到本 profile 的 chromium 进程树并 SIGKILL,等它们退出(释放 profile 锁)."""
+        profile_dir = jd_profile_pool.profile_dir(self.profile_id)
+        end = time.time() + timeout
+        while True:
+            pids = browser_watchdog.user_data_dir_pids(profile_dir)
+            if not pids:
+                return
+            if time.time() >= end:
+                print(f"  [proc] ⚠ profile_{self.profile_id} 的 chromium 仍未退出: {sorted(pids)}")
+                return
+            for pid in pids:
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except OSError:
+                    pass
+            time.sleep(0.3)
+
+    def stop(self, timeout: float = 20):
+        """正常收尾:让子进程自己关 context,超时再强杀."""
+        if self._proc is None:
+            return
+        try:
+            self._conn.send(('stop',))
+        except Exception:
+            pass
+        self._proc.join(timeout)
+        self.kill()
+
+    def restart(self) -> tuple:
+        self.kill()
+        self.restarts += 1
+        return self.start()
+
+
+# ==================== 父进程:调度 ====================
+
+def _interruptible_sleep(seconds: float, should_stop: Callable) -> bool:
+    end = time.time() + seconds
+    while time.time() < end:
+        if should_stop():
+            return False
+        time.sleep(min(1.0, max(0.0, end - time.time())))
+    return True
+
+
+def _supervise(worker: ProfileWorker, rows: 'queue.Queue', emit_result: Callable, should_stop: Callable,
+               rows_per_profile: int, cooldown: int, max_consecutive_failures: int, state: dict):
+    """一个账号的调度线程:从共享队列取行交给子进程,处理崩溃 / 卡死 / 风控退出."""
+    pid = worker.profile_id
+    ok, err = worker.start()
+    if not ok:
+        print(f"  [proc] profile_{pid} 启动失败,退出轮换: {err}")
+        state['retired'].append(pid)
+        return
+
+    rows_done = 0
+    consecutive_failures = 0
+    since_walk, next_walk_at = 0, random.randint(10, 15)
+    try:
+        while not should_stop():
+            try:
+                idx, row, attempts = rows.get_nowait()
+            except queue.Empty:
+                return
+            state['in_flight'][pid] = (idx, row)  # 重新入队或交给 emit_result 前都算在途
+
+            m = re.search(r'/(\d+)\.html', str(row.get('url', '')))
+            product_id = m.group(1) if m else ''
+            try:
+                if since_walk >= next_walk_at:
+                    worker.request(('walk',))
+                    since_walk, next_walk_at = 0, random.randint(10, 15)
+                prices = worker.request(('price', product_id)) if product_id else None
+            except WorkerDied as e:
+                if attempts + 1 < MAX_ROW_ATTEMPTS:
+                    rows.put((idx, row, attempts + 1))
+                else:
+                    emit_result(idx, row, product_id, None, pid)
+                state['in_flight'].pop(pid, None)
+                if worker.restarts >= MAX_RESTARTS:
+                    print(f"  [proc] ⚠ {e};已重启 {worker.restarts} 次,退出轮换")
+                    state['retired'].append(pid)
+                    return
+                print(f"  [proc] ⚠ {e} —— 重启该账号 worker(其它账号不受影响)")
+                ok, err = worker.restart()
+                state['restarts'][pid] = worker.restarts
+                if not ok:
+                    print(f"  [proc] profile_{pid} 重启失败,退出轮换: {err}")
+                    state['retired'].append(pid)
+                    return
+                continue
+
+            state['in_flight'].pop(pid, None)
+            emit_result(idx, row, product_id, prices, pid)
+            rows_done += 1
+            since_walk += 1
+
+            verdict = (prices or {}).get('original')
+            if prices is None or verdict in _FAILURE_VERDICTS:
+                consecutive_failures += 1
+            elif verdict not in ('unavailable', 'not_found'):
+                consecutive_failures = 0
+            if consecutive_failures >= max_consecutive_failures:
+                print(f"  [proc] ⚠ profile_{pid} 连续 {consecutive_failures} 次失败,退出轮换")
+                state['retired'].append(pid)
+                return
+
+            if rows_done % rows_per_profile == 0 and not rows.empty():
+                print(f"  [proc] profile_{pid} 已跑 {rows_done} 条,歇 {cooldown//60} 分钟")
+                if not _interruptible_sleep(cooldown, should_stop):
+                    return
+            elif not _interruptible_sleep(random.uniform(2.0, 4.0), should_stop):
+                return
+    finally:
+        worker.stop()
+
+
+def run_rows(rows: List[dict], on_result: Callable, should_stop: Optional[Callable[[], bool]] = None,
+             profile_ids: Optional[List[int]] = None, headless: bool = False,
+             rows_per_profile: int = 25, cooldown: int = 600,
+             max_consecutive_failures: int = 3) -> dict:
+    """同步入口(在调用线程阻塞直到跑完或停止).on_result(idx, row, product_id, prices, profile_id)
+    串行回调(加锁,调用方不必线程安全).返回汇总 dict."""
+    should_stop = should_stop or (lambda: False)
+    profile_ids = profile_ids or jd_profile_pool.list_available_profiles()
+    if not profile_ids:
+        for idx, row in enumerate(rows, 1):
+            m = re.search(r'/(\d+)\.html', str(row.get('url', '')))
+            on_result(idx, row, m.group(1) if m else '', dict(SKIPPED_PRICES), None)
+        return {'stopped': False, 'unprocessed': len(rows), 'retired': [], 'restarts': {},
+                'error': 'JD profile 池为空'}
+
+    pending: 'queue.Queue' = queue.Queue()
+    for idx, row in enumerate(rows, 1):
+        pending.put((idx, row, 0))
+
+    lock = threading.Lock()
+
+    def emit_result(*args):
+        with lock:
+            on_result(*args)
+
+    state = {'retired': [], 'restarts': {}, 'in_flight': {}}
+    threads = []
+    for pid in profile_ids:
+        t = threading.Thread(target=_supervise, name=f'proc-supervisor-{pid}',
+                             args=(ProfileWorker(pid, headless), pending, emit_result, should_stop,
+                                   rows_per_profile, cooldown, max_consecutive_failures, state),
+                             daemon=True)
+        t.start()
+        threads.append(t)
+    for t in threads:
+        t.join()
+
+    # 没跑完的行(调度线程异常退出时在途的 + 队列里剩下的)逐条记 skipped,
+    # 主文件 / 错误文件里都有它们,「重试失败项」和命令行退出码都能看到
+    leftovers = [(idx, row, pid) for pid, (idx, row) in state['in_flight'].items()]
+    while True:
+        try:
+            idx, row, _ = pending.get_nowait()
+        except queue.Empty:
+            break
+        leftovers.append((idx, row, None))
+    for idx, row, pid in sorted(leftovers, key=lambda x: x[0]):
+        m = re.search(r'/(\d+)\.html', str(row.get('url', '')))
+        emit_result(idx, row, m.group(1) if m else '', dict(SKIPPED_PRICES), pid)
+
+    summary = {
+        'stopped': should_stop(),
+        'unprocessed': len(leftovers),
+        'retired': sorted(state['retired']),
+        'restarts': state['restarts'],
+    }
+    if len(state['retired']) == len(profile_ids) and leftovers:
+        # 不算中止:剩下的行已记 skipped,调用方照常保存,命令行退出码 1(可重试)
+        summary['reason'] = '所有账号 worker 均已退出轮换(未登录 / 风控 / 反复崩溃)'
+    return summary
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""结果流式导出 —— CSV / JSONL / Parquet,给下游管道直接拉,不经 pandas / 整本 workbook.
+
+xlsx 主文件要 pd.DataFrame(...).to_excel 整表进内存再一次写出,10 万行时又慢又吃内存;
+这里逐行映射成与 Excel 主文件相同的列(京东 jd_batch.jd_excel_row / 天猫 tmall_excel_row),
+每 EXPORT_CHUNK_ROWS 行吐一块字节,Flask 用 Response(generator) 边生成边发.
+
+数据源二选一:
+- 内存里的本次结果(app.live_results),按平台映射成 Excel 列;
+- outputs/ 下已存的主文件,openpyxl 只读模式逐行读(本身就是 Excel 列,不再映射).
+
+Parquet 需要可选依赖 pyarrow(未安装时 export_stream 返回错误,CSV / JSONL 不受影响).
+"""
+import io
+import csv
+import json
+from typing import Iterable, Iterator
+
+import jd_batch
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+    'parquet': 'application/vnd.apache.parquet',
+}
+EXPORT_CHUNK_ROWS = 1000
+
+
+def tmall_excel_row(r):
+    """天猫结果行 → 天猫主文件 Excel 行(列名即导出的表头)"""
+    return {
+        'Batch Time': r.get('batch_time', ''),
+        'Crawl Time': r.get('crawl_time', ''),
+        'Brand': r.get('brand', ''),
+        'Item': r.get('item', ''),
+        'Shop': r.get('shop', ''),
+        'URL': r.get('url', ''),
+        'item_id': r.get('item_id', ''),
+        'Price Reference': r.get('price_reference', ''),
+        'Status': r.get('status', ''),
+        'Original Price': r.get('original_price') if r.get('original_price') not in (None, '-') else 'N/A',
+        'Promo Price': r.get('promo_price') if r.get('promo_price') not in (None, '-') else 'N/A',
+        'Title': r.get('title', ''),
+    }
+
+
+def excel_rows(platform: str, results: Iterable[dict]) -> Iterator[dict]:
+    """结果行(小写键)→ 该平台主文件的 Excel 行,惰性映射"""
+    to_row = tmall_excel_row if platform == 'tmall' else jd_batch.jd_excel_row
+    for r in results:
+        if platform == 'tmall' or r.get('url'):
+            yield to_row(r)
+
+
+def iter_xlsx_rows(path: str) -> Iterator[dict]:
+    """已存主文件的首个 sheet 逐行读成 {表头: 值}(openpyxl 只读模式,不整表进内存)"""
+    from openpyxl import load_workbook
+    wb = load_workbook(path, read_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = [str(h) if h is not None else '' for h in next(rows, ())]
+        for values in rows:
+            if values is None or all(v is None for v in values):
+                continue
+            yield {h: ('' if v is None else v) for h, v in zip(header, values)}
+    finally:
+        wb.close()
+
+
+def _chunks(rows: Iterable[dict], size: int) -> Iterator[list]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _stream_csv(rows: Iterable[dict], chunk_rows: int) -> Iterator[bytes]:
+    buf = io.StringIO()
+    writer = None
+    buf.write('\ufeff')  # 与命令行 CSV 一致带 BOM,Excel 直接打开中文不乱码
+    for chunk in _chunks(rows, chunk_rows):
+        if writer is None:
+            writer = csv.DictWriter(buf, fieldnames=list(chunk[0].keys()), extrasaction='ignore')
+            writer.writeheader()
+        writer.writerows(chunk)
+        yield buf.getvalue().encode('utf-8')
+        buf.seek(0)
+        buf.truncate()
+
+
+def _stream_jsonl(rows: Iterable[dict], chunk_rows: int) -> Iterator[bytes]:
+    for chunk in _chunks(rows, chunk_rows):
+        yield ''.join(json.dumps(r, ensure_ascii=False, default=str) + '\n'
+                      for r in chunk).encode('utf-8')
+
+
+class _ChunkSink:
+    """给 pyarrow ParquetWriter 的只写 file-like:写进来的字节攒着,由生成器取走发出去"""
+
+    def __init__(self):
+        self._parts = []
+        self._pos = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self._parts.append(data)
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._pos
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+
+def _stream_parquet(rows: Iterable[dict], chunk_rows: int) -> Iterator[bytes]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    sink = _ChunkSink()
+    writer = None
+    try:
+        # 每块一个 row group;列统一存字符串(价格列本来就混着 'N/A'),schema 取首块的表头
+        for chunk in _chunks(rows, chunk_rows):
+            if writer is None:
+                schema = pa.schema([(name, pa.string()) for name in chunk[0].keys()])
+                writer = pq.ParquetWriter(sink, schema)
+            columns = {name: [None if r.get(name) in (None, '') else str(r.get(name)) for r in chunk]
+                       for name in schema.names}
+            writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+            yield sink.drain()
+    finally:
+        if writer is not None:
+            writer.close()
+    tail = sink.drain()  # footer
+    if tail:
+        yield tail
+
+
+_STREAMS = {'csv': _stream_csv, 'jsonl': _stream_jsonl, 'parquet': _stream_parquet}
+
+
+def export_stream(rows: Iterable[dict], fmt: str,
+                  chunk_rows: int = EXPORT_CHUNK_ROWS) -> tuple:
+    """(字节块生成器, err).fmt 不支持或缺少 pyarrow 时生成器为 None."""
+    if fmt not in _STREAMS:
+        return None, f'不支持的导出格式: {fmt}(可选 {", ".join(EXPORT_FORMATS)})'
+    if fmt == 'parquet':
+        try:
+            import pyarrow.parquet  # noqa: F401
+        except ImportError:
+            return None, '导出 Parquet 需要 pyarrow:pip install pyarrow'
+    return _STREAMS[fmt](rows, max(1, chunk_rows)), ''
+
+
+def export_filename(base: str, fmt: str) -> str:
+    """下载文件名:主文件 JD_Price_Marks_X.xlsx → JD_Price_Marks_X.csv"""
+    if base.endswith('.xlsx'):
+        base = base[:-len('.xlsx')]
+    return f'{base}.{fmt}'